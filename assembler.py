@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Assemble and disassemble programs.
+
+The assembler reads the assembly language written in the docstrings of
+the prog_* programs,
+
+    SRC = 0x40        ;; A symbol.
+    DST = 0x50
+
+         LDX SRC      ;; Get the count
+         STX DST
+    LOOP LDA,X SRC    ;; A label and an indexed instruction.
+         STA,X DST
+         DCX
+         SZX
+         JMP LOOP
+         HLT
+
+A line holds an optional label, then an op code from the Decoder's
+table with its operand, and ;; or ; starts a comment.  A label is any
+name that isn't an op code, and may end with a colon.  An operand is a
+number, in hex, octal or decimal, or a symbol or label, with a leading
+minus sign for a negative value.  The operand can be left out where
+it's ignored, as for HLT.  Two directives place data,
+
+    ORG 0x10          ;; Assemble from 0x10 on.
+    DB 0x3b, -1, 0    ;; Store values.
+
+The code starts at 0x20 unless an ORG says otherwise, and the image
+starts running at the label or symbol START if there is one, else
+0x20.
+
+An AssemblyCache keeps the assembled images on disk named by a hash of
+their source, so assembling the same source again only reads a file.
+"""
+
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import decoder
+import error
+import image
+import memory
+
+# Bump this when the output for a source changes, so cached images made
+# by an older assembler aren't used.
+ASSEMBLER_VERSION = 1
+
+START_PROG = 0x20
+
+OP_CODES = {
+    'HLT': decoder.HLT,
+    'ADD': decoder.ADD,
+    'LDA': decoder.LDA,
+    'STA': decoder.STA,
+    'JMP': decoder.JMP,
+    'SZA': decoder.SZA,
+    'SUB': decoder.SUB,
+    'LDX': decoder.LDX,
+    'STX': decoder.STX,
+    'SZX': decoder.SZX,
+    'DCX': decoder.DCX,
+}
+
+INDEXED_OP_CODES = {
+    'ADD': decoder.ADDX,
+    'LDA': decoder.LDAX,
+    'STA': decoder.STAX,
+}
+
+# The op codes whose operand is ignored and may be left out.
+NO_OPERAND = ('HLT', 'SZA', 'SZX', 'DCX')
+
+DIRECTIVES = ('ORG', 'DB')
+
+SYMBOL_RE = re.compile(r'^([A-Za-z_]\w*)\s*=\s*(\S+)$')
+NAME_RE = re.compile(r'^[A-Za-z_]\w*$')
+COMMENT_RE = re.compile(r';.*$')
+
+CACHE_ENV = 'SIMPLE_MACHINE_CACHE'
+
+
+class AssemblerError(error.Error):
+    """The source has an error."""
+
+
+def strip_comment(line):
+    """Return a line without its comment or surrounding space."""
+
+    return COMMENT_RE.sub('', line).strip()
+
+
+def parse_number(text):
+    """Return the int for a number, or None if text isn't a number."""
+
+    try:
+        return int(text, 0)
+    except ValueError:
+        return None
+
+
+class Assembler(object):
+    """Two pass assembler for the Decoder's instructions."""
+
+    def __init__(self, source):
+        """Save the source.
+
+        Args:
+            source: str.  The assembly language.
+        """
+
+        self.source = source
+        self.symbols = {}
+
+    def error(self, line_num, msg):
+        """Return an AssemblerError for a line."""
+
+        return AssemblerError('Line {0}: {1}'.format(line_num, msg))
+
+    def statements(self):
+        """Yield (line_num, label, op, operands) for each statement.
+
+        Symbol definitions are recorded as they're found and yield
+        nothing.
+        """
+
+        for line_num, line in enumerate(self.source.splitlines(), 1):
+            line = strip_comment(line)
+            if not line:
+                continue
+
+            match = SYMBOL_RE.match(line)
+            if match:
+                name, text = match.groups()
+                self.symbols[name] = self.value(line_num, text)
+                continue
+
+            words = line.split(None, 1)
+            label = None
+            if words[0].rstrip(':').upper() not in self.mnemonics():
+                label = words[0].rstrip(':')
+                if not NAME_RE.match(label):
+                    raise self.error(line_num,
+                                     'Bad label {0!r}'.format(label))
+                words = words[1].split(None, 1) if len(words) > 1 else []
+
+            if not words:
+                yield line_num, label, None, []
+                continue
+
+            op = words[0].upper()
+            operands = []
+            if len(words) > 1:
+                operands = [text.strip() for text in words[1].split(',')]
+
+            # LDA,X SRC is written with the ,X on the op code.
+            if op.endswith(',X'):
+                op = op[:-2]
+                operands.append('X')
+
+            yield line_num, label, op, operands
+
+    def mnemonics(self):
+        """Return the names that can start a statement."""
+
+        return tuple(OP_CODES) + DIRECTIVES + tuple(
+            name + ',X' for name in INDEXED_OP_CODES)
+
+    def value(self, line_num, text, labels=None):
+        """Return the int for an operand.
+
+        Args:
+            line_num: int.  For error messages.
+            text: str.  A number or name, maybe with a minus sign.
+            labels: dict.  The labels, or None in the first pass when
+                they may not be known yet.
+        """
+
+        negative = text.startswith('-')
+        if negative:
+            text = text[1:]
+
+        num = parse_number(text)
+        if num is None:
+            if text in self.symbols:
+                num = self.symbols[text]
+            elif labels is None:
+                num = 0
+            elif text in labels:
+                num = labels[text]
+            else:
+                raise self.error(line_num, 'Unknown name {0!r}'.format(text))
+
+        if negative:
+            num = -num
+        if abs(num) > memory.MAX_NUM:
+            raise self.error(line_num, 'Value {0} out of range'.format(num))
+
+        return num
+
+    def instruction(self, line_num, op, operands, labels):
+        """Return the op code and operand of an instruction."""
+
+        indexed = operands[-1:] == ['X'] or operands[-1:] == ['x']
+        if indexed:
+            operands = operands[:-1]
+            if op not in INDEXED_OP_CODES:
+                raise self.error(line_num, '{0} has no ,X form'.format(op))
+            op_code = INDEXED_OP_CODES[op]
+        elif op in OP_CODES:
+            op_code = OP_CODES[op]
+        else:
+            raise self.error(line_num, 'Unknown op code {0}'.format(op))
+
+        if not operands:
+            if op not in NO_OPERAND:
+                raise self.error(line_num, '{0} needs an operand'.format(op))
+            return op_code, 0
+
+        if len(operands) > 1:
+            raise self.error(line_num, 'Too many operands')
+
+        return op_code, self.value(line_num, operands[0], labels)
+
+    def assemble(self):
+        """Assemble the source.
+
+        Returns:
+            The (address, value) pairs and the start IP.
+        """
+
+        labels = {}
+
+        # The first pass finds the labels, the second emits the code.
+        for labels_known in (False, True):
+            self.symbols = {}
+            pairs = []
+            addr = START_PROG
+
+            for line_num, label, op, operands in self.statements():
+                if label is not None and not labels_known:
+                    if label in labels:
+                        raise self.error(line_num,
+                                         'Label {0} defined twice'.format(
+                                             label))
+                    labels[label] = addr
+
+                if op is None:
+                    continue
+
+                known = labels if labels_known else None
+
+                if op == 'ORG':
+                    if len(operands) != 1:
+                        raise self.error(line_num, 'ORG needs an address')
+
+                    # The first pass needs the address to place the
+                    # labels after it, so it can't be a label below.
+                    name = operands[0].lstrip('-')
+                    if (NAME_RE.match(name) and name not in self.symbols and
+                            name not in labels):
+                        raise self.error(line_num,
+                                         'ORG to {0} before it is '
+                                         'defined'.format(name))
+
+                    addr = self.value(line_num, operands[0], labels)
+                    continue
+
+                if op == 'DB':
+                    nums = [self.value(line_num, text, known)
+                            for text in operands]
+                else:
+                    nums = self.instruction(line_num, op, operands, known)
+
+                for num in nums:
+                    if addr > memory.MAX_NUM:
+                        raise self.error(line_num, 'Past the end of memory')
+                    pairs.append((addr, num))
+                    addr += 1
+
+        start_ip = self.symbols.get('START', labels.get('START', START_PROG))
+
+        return pairs, start_ip
+
+
+def assemble(source):
+    """Assemble source into an image.Image."""
+
+    pairs, start_ip = Assembler(source).assemble()
+
+    return image.Image.from_pairs(pairs, start_ip)
+
+
+def assemble_pairs(source):
+    """Assemble source into (address, value) pairs like a PROGRAM."""
+
+    pairs, _ = Assembler(source).assemble()
+
+    return tuple(pairs)
+
+
+def make_op_names():
+    """Return the name for each op code number, or None."""
+
+    names = [None] * memory.NUM_VALUES
+    for name, op_code in OP_CODES.items():
+        names[op_code] = name
+    for name, op_code in INDEXED_OP_CODES.items():
+        names[op_code] = name + ',X'
+
+    return names
+
+
+OP_NAMES = make_op_names()
+HEX = ['0x{0:02x}'.format(num) for num in range(memory.NUM_VALUES)]
+
+# The tables extended for a wider word, by size.
+WIDE_TABLES = {}
+
+
+def name_tables(size):
+    """Return OP_NAMES and HEX extended to cover the numbers below size.
+
+    Args:
+        size: int.  One more than the largest address or cell.
+    Returns:
+        A tuple of the op name and hex text lists.
+    """
+
+    if size <= len(HEX):
+        return OP_NAMES, HEX
+
+    size = 1 << (size - 1).bit_length()
+    if size not in WIDE_TABLES:
+        WIDE_TABLES[size] = (
+            OP_NAMES + [None] * (size - len(OP_NAMES)),
+            HEX + ['0x{0:02x}'.format(num)
+                   for num in range(len(HEX), size)])
+
+    return WIDE_TABLES[size]
+
+
+def disassemble(cells, signs, start=0, end=None):
+    """Disassemble memory into lines of text.
+
+    Each pair of addresses is shown as an instruction if it starts with
+    an op code and as two DB values otherwise.  The names and numbers
+    come from tables, so there's no formatting work per instruction.
+
+    Args:
+        cells: bytes.  The magnitudes, or a memoryview of a wider word's.
+        signs: bytes.  The sign bitmap.
+        start: int.  The first address.
+        end: int.  The address after the last, the end of cells if None.
+    Returns:
+        A list of str lines.
+    """
+
+    if end is None:
+        end = len(cells)
+
+    op_names, hex_nums = name_tables(max(end, max(cells[start:end],
+                                                  default=0) + 1))
+    lines = []
+
+    for addr in range(start, end, 2):
+        op = cells[addr]
+        if addr + 1 >= end:
+            lines.append(' '.join((hex_nums[addr], 'DB', hex_nums[op])))
+            break
+
+        operand = hex_nums[cells[addr + 1]]
+        if signs[(addr + 1) >> 3] >> ((addr + 1) & 7) & 1:
+            operand = '-' + operand
+
+        name = op_names[op]
+        if name is None:
+            lines.append(' '.join((hex_nums[addr], 'DB', hex_nums[op] + ',',
+                                   operand)))
+        else:
+            lines.append(' '.join((hex_nums[addr], name, operand)))
+
+    return lines
+
+
+def disassemble_image(img):
+    """Disassemble each segment of an image.Image into lines of text."""
+
+    cells = bytearray(img.size)
+    for start, seg_cells in img.segments:
+        cells[start:start + len(seg_cells)] = seg_cells
+
+    lines = []
+    for start, seg_cells in img.segments:
+        lines.extend(disassemble(cells, img.signs, start,
+                                 start + len(seg_cells)))
+
+    return lines
+
+
+class AssemblyCache(object):
+    """Assembled images on disk, named by a hash of their source."""
+
+    def __init__(self, directory=None):
+        """Use a cache directory.
+
+        Args:
+            directory: str.  Where the images are kept.  The default is
+                $SIMPLE_MACHINE_CACHE, else ~/.cache/simple-machine.
+        """
+
+        if directory is None:
+            directory = os.environ.get(CACHE_ENV) or os.path.join(
+                os.path.expanduser('~'), '.cache', 'simple-machine')
+        self.directory = directory
+
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source):
+        """Return the hash that names the image of a source."""
+
+        digest = hashlib.sha256()
+        digest.update('{0}\n'.format(ASSEMBLER_VERSION).encode('utf-8'))
+        digest.update(source.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def path(self, source):
+        """Return the file of the image of a source."""
+
+        key = self.key(source)
+
+        return os.path.join(self.directory, key[:2], key + '.img')
+
+    def assemble(self, source):
+        """Return the image of a source, assembling it only if needed."""
+
+        path = self.path(source)
+
+        if os.path.exists(path):
+            self.hits += 1
+            return image.read_image(path)
+
+        self.misses += 1
+        img = assemble(source)
+
+        # Write to a temporary file first so a reader never sees half an
+        # image, even with several processes filling the cache.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(img.tobytes())
+        os.replace(temp_path, path)
+
+        return img
+
+    def load(self, source, computer):
+        """Load the image of a source into a machine.Computer."""
+
+        path = self.path(source)
+        if not os.path.exists(path):
+            self.assemble(source)
+        else:
+            self.hits += 1
+
+        computer.load_image(path)
+
+
+def main():
+    """Assemble a source file into an image file."""
+
+    if len(sys.argv) != 3:
+        print('Usage: assembler.py SOURCE_FILE IMAGE_FILE')
+        sys.exit(2)
+
+    with open(sys.argv[1]) as source_file:
+        img = assemble(source_file.read())
+
+    with open(sys.argv[2], 'wb') as image_file:
+        image_file.write(img.tobytes())
+
+    print('\n'.join(disassemble_image(img)))
+
+
+if __name__ == '__main__':
+    main()
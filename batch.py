@@ -0,0 +1,274 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Run many independent computers across processes.
+
+A job is a (data, program, start_ip) tuple, the arguments a
+machine.Computer takes.  run_batch() sends the jobs in chunks to a pool
+of worker processes and yields the results as each chunk finishes,
+
+    for num, result in batch.run_batch(jobs, max_steps=10000):
+        print(num, result.status, result.read(0x18))
+
+Each job runs unthrottled and without a trace, with nothing printed.
+A job can be given a budget of steps or seconds, and a loop detector
+stops a job whose state repeats, so a runaway program doesn't tie up
+a worker.
+
+A result travels back from the worker as one packed bytes blob, the
+status, error and cycle count followed by the state record, the memory
+cells and the sign bitmap, rather than as pickled Values.
+"""
+
+import concurrent.futures
+import itertools
+import os
+import struct
+import cpu
+import decoder
+import error
+import loopdetect
+import machine
+import memory
+
+# The status of a finished job.
+HALTED = 0
+STEP_LIMIT = 1
+FAILED = 2
+TIME_LIMIT = 3
+LOOPED = 4
+
+# The error codes of a failed job and the exceptions they stand for.
+NO_ERROR = 0
+VALUE_RANGE = 1
+INDEX_CARRY = 2
+BAD_OP_CODE = 3
+
+ERROR_TYPES = (None, memory.ValueRangeError, decoder.IndexCarryError,
+               KeyError)
+
+HEADER = struct.Struct('<BBQ')
+
+CHUNK_SIZE = 16
+
+# The cycles between loop checks of a job.  Checking less often than
+# every cycle keeps the fast engines quick.
+LOOP_INTERVAL = 64
+
+
+class BatchError(error.Error):
+    """A result blob is the wrong size."""
+
+
+class Result(object):
+    """The outcome of one job.
+
+    Attributes:
+        status: int.  HALTED, STEP_LIMIT, FAILED, TIME_LIMIT or LOOPED.
+            A LOOPED job stops with the state at the start of its loop.
+        error_code: int.  Why a FAILED job stopped, NO_ERROR otherwise.
+        cycles: int.  The cycles run, or 0 for a FAILED job since the
+            engines don't count the cycles before an error.
+        state: cpu.State.  The registers and flags.
+        cells: bytes.  The memory magnitudes.
+        signs: bytes.  The memory sign bitmap.
+    """
+
+    def __init__(self, status, error_code, cycles, state, cells, signs):
+        """Save the parts of the result."""
+
+        self.status = status
+        self.error_code = error_code
+        self.cycles = cycles
+        self.state = state
+        self.cells = cells
+        self.signs = signs
+
+    def pack(self):
+        """Return the result as one bytes blob."""
+
+        header = HEADER.pack(self.status, self.error_code, self.cycles)
+
+        return b''.join((header, self.state.tobytes(), bytes(self.cells),
+                         bytes(self.signs)))
+
+    @classmethod
+    def unpack(cls, blob):
+        """Return a result from a blob made by pack()."""
+
+        size = HEADER.size + machine.SNAPSHOT_SIZE
+        if len(blob) != size:
+            raise BatchError('Result blob of {0} bytes, not {1}'.format(
+                len(blob), size))
+
+        status, error_code, cycles = HEADER.unpack_from(blob)
+
+        start = HEADER.size
+        state = cpu.State.frombytes(blob[start:start + machine.STATE_SIZE])
+        start += machine.STATE_SIZE
+        cells = blob[start:start + memory.SIZE]
+        start += memory.SIZE
+        signs = blob[start:]
+
+        return cls(status, error_code, cycles, state, cells, signs)
+
+    def error_type(self):
+        """Return the exception type that stopped the job, or None."""
+
+        return ERROR_TYPES[self.error_code]
+
+    def read(self, num):
+        """Return the value at address number num."""
+
+        negative = self.signs[num >> 3] >> (num & 7) & 1
+
+        return memory.Value.interned(self.cells[num], negative)
+
+    def memory(self):
+        """Return a copy of the memory as a memory.Memory."""
+
+        mem = memory.Memory()
+        mem.cells[:] = self.cells
+        mem.signs[:] = self.signs
+
+        return mem
+
+
+def run_job(job, max_steps=None, engine='fast', max_sec=None,
+            detect_loops=False):
+    """Run one job to the end in this process.
+
+    Args:
+        job: tuple.  The data, program and start_ip of a Computer.
+        max_steps: int.  The most cycles to run, or None for no limit.
+        engine: str.  The name of the execution engine in
+            machine.ENGINES.
+        max_sec: float.  The most seconds to run, or None for no limit.
+        detect_loops: bool.  Stop the job if its state repeats.
+    Returns:
+        The Result.
+    """
+
+    data, program, start_ip = job
+    if not isinstance(start_ip, memory.Address):
+        start_ip = memory.Address(start_ip)
+
+    computer = machine.Computer(data=data, program=program,
+                                start_ip=start_ip, freq_hz=cpu.UNTHROTTLED,
+                                trace='none', engine=engine)
+    computer.store()
+
+    if detect_loops:
+        computer.clock.loop_detector = loopdetect.LoopDetector(
+            computer.decoder_obj, LOOP_INTERVAL)
+
+    status = HALTED
+    error_code = NO_ERROR
+    cycles = 0
+
+    try:
+        computer.clock.run(max_steps, max_sec)
+        cycles = computer.clock.cycles
+    except loopdetect.LoopError as err:
+        status, cycles = LOOPED, err.cycle
+    except memory.ValueRangeError:
+        status, error_code = FAILED, VALUE_RANGE
+    except decoder.IndexCarryError:
+        status, error_code = FAILED, INDEX_CARRY
+    except KeyError:
+        status, error_code = FAILED, BAD_OP_CODE
+    else:
+        if computer.clock.stop_reason == cpu.STEP_LIMIT:
+            status = STEP_LIMIT
+        elif computer.clock.stop_reason == cpu.TIME_LIMIT:
+            status = TIME_LIMIT
+
+    return Result(status, error_code, cycles, computer.state.copy(),
+                  bytes(computer.mem.cell_bytes()),
+                  bytes(computer.mem.sign_view()))
+
+
+def run_chunk(chunk, max_steps=None, engine='fast', max_sec=None,
+              detect_loops=False):
+    """Run a chunk of numbered jobs in a worker.
+
+    Args:
+        chunk: list of (num, job) pairs.
+        max_steps: int.  The most cycles for each job.
+        engine: str.  The name of the execution engine.
+        max_sec: float.  The most seconds for each job.
+        detect_loops: bool.  Stop a job if its state repeats.
+    Returns:
+        A list of (num, blob) pairs, the blobs from Result.pack().
+    """
+
+    return [(num, run_job(job, max_steps, engine, max_sec,
+                          detect_loops).pack())
+            for num, job in chunk]
+
+
+def chunks(jobs, chunk_size):
+    """Yield lists of up to chunk_size (num, job) pairs."""
+
+    numbered = enumerate(jobs)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(jobs, max_steps=None, workers=None, chunk_size=CHUNK_SIZE,
+              engine='fast', max_sec=None, detect_loops=False):
+    """Run jobs across a pool of processes.
+
+    The jobs are read lazily, so only a few chunks per worker are queued
+    at a time.
+
+    Args:
+        jobs: iterable of (data, program, start_ip) tuples.
+        max_steps: int.  The most cycles each job may run, or None for no
+            limit.
+        workers: int.  The number of processes, or None for one per CPU.
+        chunk_size: int.  The number of jobs sent to a worker at once.
+        engine: str.  The name of the execution engine in
+            machine.ENGINES.
+        max_sec: float.  The most seconds each job may run, or None for
+            no limit.
+        detect_loops: bool.  Stop a job if its state repeats.
+    Yields:
+        (num, Result) pairs in the order the jobs finish, where num is
+        the position of the job in jobs.
+    """
+
+    if engine not in machine.ENGINES:
+        raise machine.EngineError(engine)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    max_pending = 2 * workers
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = set()
+
+        for chunk in chunks(jobs, chunk_size):
+            pending.add(executor.submit(run_chunk, chunk, max_steps, engine,
+                                        max_sec, detect_loops))
+
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for num, result in finished(done):
+                    yield num, result
+
+        for future in concurrent.futures.as_completed(pending):
+            for num, result in finished((future,)):
+                yield num, result
+
+
+def finished(futures):
+    """Yield the (num, Result) pairs of finished chunk futures."""
+
+    for future in futures:
+        for num, blob in future.result():
+            yield num, Result.unpack(blob)
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Benchmark the execution engines.
+
+Each workload, the prog_* programs and a few long running synthetic
+programs, is run on each engine in machine.ENGINES.  For every pair the
+benchmark reports
+
+    instr_per_sec   instructions per second with the computer built and
+                    warm, the program run again from a snapshot until
+                    min_time has passed
+    startup_sec     the time to build the computer and store the program
+    peak_bytes      the most memory allocated while building the
+                    computer and running the program once
+
+To save a baseline, then check a later run against it,
+
+    python3 bench.py --save-baseline
+    python3 bench.py
+
+The second run exits with status 1 when the throughput of any pair has
+dropped by more than the threshold, 10% unless --threshold says
+otherwise.  --output writes the results as JSON as well.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import assembler
+import cpu
+import machine
+import prog_1a_add
+import prog_2a_countdown
+import prog_3_addnums
+import prog_4_cpstr
+
+RESULTS_VERSION = 1
+
+BASELINE = 'bench_baseline.json'
+MIN_TIME = 0.5
+THRESHOLD = 0.10
+
+# Count down an inner loop of 250 for each of 200 outer passes.
+LOOPS_SOURCE = """
+ONE = 0x10
+OUTER = 0x11
+INNER = 0x12
+
+     ORG 0x10
+     DB 1, 200, 250
+
+     ORG 0x20
+TOP  LDX INNER
+SPIN DCX
+     SZX
+     JMP SPIN
+     LDA OUTER
+     SUB ONE
+     STA OUTER
+     SZA
+     JMP TOP
+     HLT
+"""
+
+# Copy 64 values with LDA,X and STA,X, 200 times over.
+COPY_SOURCE = """
+ONE = 0x10
+OUTER = 0x11
+COUNT = 0x12
+SRC = 0x7f
+DST = 0xbf
+
+     ORG 0x10
+     DB 1, 200, 64
+
+     ORG 0x80
+     DB 0x48, 0x65, 0x6c, 0x6c, 0x6f, -0x2c, 0x20, 0x77
+
+     ORG 0x20
+TOP  LDX COUNT
+COPY LDA,X SRC
+     STA,X DST
+     DCX
+     SZX
+     JMP COPY
+     LDA OUTER
+     SUB ONE
+     STA OUTER
+     SZA
+     JMP TOP
+     HLT
+"""
+
+# Adds and subtracts that overflow and go negative, 100 x 100 times.
+ALU_SOURCE = """
+ONE = 0x10
+OUTER = 0x11
+COUNT = 0x12
+BIG = 0x13
+SMALL = 0x14
+SCRATCH = 0x15
+
+     ORG 0x10
+     DB 1, 100, 100, 200, -0x35
+
+     ORG 0x20
+TOP  LDX COUNT
+BODY LDA BIG
+     ADD BIG
+     ADD SMALL
+     SUB SMALL
+     ADD BIG
+     SUB BIG
+     ADD BIG
+     STA SCRATCH
+     DCX
+     SZX
+     JMP BODY
+     LDA OUTER
+     SUB ONE
+     STA OUTER
+     SZA
+     JMP TOP
+     HLT
+"""
+
+
+class Workload(object):
+    """A program to benchmark."""
+
+    def __init__(self, name, pairs, start_ip=0x20):
+        """Save the program.
+
+        Args:
+            name: str.  The name in the results.
+            pairs: tuple of (address, value) pairs.  The whole memory
+                image, data and program.
+            start_ip: int.  The address to start running at.
+        """
+
+        self.name = name
+        self.pairs = tuple(pairs)
+        self.start_ip = start_ip
+
+    @classmethod
+    def from_prog(cls, name, prog):
+        """Make a workload from a prog_* module."""
+
+        return cls(name, tuple(prog.DATA) + tuple(prog.PROGRAM))
+
+    @classmethod
+    def from_source(cls, name, source):
+        """Make a workload from assembly language."""
+
+        pairs, start_ip = assembler.Assembler(source).assemble()
+
+        return cls(name, pairs, start_ip)
+
+    def make_computer(self, engine):
+        """Return an unthrottled, untraced computer ready to run."""
+
+        computer = machine.Computer(program=self.pairs,
+                                    start_ip=machine.ADDR(self.start_ip),
+                                    freq_hz=cpu.UNTHROTTLED, trace='none',
+                                    engine=engine)
+        computer.store()
+
+        return computer
+
+
+WORKLOADS = (
+    Workload.from_prog('prog_1a_add', prog_1a_add),
+    Workload.from_prog('prog_2a_countdown', prog_2a_countdown),
+    Workload.from_prog('prog_3_addnums', prog_3_addnums),
+    Workload.from_prog('prog_4_cpstr', prog_4_cpstr),
+    Workload.from_source('loops', LOOPS_SOURCE),
+    Workload.from_source('copy', COPY_SOURCE),
+    Workload.from_source('alu', ALU_SOURCE),
+)
+
+
+def peak_memory(workload, engine):
+    """Return the peak bytes allocated building and running once."""
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+
+    try:
+        computer = workload.make_computer(engine)
+        computer.reg.run_flag = True
+        computer.decoder_obj.run()
+
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def run_workload(workload, engine, min_time=MIN_TIME):
+    """Benchmark one workload on one engine.
+
+    Returns:
+        A dict of the results.
+    """
+
+    start = time.perf_counter()
+    computer = workload.make_computer(engine)
+    startup_sec = time.perf_counter() - start
+
+    blob = computer.snapshot()
+    engine_obj = computer.decoder_obj
+
+    runs = 0
+    cycles = 0
+    elapsed = 0.0
+    while runs == 0 or elapsed < min_time:
+        computer.restore(blob)
+        computer.reg.run_flag = True
+
+        start = time.perf_counter()
+        cycles += engine_obj.run()
+        elapsed += time.perf_counter() - start
+        runs += 1
+
+    return {
+        'workload': workload.name,
+        'engine': engine,
+        'cycles': cycles // runs,
+        'runs': runs,
+        'instr_per_sec': cycles / elapsed if elapsed > 0 else 0.0,
+        'startup_sec': startup_sec,
+        'peak_bytes': peak_memory(workload, engine),
+    }
+
+
+def run_all(workloads=WORKLOADS, engines=None, min_time=MIN_TIME):
+    """Benchmark every workload on every engine.
+
+    Args:
+        workloads: iterable of Workloads.
+        engines: list of str.  The engine names, all of machine.ENGINES
+            if None.
+        min_time: float.  The least time to run each pair.
+    Returns:
+        The results as a dict, ready for JSON.
+    """
+
+    if engines is None:
+        engines = list(machine.ENGINES)
+
+    results = [run_workload(workload, engine, min_time)
+               for workload in workloads for engine in engines]
+
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'min_time': min_time,
+        'results': results,
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Find the pairs whose throughput dropped past the threshold.
+
+    Args:
+        results: dict.  From run_all().
+        baseline: dict.  Earlier results from run_all().
+        threshold: float.  The fraction the throughput may drop.
+    Returns:
+        A list of (workload, engine, baseline, current) tuples of the
+        instructions per second of each regression.
+    """
+
+    base_ips = dict(((result['workload'], result['engine']),
+                     result['instr_per_sec'])
+                    for result in baseline['results'])
+
+    regressions = []
+    for result in results['results']:
+        key = (result['workload'], result['engine'])
+        if key not in base_ips:
+            continue
+
+        current = result['instr_per_sec']
+        if current < base_ips[key] * (1.0 - threshold):
+            regressions.append(key + (base_ips[key], current))
+
+    return regressions
+
+
+def report(results):
+    """Return the results as a text table."""
+
+    lines = ['{0:<18} {1:<10} {2:>9} {3:>14} {4:>11} {5:>11}'.format(
+        'Workload', 'Engine', 'Cycles', 'Instr/sec', 'Startup ms',
+        'Peak KiB')]
+
+    for result in results['results']:
+        lines.append(
+            '{0:<18} {1:<10} {2:>9} {3:>14,.0f} {4:>11.3f} {5:>11.1f}'.format(
+                result['workload'], result['engine'], result['cycles'],
+                result['instr_per_sec'], 1000.0 * result['startup_sec'],
+                result['peak_bytes'] / 1024.0))
+
+    return '\n'.join(lines)
+
+
+def read_results(path):
+    """Return the results saved in a JSON file."""
+
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def write_results(path, results):
+    """Save results as a JSON file."""
+
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write('\n')
+
+
+def main(argv=None):
+    """Run the benchmarks and check them against the baseline.
+
+    Returns:
+        The exit status, 1 if the throughput regressed, else 0.
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the engines.')
+    parser.add_argument('--engine', action='append', choices=machine.ENGINES,
+                        help='An engine to run, all of them if not given.')
+    parser.add_argument('--workload', action='append',
+                        choices=[workload.name for workload in WORKLOADS],
+                        help='A workload to run, all of them if not given.')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help='The least seconds to run each pair.')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='The baseline JSON file.')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Save the results as the baseline.')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='The fraction the throughput may drop.')
+    parser.add_argument('--output', help='Also write the results here.')
+    args = parser.parse_args(argv)
+
+    workloads = WORKLOADS
+    if args.workload:
+        workloads = [workload for workload in WORKLOADS
+                     if workload.name in args.workload]
+
+    results = run_all(workloads, args.engine, args.min_time)
+    print(report(results))
+
+    if args.output:
+        write_results(args.output, results)
+
+    if args.save_baseline:
+        write_results(args.baseline, results)
+        print('\nSaved the baseline to {0}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('\nNo baseline at {0}'.format(args.baseline))
+        return 0
+
+    regressions = compare(results, read_results(args.baseline),
+                          args.threshold)
+    if not regressions:
+        print('\nNo regressions against {0}'.format(args.baseline))
+        return 0
+
+    print('\nRegressions against {0}:'.format(args.baseline))
+    for workload, engine, base, current in regressions:
+        print('{0} on {1}: {2:,.0f} instr/sec, was {3:,.0f}'.format(
+            workload, engine, current, base))
+
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""A memory mapped console output device.
+
+The console watches one address, the output port.  Each store to the
+port, STA PORT or STA,X, appends the stored magnitude to a buffer as a
+byte.  The buffer is written to the stream in large chunks, when it
+fills or when flush() is called, so a program printing a string costs
+one host write rather than one per character.  machine.Computer
+flushes the console when the computer halts.
+
+The value stored stays in memory as well, so reading the port gives
+the last byte written.
+"""
+
+import io
+import sys
+
+OUTPUT_PORT = 0xff
+BUFFER_SIZE = 4096
+
+
+class Console(object):
+    """A buffered output port in memory."""
+
+    def __init__(self, mem, port=OUTPUT_PORT, stream=None,
+                 buffer_size=BUFFER_SIZE):
+        """Attach the console to memory.
+
+        Args:
+            mem: memory.Memory.  The memory to watch.
+            port: int.  The address number of the output port.
+            stream: A text or binary stream, sys.stdout at the time of
+                each flush if None.  A text stream is written Latin-1
+                characters.
+            buffer_size: int.  The bytes to collect before writing.
+        """
+
+        self.mem = mem
+        self.port = port
+        self.stream = stream
+        self.buffer_size = buffer_size
+
+        self.buffer = bytearray()
+        self.bytes_written = 0
+        self.writes = 0
+
+        # Set while memory is loaded in bulk, which isn't output.
+        self.muted = False
+
+        mem.add_write_hook(self.write_hook)
+
+    def write_hook(self, num, old_num, old_neg):
+        """Collect the low byte of a value stored at the port."""
+
+        if num != self.port or self.muted:
+            return
+
+        self.buffer.append(self.mem.cells[num] & 0xff)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def output(self):
+        """Return the bytes waiting in the buffer."""
+
+        return bytes(self.buffer)
+
+    def flush(self):
+        """Write the buffer to the stream."""
+
+        if not self.buffer:
+            return
+
+        stream = self.stream
+        if stream is None:
+            stream = sys.stdout
+
+        if isinstance(stream, io.TextIOBase):
+            stream.write(self.buffer.decode('latin-1'))
+        else:
+            stream.write(self.buffer)
+        stream.flush()
+
+        self.bytes_written += len(self.buffer)
+        self.writes += 1
+        del self.buffer[:]
+
+    def close(self):
+        """Flush and stop watching memory."""
+
+        self.flush()
+        self.mem.remove_write_hook(self.write_hook)
@@ -5,27 +5,228 @@
 
 This computer runs in slow motion with a clock cycle time of one second.
 
-The speed is 1 Hz.
+The speed is 1 Hz by default.  Each clock can be given its own
+frequency, or be run unthrottled as fast as the host allows.
 """
 
+import array
+import asyncio
 import time
+import error
 import memory
 
-CLOCK_CYCLE_SEC = 1
+CLOCK_FREQ_HZ = 1
+UNTHROTTLED = None
+
+# Why the last Clock.run() stopped.
+HALTED = 'halted'
+STEP_LIMIT = 'step limit'
+TIME_LIMIT = 'time limit'
+
+# The most cycles an unpaced run with a budget hands the engine at once,
+# so a time budget is checked often enough.
+BUDGET_CHUNK = 4096
+
+# The most cycles Clock.run_async() runs before yielding to the event
+# loop.
+YIELD_EVERY = 1000
+
+# The fields of the machine state record.  Each register is a magnitude
+# and a negative flag, as in a memory.Value.
+ACCUM = 0
+ACCUM_NEG = 1
+IP = 2
+IP_NEG = 3
+IDX = 4
+IDX_NEG = 5
+RUN = 6
+ZEROX = 7
+OVERFLOW = 8
+ZERO = 9
+NUM_FIELDS = 10
+
+FIELD_NAMES = ('accum', 'accum_neg', 'ip', 'ip_neg', 'idx', 'idx_neg',
+               'run', 'zerox', 'overflow', 'zero')
+
+
+def state_field(index):
+    """Return a property for one field of the state record."""
+
+    def get_field(self):
+        return self.data[index]
+
+    def set_field(self, num):
+        self.data[index] = num
+
+    return property(get_field, set_field, doc=FIELD_NAMES[index])
+
+
+class State(object):
+    """The machine state record.
+
+    All the registers and flags, the CPU's and the ALU's, are kept as
+    plain ints in one flat array so the whole state can be copied,
+    compared or serialised in a single operation.  The fields are laid
+    out by the ACCUM ... ZERO indexes.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data=None):
+        """Initialize the record, all zero unless data is given.
+
+        Args:
+            data: iterable of NUM_FIELDS ints.
+        """
+
+        if data is None:
+            self.data = array.array('H', [0]) * NUM_FIELDS
+        else:
+            self.data = array.array('H', data)
+
+    accum = state_field(ACCUM)
+    accum_neg = state_field(ACCUM_NEG)
+    ip = state_field(IP)
+    ip_neg = state_field(IP_NEG)
+    idx = state_field(IDX)
+    idx_neg = state_field(IDX_NEG)
+    run = state_field(RUN)
+    zerox = state_field(ZEROX)
+    overflow = state_field(OVERFLOW)
+    zero = state_field(ZERO)
+
+    def copy(self):
+        """Return a copy of the record."""
+
+        return State(self.data)
+
+    def load(self, other):
+        """Overwrite this record with another in place."""
+
+        self.data[:] = other.data
+
+    def tobytes(self):
+        """Serialise the record."""
+
+        return self.data.tobytes()
+
+    def load_bytes(self, blob):
+        """Overwrite this record in place from serialised bytes."""
+
+        memoryview(self.data).cast('B')[:] = blob
+
+    @classmethod
+    def frombytes(cls, blob):
+        """Return a record from serialised bytes."""
+
+        state = cls()
+        state.data = array.array('H')
+        state.data.frombytes(blob)
+
+        return state
+
+    def __eq__(self, other):
+        """Compare two records for equality."""
+
+        return self.data == other.data
+
+    def __ne__(self, other):
+        """Compare two records for inequality."""
+
+        return self.data != other.data
+
+    def __repr__(self):
+        """A str representation of the record."""
+
+        fields = ', '.join('{0}={1}'.format(name, num)
+                           for name, num in zip(FIELD_NAMES, self.data))
+
+        return 'State({0})'.format(fields)
 
 
 class Registers(object):
-    """The collection of registers in the CPU."""
+    """The collection of registers in the CPU.
+
+    The registers are kept in a State record.  The accum, ip and idx
+    attributes read and write it as interned Values.
+    """
+
+    def __init__(self, state=None, word_size=None):
+        """Initialize the registers.
+
+        Args:
+            state: State.  The record to keep the registers in.  It's
+                shared with the ALU in an assembled computer.
+            word_size: memory.Word.  The word size, 8 bits if None.
+        """
+
+        if state is None:
+            state = State()
+        self.state = state
+
+        if word_size is None:
+            word_size = memory.word()
+        self.values = word_size.value_class.table
+        self.addresses = word_size.address_class.table
+
+    @property
+    def accum(self):
+        """The accumulator."""
+
+        data = self.state.data
+        return self.values[data[ACCUM_NEG]][data[ACCUM]]
+
+    @accum.setter
+    def accum(self, value):
+        data = self.state.data
+        data[ACCUM] = value.num
+        data[ACCUM_NEG] = value.negative_flag
+
+    @property
+    def ip(self):
+        """The instruction pointer."""
 
-    def __init__(self):
-        """Initialize the registers."""
+        data = self.state.data
+        return self.addresses[data[IP_NEG]][data[IP]]
 
-        self.accum = memory.Value(0)
-        self.ip = memory.Address(0)
-        self.idx = memory.Address(0)
+    @ip.setter
+    def ip(self, value):
+        data = self.state.data
+        data[IP] = value.num
+        data[IP_NEG] = value.negative_flag
 
-        self.run_flag = False
-        self.zerox_flag = False
+    @property
+    def idx(self):
+        """The index register."""
+
+        data = self.state.data
+        return self.values[data[IDX_NEG]][data[IDX]]
+
+    @idx.setter
+    def idx(self, value):
+        data = self.state.data
+        data[IDX] = value.num
+        data[IDX_NEG] = value.negative_flag
+
+    @property
+    def run_flag(self):
+        """True while the computer runs."""
+
+        return self.state.data[RUN] == 1
+
+    @run_flag.setter
+    def run_flag(self, flag):
+        self.state.data[RUN] = flag
+
+    @property
+    def zerox_flag(self):
+        """True when the index was decremented to zero."""
+
+        return self.state.data[ZEROX] == 1
+
+    @zerox_flag.setter
+    def zerox_flag(self, flag):
+        self.state.data[ZEROX] = flag
 
     def ip_inc(self):
         """Increment the IP."""
@@ -33,43 +234,315 @@ class Registers(object):
         self.ip = self.ip.inc()
 
 
+class FrequencyError(error.Error):
+    """A clock frequency must be a positive number of hertz."""
+
+
 class Clock(object):
     """The clock that drives the system."""
 
-    def __init__(self, reg, decoder):
-        """Save the registers and decoder."""
+    def __init__(self, reg, decoder, freq_hz=CLOCK_FREQ_HZ, trace=None,
+                 loop_detector=None):
+        """Save the registers and decoder.
+
+        Args:
+            reg: Registers.  The CPU registers.
+            decoder: Decoder.  Runs one fetch execute cycle per tick.
+            freq_hz: float.  The target clock frequency.  UNTHROTTLED
+                (None) runs the cycles as fast as the host allows.
+        Raises:
+            FrequencyError: freq_hz isn't positive.
+            trace: A trace sink from the tracer module, or None for no
+                trace.
+            loop_detector: A loopdetect.LoopDetector, or None to run
+                without looking for infinite loops.
+        """
 
         self.reg = reg
         self.decoder = decoder
+        self.freq_hz = freq_hz
+        self.trace = trace
+        self.loop_detector = loop_detector
+
+        self.cycles = 0
+        self.elapsed_sec = 0.0
+        self.stop_reason = None
+
+    @property
+    def freq_hz(self):
+        """The target clock frequency, or UNTHROTTLED."""
+
+        return self._freq_hz
+
+    @freq_hz.setter
+    def freq_hz(self, freq_hz):
+        if freq_hz is not UNTHROTTLED and not freq_hz > 0:
+            raise FrequencyError(
+                'Clock frequency {0} Hz is not positive'.format(freq_hz))
+        self._freq_hz = freq_hz
 
-    def run(self):
+    def achieved_hz(self):
+        """Return the emulated frequency actually achieved by the last run."""
+
+        if self.elapsed_sec <= 0:
+            return 0.0
+
+        return self.cycles / self.elapsed_sec
+
+    def run(self, max_steps=None, max_sec=None):
         """Start the clock and computer running.
 
         The computer runs the fetch execute cycle until the
         run_flag is false.  Then this method exits.  The memory
         and particularly the instruction pointer should be
         initialized before starting.
+
+        A budget of steps or seconds stops the run early with the run
+        flag still set, and stop_reason says which budget ran out.  A
+        loop detector raises loopdetect.LoopError when the state
+        repeats.  It may run up to one loop period of extra cycles
+        to confirm the loop, untraced.
+
+        An unthrottled run with no trace sink hands the whole run to the
+        decoder's run() method.  Otherwise each cycle is handed to the
+        trace sink, if there is one.  The sink is flushed before each
+        paced wait and when the run ends.
+
+        When paced, each cycle waits for an absolute deadline measured
+        from the start of the run rather than sleeping a fixed time, so
+        the time spent printing and executing doesn't accumulate as
+        drift.
+
+        Args:
+            max_steps: int.  The most cycles to run, or None for no limit.
+            max_sec: float.  The most seconds to run, or None for no
+                limit.
         """
 
-        self.reg.run_flag = True
+        period, start, deadline = self.start_run(max_sec)
+        trace = self.trace
+
+        if not period and trace is None:
+            try:
+                if (max_steps is None and deadline is None and
+                        self.loop_detector is None):
+                    # Nothing to do between cycles, so let the engine
+                    # run them.
+                    self.engine_run()
+                else:
+                    self.run_chunks(max_steps, deadline)
+            finally:
+                self.elapsed_sec = time.perf_counter() - start
+            return
+
+        while self.reg.run_flag:
+            if self.budget_spent(max_steps, deadline):
+                break
+
+            self.tick()
+
+            if period:
+                if trace is not None:
+                    trace.flush()
+
+                delay = start + self.cycles * period - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        self.elapsed_sec = time.perf_counter() - start
+
+        if trace is not None:
+            trace.flush()
+
+    async def run_async(self, max_steps=None, max_sec=None,
+                        yield_every=YIELD_EVERY):
+        """Run as run() does, as a coroutine on an asyncio event loop.
+
+        A paced run awaits asyncio.sleep() for each cycle's deadline
+        rather than blocking in time.sleep(), so many paced computers
+        can share one event loop.  An unpaced run hands the engine
+        yield_every cycles at a time and yields to the loop between
+        them.  A paced run that falls behind its deadlines also yields
+        at least every yield_every cycles.
+
+        Args:
+            max_steps: int.  The most cycles to run, or None for no limit.
+            max_sec: float.  The most seconds to run, or None for no
+                limit.
+            yield_every: int.  The most cycles to run without yielding.
+        """
 
+        period, start, deadline = self.start_run(max_sec)
+        trace = self.trace
+
+        if not period and trace is None:
+            while (self.reg.run_flag and
+                   not self.budget_spent(max_steps, deadline)):
+                self.run_chunk(yield_every, max_steps)
+                await asyncio.sleep(0)
+
+            self.elapsed_sec = time.perf_counter() - start
+            return
+
+        last_yield = 0
         while self.reg.run_flag:
-            msg = 'blink... IP: {0} A: {1} IDX: {2}'
-            print(msg.format(self.reg.ip.hex(), self.reg.accum.hex(),
-                             self.reg.idx.hex()))
+            if self.budget_spent(max_steps, deadline):
+                break
+
+            self.tick()
+
+            delay = 0.0
+            if period:
+                delay = start + self.cycles * period - time.perf_counter()
+            if delay > 0 or self.cycles - last_yield >= yield_every:
+                if trace is not None:
+                    trace.flush()
+                await asyncio.sleep(max(delay, 0.0))
+                last_yield = self.cycles
+
+        self.elapsed_sec = time.perf_counter() - start
+
+        if trace is not None:
+            trace.flush()
+
+    def start_run(self, max_sec):
+        """Reset the run counters and start the run timer.
+
+        Returns:
+            The cycle period, 0.0 if unthrottled, the start time and the
+            perf_counter() time to stop at, or None.
+        """
+
+        self.reg.run_flag = True
+        self.cycles = 0
+        self.stop_reason = HALTED
+
+        if self.freq_hz is UNTHROTTLED:
+            period = 0.0
+        else:
+            period = 1.0 / self.freq_hz
+
+        start = time.perf_counter()
+
+        deadline = None
+        if max_sec is not None:
+            deadline = start + max_sec
 
-            self.decoder.fetch_execute()
-            time.sleep(CLOCK_CYCLE_SEC)
+        return period, start, deadline
+
+    def budget_spent(self, max_steps, deadline):
+        """Return True, setting stop_reason, if a budget has run out."""
+
+        if max_steps is not None and self.cycles >= max_steps:
+            self.stop_reason = STEP_LIMIT
+            return True
+        if deadline is not None and time.perf_counter() >= deadline:
+            self.stop_reason = TIME_LIMIT
+            return True
+
+        return False
+
+    def tick(self):
+        """Run one cycle, traced and checked for a loop."""
+
+        if self.trace is not None:
+            self.trace.record(self.reg, self.decoder.alu)
+
+        self.decoder.fetch_execute()
+        self.cycles += 1
+
+        detector = self.loop_detector
+        if (detector is not None and self.reg.run_flag and
+                not self.cycles % detector.interval):
+            self.cycles += detector.check(self.cycles)
+
+    def run_chunk(self, chunk, max_steps):
+        """Hand the engine up to chunk cycles, within the step budget."""
+
+        detector = self.loop_detector
+        if detector is not None:
+            chunk = detector.interval
+
+        limit = chunk
+        if max_steps is not None:
+            limit = min(limit, max_steps - self.cycles)
+
+        self.engine_run(limit)
+
+        if detector is not None and self.reg.run_flag:
+            self.cycles += detector.check(self.cycles)
+
+    def engine_run(self, limit=None):
+        """Hand the engine up to limit cycles and count them.
+
+        An error that stops the run says how many cycles ran before it
+        in a cycles attribute, and those are counted too.
+        """
+
+        try:
+            self.cycles += self.decoder.run(limit)
+        except Exception as err:
+            self.cycles += getattr(err, 'cycles', 0)
+            raise
+
+    def run_chunks(self, max_steps, deadline):
+        """Run unpaced in chunks, checking the budgets between them.
+
+        Args:
+            max_steps: int.  The most cycles to run, or None.
+            deadline: float.  The perf_counter() time to stop at, or
+                None.
+        """
+
+        while (self.reg.run_flag and
+               not self.budget_spent(max_steps, deadline)):
+            self.run_chunk(BUDGET_CHUNK, max_steps)
 
 
 class ArithmeticLogicUnit(object):
-    """The ALU that does arithmetic."""
+    """The ALU that does arithmetic.
+
+    The flags are kept in a State record, normally the one shared with
+    the registers.
+    """
+
+    def __init__(self, state=None, word_size=None):
+        """Initialize the ALU.
+
+        Args:
+            state: State.  The record to keep the flags in.
+            word_size: memory.Word.  The word size, 8 bits if None.
+        """
 
-    def __init__(self):
-        """Initialize the ALU."""
+        if state is None:
+            state = State()
+        self.state = state
 
-        self.overflow_flag = False
-        self.zero_flag = False
+        if word_size is None:
+            word_size = memory.word()
+        self.max_num = word_size.max_num
+        self.num_values = word_size.num_values
+        self.value_class = word_size.value_class
+
+    @property
+    def overflow_flag(self):
+        """True when the last sum overflowed."""
+
+        return self.state.data[OVERFLOW] == 1
+
+    @overflow_flag.setter
+    def overflow_flag(self, flag):
+        self.state.data[OVERFLOW] = flag
+
+    @property
+    def zero_flag(self):
+        """True when the last sum was zero."""
+
+        return self.state.data[ZERO] == 1
+
+    @zero_flag.setter
+    def zero_flag(self, flag):
+        self.state.data[ZERO] = flag
 
     def add(self, val1, val2):
         """Add two values and return the resulting sum value."""
@@ -79,20 +552,17 @@ class ArithmeticLogicUnit(object):
 
         total_num = val1_num + val2_num
 
-        if total_num > 255:
+        if total_num > self.max_num:
             self.overflow_flag = True
-            total_num = total_num % 256
+            total_num = total_num % self.num_values
         else:
             self.overflow_flag = False
 
         self.zero_flag = (total_num == 0)
 
-        return memory.Value(total_num)
+        return self.value_class(total_num)
 
     def neg_add(self, val1, val2):
         """First negate val2 then add."""
 
-        neg_val2 = val2.copy()
-        neg_val2.negate()
-
-        return self.add(val1, neg_val2)
+        return self.add(val1, val2.negate())
@@ -0,0 +1,268 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Breakpoints on instructions and watchpoints on memory.
+
+A Debugger stops a run, or calls back, before the instruction at a
+breakpoint runs or before an instruction reads or writes a watched
+address,
+
+    dbg = debugger.Debugger(computer.decoder_obj)
+    dbg.add_breakpoint(0x2a)
+    dbg.add_watchpoint(0x18, debugger.WRITE)
+    try:
+        computer.clock.run()
+    except debugger.Break as brk:
+        print(brk)
+    computer.clock.run()        # Carries on from the break.
+
+A callback is called as callback(kind, ip, addr) with kind BREAKPOINT,
+READ or WRITE.  The run stops if it returns True and carries on if it
+returns anything else.  A point without a callback always stops.
+
+The instruction about to run is decoded to find the address it reads
+or writes, with the index added for ADD,X, LDA,X and STA,X, so the
+same check works on every engine.
+
+As with the profiler, adding the first point attaches an instrumented
+fetch_execute() and run() to the engine object itself, and removing
+the last takes them away again.  An engine with no points set runs its
+usual methods and pays nothing for the debugger.  The fast engines
+run one instruction at a time while any point is set.
+"""
+
+import cpu
+import decoder
+import error
+import instrument
+
+# The kinds of points.
+BREAKPOINT = 'breakpoint'
+READ = 'read'
+WRITE = 'write'
+ACCESS = 'access'
+
+# The op codes that read or write the address they're given, or the
+# address plus the index.
+READS = (decoder.ADD, decoder.LDA, decoder.SUB, decoder.LDX)
+WRITES = (decoder.STA, decoder.STX)
+INDEXED_READS = (decoder.ADDX, decoder.LDAX)
+INDEXED_WRITES = (decoder.STAX,)
+
+
+class Break(error.Error):
+    """A breakpoint or watchpoint stopped the run.
+
+    The instruction at ip hasn't run yet.
+
+    Attributes:
+        kind: str.  BREAKPOINT, READ or WRITE.
+        ip: int.  The address of the instruction.
+        addr: int.  The address read or written, or the IP for a
+            breakpoint.
+        cycles: int.  The cycles the engine's run() ran before the
+            break, so the Clock can count them.
+    """
+
+    def __init__(self, kind, ip, addr):
+        """Save where the run stopped."""
+
+        if kind == BREAKPOINT:
+            msg = 'Breakpoint at IP 0x{0:02x}'.format(ip)
+        else:
+            msg = 'Watchpoint on {0} of 0x{1:02x} at IP 0x{2:02x}'.format(
+                kind, addr, ip)
+
+        super().__init__(msg)
+        self.kind = kind
+        self.ip = ip
+        self.addr = addr
+        self.cycles = 0
+
+
+class PointKindError(error.Error):
+    """There is no kind of watchpoint by that name."""
+
+
+def access(mem, data, ip):
+    """Return how the instruction at ip will access memory.
+
+    Args:
+        mem: memory.Memory.  The memory holding the instruction.
+        data: array.  The state record data, for the index.
+        ip: int.  The address number of the instruction.
+    Returns:
+        READ or WRITE and the address number, or (None, None) if the
+        instruction doesn't access memory or its indexed address is
+        out of range.
+    """
+
+    if ip + 1 >= mem.size:
+        return None, None
+
+    op = mem.cells[ip]
+    addr = mem.cells[ip + 1]
+
+    if op in READS:
+        return READ, addr
+    if op in WRITES:
+        return WRITE, addr
+
+    if op in INDEXED_READS:
+        kind = READ
+    elif op in INDEXED_WRITES:
+        kind = WRITE
+    else:
+        return None, None
+
+    # As in MemoryInterface, the signed address plus the signed index.
+    if mem.is_negative(ip + 1):
+        addr = -addr
+    addr += -data[cpu.IDX] if data[cpu.IDX_NEG] else data[cpu.IDX]
+    addr = abs(addr)
+    if addr >= mem.size:
+        return None, None
+
+    return kind, addr
+
+
+class Debugger(object):
+    """Breakpoints and watchpoints for one engine.
+
+    Attributes:
+        breakpoints: dict.  The callback, or None, by IP number.
+        reads: dict.  The callback, or None, by watched address number.
+        writes: dict.  The callback, or None, by watched address number.
+        hits: int.  The points reached, stopping or not.
+    """
+
+    def __init__(self, engine):
+        """Make a debugger with no points set.
+
+        Args:
+            engine: An execution engine, as in machine.ENGINES.
+        """
+
+        self.engine = engine
+        self.enabled = False
+
+        self.breakpoints = {}
+        self.reads = {}
+        self.writes = {}
+        self.hits = 0
+
+        # The IP of the instruction a Break stopped before, so
+        # carrying on runs it rather than stopping there again.
+        self.resume_ip = None
+
+    def active(self):
+        """Return True if any point is set."""
+
+        return bool(self.breakpoints or self.reads or self.writes)
+
+    def add_breakpoint(self, ip, callback=None):
+        """Break before the instruction at address number ip runs."""
+
+        self.breakpoints[ip] = callback
+        self.update()
+
+    def remove_breakpoint(self, ip):
+        """Remove the breakpoint at address number ip, if there is one."""
+
+        self.breakpoints.pop(ip, None)
+        self.update()
+
+    def add_watchpoint(self, addr, kind=WRITE, callback=None):
+        """Break before an instruction accesses address number addr.
+
+        Args:
+            addr: int.  The address number to watch.
+            kind: str.  READ, WRITE or ACCESS for both.
+            callback: The function to call, or None to stop the run.
+        """
+
+        for points in self.watch_dicts(kind):
+            points[addr] = callback
+        self.update()
+
+    def remove_watchpoint(self, addr, kind=ACCESS):
+        """Stop watching address number addr for this kind of access."""
+
+        for points in self.watch_dicts(kind):
+            points.pop(addr, None)
+        self.update()
+
+    def clear(self):
+        """Remove every point."""
+
+        self.breakpoints.clear()
+        self.reads.clear()
+        self.writes.clear()
+        self.update()
+
+    def watch_dicts(self, kind):
+        """Return the dicts of watchpoints for a kind of access."""
+
+        if kind == READ:
+            return (self.reads,)
+        if kind == WRITE:
+            return (self.writes,)
+        if kind == ACCESS:
+            return (self.reads, self.writes)
+
+        raise PointKindError(kind)
+
+    def update(self):
+        """Instrument the engine while any point is set, and only then."""
+
+        if self.active() and not self.enabled:
+            instrument.attach(self.engine, self)
+            self.enabled = True
+        elif not self.active() and self.enabled:
+            instrument.detach(self.engine, self)
+            self.enabled = False
+            self.resume_ip = None
+
+    def hit(self, kind, ip, addr, callback):
+        """Call back for a point and raise Break if the run should stop."""
+
+        self.hits += 1
+        if callback is None or callback(kind, ip, addr) is True:
+            self.resume_ip = ip
+            raise Break(kind, ip, addr)
+
+    def fetch_execute(self):
+        """Check the points then run one fetch execute cycle."""
+
+        ip = self.engine.reg.state.data[cpu.IP]
+
+        # Only the first fetch after a Break may skip the checks, so a
+        # run moved elsewhere still stops at the point next time.
+        resume_ip = self.resume_ip
+        self.resume_ip = None
+
+        if ip != resume_ip:
+            if ip in self.breakpoints:
+                self.hit(BREAKPOINT, ip, ip, self.breakpoints[ip])
+
+            kind, addr = access(self.engine.mem, self.engine.reg.state.data,
+                                ip)
+            points = self.reads if kind == READ else self.writes
+            if kind is not None and addr in points:
+                self.hit(kind, ip, addr, points[addr])
+
+        self.engine_fetch_execute()
+
+    def run(self, limit=None):
+        """Run fetch execute cycles, checking the points, until a halt.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        Raises:
+            Break: A point stopped the run, with the cycles run before it.
+        """
+
+        return instrument.run_cycles(self.engine.reg, self.fetch_execute,
+                                     limit)
@@ -6,17 +6,82 @@
 Each instruction is a single value op code and a single value which
 can be interpreted as an address, an extended opcode, or a set of
 flags.
+
+The Decoder keeps a predecode cache.  The first time an instruction is
+fetched its handler and operand are saved by address, and the fetches
+after that skip the memory reads and the op code lookup.  Writes
+through Memory.write() or Memory.store() throw away the cached
+instructions they touch.
+
+Decoder.run() also fuses the common runs of instructions in FUSIONS
+into superinstructions.  The first time run() reaches a run of op
+codes that matches one, it predecodes the instructions together and
+from then on dispatches them as one, still calling the handler of each
+instruction in turn so the registers, flags and memory change just as
+they would one at a time.  A fused run stops early if an instruction
+jumps, skips, halts or writes over the run itself.  fetch_execute()
+always runs a single instruction.
 """
 
+import sys
+import cpu
 import error
 
+# The op codes.
+HLT = 0x01
+ADD = 0x20
+LDA = 0x21
+STA = 0x22
+JMP = 0x23
+SZA = 0x24
+SUB = 0x25
+LDX = 0x26
+STX = 0x27
+SZX = 0x28
+DCX = 0x29
+ADDX = 0x40  # ADD,X
+LDAX = 0x41  # LDA,X
+STAX = 0x42  # STA,X
+
+# The runs of op codes fused into superinstructions, by name.  The
+# longest should come first where they overlap.
+FUSIONS = (
+    ('LDA,X STA,X DCX SZX', (LDAX, STAX, DCX, SZX)),
+    ('LDA ADD STA', (LDA, ADD, STA)),
+    ('ADD SZA JMP', (ADD, SZA, JMP)),
+)
+
+# The op codes that write memory, after which a fused run checks that
+# it hasn't been written over.
+WRITES = (STA, STX, STAX)
+
+# The most addresses a fused run covers.
+FUSED_SPAN = 2 * max(len(ops) for _, ops in FUSIONS)
+
+# Marks an address not yet looked at for fusion.
+UNKNOWN = object()
+
 
 class IndexCarryError(error.Error):
     """When indexing an address the carry was true which is an overflow."""
 
 
 class Decoder(object):
-    """Decode op codes into instructions."""
+    """Decode op codes into instructions.
+
+    Attributes:
+        cache: dict.  The predecoded (handler, addr, next_ip) entries by
+            address number.
+        hits: int.  The fetches served from the cache.
+        misses: int.  The fetches that had to decode the instruction.
+        fuse: bool.  Fuse runs of instructions in run().
+        fused: dict.  The fused (name, steps) entry, or None if there is
+            none, by the address number of its first instruction.
+        fusion_counts: dict.  The times each fusion was dispatched, by
+            name.
+        fused_instructions: int.  The instructions run by fused
+            dispatches.
+    """
 
     def __init__(self, reg, mem, alu):
         """Create the op code instruction map."""
@@ -25,22 +90,34 @@ class Decoder(object):
 
         self.mem = mem
         self.reg = reg
+        self.alu = alu
 
         self.op_codes = {}
-        self.op_codes[0x01] = self.instr.halt
-        self.op_codes[0x20] = self.instr.add
-        self.op_codes[0x21] = self.instr.lda
-        self.op_codes[0x22] = self.instr.sta
-        self.op_codes[0x23] = self.instr.jmp
-        self.op_codes[0x24] = self.instr.sza
-        self.op_codes[0x25] = self.instr.sub
-        self.op_codes[0x26] = self.instr.ldx
-        self.op_codes[0x27] = self.instr.stx
-        self.op_codes[0x28] = self.instr.szx
-        self.op_codes[0x29] = self.instr.dcx
-        self.op_codes[0x40] = self.instr.addx  # ADD,X
-        self.op_codes[0x41] = self.instr.ldax  # LDA,X
-        self.op_codes[0x42] = self.instr.stax  # STA,X
+        self.op_codes[HLT] = self.instr.halt
+        self.op_codes[ADD] = self.instr.add
+        self.op_codes[LDA] = self.instr.lda
+        self.op_codes[STA] = self.instr.sta
+        self.op_codes[JMP] = self.instr.jmp
+        self.op_codes[SZA] = self.instr.sza
+        self.op_codes[SUB] = self.instr.sub
+        self.op_codes[LDX] = self.instr.ldx
+        self.op_codes[STX] = self.instr.stx
+        self.op_codes[SZX] = self.instr.szx
+        self.op_codes[DCX] = self.instr.dcx
+        self.op_codes[ADDX] = self.instr.addx
+        self.op_codes[LDAX] = self.instr.ldax
+        self.op_codes[STAX] = self.instr.stax
+
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+        self.fuse = True
+        self.fused = {}
+        self.fusion_counts = dict((name, 0) for name, _ in FUSIONS)
+        self.fused_instructions = 0
+
+        mem.add_write_hook(self.invalidate, self.forget)
 
     def fetch_execute(self):
         """The fetch execute cycle.
@@ -53,13 +130,229 @@ class Decoder(object):
         the next address after these two.
         """
 
-        op_code = self.mem.read(self.reg.ip)
-        self.reg.ip_inc()
-        addr = self.mem.read(self.reg.ip)
-        self.reg.ip_inc()
+        ip_num = self.reg.ip.num
+        entry = self.cache.get(ip_num)
+
+        if entry is None:
+            self.misses += 1
+
+            op_code = self.mem.read(self.reg.ip)
+            self.reg.ip_inc()
+            addr = self.mem.read(self.reg.ip)
+            self.reg.ip_inc()
+
+            handler = self.op_codes[op_code.num]
+
+            # Cached before executing, so an instruction that writes
+            # over itself is thrown away again.
+            self.cache[ip_num] = (handler, addr, self.reg.ip)
+        else:
+            self.hits += 1
+            handler, addr, next_ip = entry
+            self.reg.ip = next_ip
 
         # Execute the instruction on addr.
-        self.op_codes[op_code.num](addr)
+        handler(addr)
+
+    def run(self, limit=None):
+        """Run fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        Raises:
+            An error that stops the run is given a cycles attribute, the
+            cycles run before it.
+        """
+
+        reg = self.reg
+        count = 0
+
+        if not self.fuse:
+            try:
+                while reg.run_flag and (limit is None or count < limit):
+                    self.fetch_execute()
+                    count += 1
+            except Exception as err:
+                err.cycles = count
+                raise
+
+            return count
+
+        # The state record is read directly here, since the Address a
+        # reg.ip makes on each cycle would cost more than fusion saves.
+        data = reg.state.data
+        run_field = cpu.RUN
+        ip_field = cpu.IP
+        cache = self.cache
+        fused = self.fused
+        counts = self.fusion_counts
+        hits = 0
+        misses = 0
+        fused_instructions = 0
+        done = 0
+        if limit is None:
+            limit = sys.maxsize
+
+        try:
+            while data[run_field] and count < limit:
+                ip_num = data[ip_field]
+                entry = fused.get(ip_num, UNKNOWN)
+                decoded = entry is UNKNOWN
+                if decoded:
+                    entry = fused[ip_num] = self.fuse_at(ip_num)
+
+                if entry is None or limit - count < len(entry[1]):
+                    # One instruction, as in fetch_execute().
+                    cached = cache.get(ip_num)
+                    if cached is None:
+                        self.fetch_execute()
+                    else:
+                        hits += 1
+                        handler, addr, next_ip = cached
+                        reg.ip = next_ip
+                        handler(addr)
+                    count += 1
+                    continue
+
+                name, steps = entry
+                done = 0
+                for handler, addr, next_ip, next_num, writes in steps:
+                    reg.ip = next_ip
+                    handler(addr)
+                    done += 1
+
+                    if not data[run_field] or data[ip_field] != next_num:
+                        # A jump, skip or halt.
+                        break
+                    if writes and fused.get(ip_num) is not entry:
+                        # The run was written over.
+                        break
+
+                count += done
+                if decoded:
+                    # fuse_at() just decoded these, so they were missed.
+                    misses += done
+                else:
+                    hits += done
+                fused_instructions += done
+                counts[name] += 1
+                done = 0
+        except Exception as err:
+            err.cycles = count + done
+            raise
+        finally:
+            self.hits += hits
+            self.misses += misses
+            self.fused_instructions += fused_instructions
+
+        return count
+
+    def fuse_at(self, ip_num):
+        """Return the fused entry starting at ip_num, or None.
+
+        Returns:
+            The name of the fusion and a tuple of a (handler, addr,
+            next_ip, next_ip number, writes) step per instruction.
+        """
+
+        mem = self.mem
+        cells = mem.cells
+
+        for name, ops in FUSIONS:
+            # The IP after the run must be an address too.
+            end = ip_num + 2 * len(ops)
+            if end >= mem.size:
+                continue
+            if all(cells[ip_num + 2 * pos] == op
+                   for pos, op in enumerate(ops)):
+                break
+        else:
+            return None
+
+        address_class = mem.word.address_class
+        steps = []
+        for num in range(ip_num, end, 2):
+            op = cells[num]
+            steps.append((self.op_codes[op],
+                          mem.read(address_class(num + 1)),
+                          address_class(num + 2), num + 2, op in WRITES))
+
+        return name, tuple(steps)
+
+    def invalidate(self, num, old_num, old_neg):
+        """Forget the cached instructions that hold address number num.
+
+        An instruction is two addresses, so the one starting at num and
+        the one starting just before it are dropped.
+        """
+
+        cache = self.cache
+        if num in cache:
+            del cache[num]
+        if num - 1 in cache:
+            del cache[num - 1]
+
+        fused = self.fused
+        if fused:
+            for start in range(num - FUSED_SPAN + 1, num + 1):
+                if start in fused:
+                    del fused[start]
+
+    def forget(self):
+        """Forget every cached instruction, as after a load."""
+
+        self.cache.clear()
+        self.fused.clear()
+
+    def clear_cache(self):
+        """Forget every cached instruction and zero the counters."""
+
+        self.forget()
+        self.reset_counters()
+
+    def reset_counters(self):
+        """Zero the hit and miss and the fusion counters."""
+
+        self.hits = 0
+        self.misses = 0
+        for name in self.fusion_counts:
+            self.fusion_counts[name] = 0
+        self.fused_instructions = 0
+
+    def dispatches_saved(self):
+        """Return the dispatches fusion saved, one less per fused run."""
+
+        return self.fused_instructions - sum(self.fusion_counts.values())
+
+    def fusion_report(self):
+        """Return how often each fusion was dispatched as text."""
+
+        fetches = self.hits + self.misses
+        saved = self.dispatches_saved()
+
+        lines = ['{0:<22} {1:>10}'.format('Fusion', 'Dispatches')]
+        for name, _ in FUSIONS:
+            lines.append('{0:<22} {1:>10}'.format(name,
+                                                  self.fusion_counts[name]))
+
+        lines.append('')
+        lines.append('{0} of {1} instructions fused, {2} dispatches '
+                     'saved ({3:.1f}%)'.format(
+                         self.fused_instructions, fetches, saved,
+                         100.0 * saved / fetches if fetches else 0.0))
+
+        return '\n'.join(lines)
+
+    def hit_rate(self):
+        """Return the fraction of fetches served from the cache."""
+
+        fetches = self.hits + self.misses
+        if not fetches:
+            return 0.0
+
+        return self.hits / fetches
 
 
 class MemoryInterface(object):
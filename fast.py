@@ -0,0 +1,339 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""A fast execution engine on plain ints.
+
+The FastEngine runs the same instruction set as decoder.Decoder, but
+it works directly on the State record and the memory bytearray and
+sign bitmap instead of on Value objects.  The registers are cached in
+local variables for the whole run and the op codes are dispatched by
+an if chain, so one instruction costs a handful of int operations.
+
+The semantics are the same as the reference Decoder, including the
+sign-magnitude values, the overflow and zero flags, the ValueRangeError
+when the IP runs off the end of memory and the IndexCarryError of the
+indexed instructions.  The state is written back even when one of
+those errors stops the run.
+"""
+
+import sys
+import cpu
+import decoder
+import memory
+
+HLT = decoder.HLT
+ADD = decoder.ADD
+LDA = decoder.LDA
+STA = decoder.STA
+JMP = decoder.JMP
+SZA = decoder.SZA
+SUB = decoder.SUB
+LDX = decoder.LDX
+STX = decoder.STX
+SZX = decoder.SZX
+DCX = decoder.DCX
+ADDX = decoder.ADDX
+LDAX = decoder.LDAX
+STAX = decoder.STAX
+
+
+class FastEngine(object):
+    """Execute instructions on raw ints.
+
+    This has the same interface as decoder.Decoder, fetch_execute() for
+    one cycle and run() for many.
+    """
+
+    def __init__(self, reg, mem, alu):
+        """Save the registers, memory and ALU."""
+
+        self.reg = reg
+        self.mem = mem
+        self.alu = alu
+
+    def fetch_execute(self):
+        """Run one fetch execute cycle, even if the run flag is clear."""
+
+        self.execute(1)
+
+    def run(self, limit=None):
+        """Run fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        Raises:
+            An error that stops the run is given a cycles attribute, the
+            cycles run before it.
+        """
+
+        if not self.reg.state.data[cpu.RUN]:
+            return 0
+
+        return self.execute(limit)
+
+    def execute(self, limit=None):
+        """Execute up to limit instructions or until a halt.
+
+        Args:
+            limit: int.  The most instructions, or None for no limit.
+        Returns:
+            The number of instructions executed.
+        Raises:
+            An error that stops the run is given a cycles attribute, the
+            instructions that finished before it.
+        """
+
+        data = self.reg.state.data
+        flags = self.alu.state.data
+        cells = self.mem.cells
+        signs = self.mem.signs
+
+        # Write hooks need every store to go through Memory.store().
+        store = None
+        if self.mem.hooks:
+            store = self.mem.store
+
+        # The accumulator is kept as a signed int.  Only a load can
+        # make it negative zero, which acc_neg_zero remembers.
+        acc = data[cpu.ACCUM]
+        acc_neg_zero = 0
+        if data[cpu.ACCUM_NEG]:
+            acc = -acc
+            acc_neg_zero = acc == 0
+
+        ip = data[cpu.IP]
+        ip_neg = data[cpu.IP_NEG]
+        idx = data[cpu.IDX]
+        idx_neg = data[cpu.IDX_NEG]
+        run = data[cpu.RUN]
+        zerox = data[cpu.ZEROX]
+        overflow = flags[cpu.OVERFLOW]
+        zero = flags[cpu.ZERO]
+
+        # The word size is fixed when the memory is made, so its limits
+        # are looked up once per call rather than on each instruction.
+        word_size = self.mem.word
+        max_num = word_size.max_num
+        min_num = -max_num
+        num_values = word_size.num_values
+        last_fetch = max_num - 2
+
+        if limit is None:
+            limit = sys.maxsize
+        count = 0
+
+        # The IP's negative flag is cleared by every fetch and only set
+        # by a JMP, so it's worked out from the last op code at the end
+        # rather than on every cycle.
+        op = JMP if ip_neg else HLT
+
+        try:
+            for count in range(1, limit + 1):
+                if ip > last_fetch:
+                    # The IP would run past the last address.
+                    if ip < max_num:
+                        ip += 1
+                        op = HLT
+                    raise memory.ValueRangeError(ip + 1)
+
+                op = cells[ip]
+                addr = cells[ip + 1]
+                ip += 2
+
+                if op == LDA:
+                    acc = cells[addr]
+                    if signs[addr >> 3] >> (addr & 7) & 1:
+                        acc = -acc
+                        acc_neg_zero = acc == 0
+                    else:
+                        acc_neg_zero = 0
+
+                elif op == ADD:
+                    if signs[addr >> 3] >> (addr & 7) & 1:
+                        total = acc - cells[addr]
+                    else:
+                        total = acc + cells[addr]
+
+                    if total > max_num:
+                        overflow = 1
+                        total %= num_values
+                    else:
+                        overflow = 0
+                        if total < min_num:
+                            zero = 0
+                            raise memory.ValueRangeError(-total)
+                    acc = total
+                    zero = acc == 0
+                    acc_neg_zero = 0
+
+                elif op == STA:
+                    if store is not None:
+                        store(addr, -acc if acc < 0 else acc,
+                              acc < 0 or acc_neg_zero)
+                    elif acc < 0 or acc_neg_zero:
+                        cells[addr] = -acc
+                        signs[addr >> 3] |= 1 << (addr & 7)
+                    else:
+                        cells[addr] = acc
+                        signs[addr >> 3] &= ~(1 << (addr & 7))
+
+                elif op == JMP:
+                    ip_neg = signs[(ip - 1) >> 3] >> ((ip - 1) & 7) & 1
+                    ip = addr
+
+                elif op == SZA:
+                    if zero:
+                        if ip > last_fetch:
+                            if ip < max_num:
+                                ip += 1
+                            raise memory.ValueRangeError(ip + 1)
+                        ip += 2
+
+                elif op == SUB:
+                    if signs[addr >> 3] >> (addr & 7) & 1:
+                        total = acc + cells[addr]
+                    else:
+                        total = acc - cells[addr]
+
+                    if total > max_num:
+                        overflow = 1
+                        total %= num_values
+                    else:
+                        overflow = 0
+                        if total < min_num:
+                            zero = 0
+                            raise memory.ValueRangeError(-total)
+                    acc = total
+                    zero = acc == 0
+                    acc_neg_zero = 0
+
+                elif op == LDX:
+                    idx = cells[addr]
+                    idx_neg = signs[addr >> 3] >> (addr & 7) & 1
+
+                elif op == STX:
+                    if store is not None:
+                        store(addr, idx, idx_neg)
+                    else:
+                        cells[addr] = idx
+                        if idx_neg:
+                            signs[addr >> 3] |= 1 << (addr & 7)
+                        else:
+                            signs[addr >> 3] &= ~(1 << (addr & 7))
+
+                elif op == SZX:
+                    if zerox:
+                        if ip > last_fetch:
+                            if ip < max_num:
+                                ip += 1
+                            raise memory.ValueRangeError(ip + 1)
+                        ip += 2
+
+                elif op == DCX:
+                    # As Value.inc(-1), which ignores the negative flag.
+                    if idx:
+                        idx -= 1
+                        idx_neg = 0
+                        zerox = idx == 0
+                    else:
+                        idx = 1
+                        idx_neg = 1
+                        zerox = 0
+
+                elif op == HLT:
+                    run = 0
+                    break
+
+                elif op == ADDX or op == LDAX or op == STAX:
+                    # The address is signed here, as in Value.__add__, and
+                    # only its magnitude is used to read or write.
+                    if signs[(ip - 1) >> 3] >> ((ip - 1) & 7) & 1:
+                        addr = -addr
+                    addr = addr - idx if idx_neg else addr + idx
+
+                    if addr > max_num or addr < min_num:
+                        raise index_carry_error(addr, idx, idx_neg,
+                                                word_size)
+                    if addr < 0:
+                        addr = -addr
+
+                    if op == LDAX:
+                        acc = cells[addr]
+                        if signs[addr >> 3] >> (addr & 7) & 1:
+                            acc = -acc
+                            acc_neg_zero = acc == 0
+                        else:
+                            acc_neg_zero = 0
+
+                    elif op == STAX:
+                        if store is not None:
+                            store(addr, -acc if acc < 0 else acc,
+                                  acc < 0 or acc_neg_zero)
+                        elif acc < 0 or acc_neg_zero:
+                            cells[addr] = -acc
+                            signs[addr >> 3] |= 1 << (addr & 7)
+                        else:
+                            cells[addr] = acc
+                            signs[addr >> 3] &= ~(1 << (addr & 7))
+
+                    else:
+                        if signs[addr >> 3] >> (addr & 7) & 1:
+                            total = acc - cells[addr]
+                        else:
+                            total = acc + cells[addr]
+
+                        if total > max_num:
+                            overflow = 1
+                            total %= num_values
+                        else:
+                            overflow = 0
+                            if total < min_num:
+                                zero = 0
+                                raise memory.ValueRangeError(-total)
+                        acc = total
+                        zero = acc == 0
+                        acc_neg_zero = 0
+
+                else:
+                    raise KeyError(op)
+
+        except Exception as err:
+            # The instruction that raised didn't finish.
+            err.cycles = count - 1
+            raise
+        finally:
+            if op != JMP:
+                ip_neg = 0
+
+            data[cpu.ACCUM] = -acc if acc < 0 else acc
+            data[cpu.ACCUM_NEG] = acc < 0 or acc_neg_zero
+            data[cpu.IP] = ip
+            data[cpu.IP_NEG] = ip_neg
+            data[cpu.IDX] = idx
+            data[cpu.IDX_NEG] = idx_neg
+            data[cpu.RUN] = run
+            data[cpu.ZEROX] = zerox
+            flags[cpu.OVERFLOW] = overflow
+            flags[cpu.ZERO] = zero
+
+        return count
+
+
+def index_carry_error(num, idx, idx_neg, word_size=None):
+    """Return the IndexCarryError the reference MemoryInterface raises."""
+
+    if word_size is None:
+        word_size = memory.word()
+
+    if num > 0:
+        num -= word_size.num_values
+    else:
+        num += word_size.num_values
+
+    msg = 'Overflow with addr {0} and index {1}'
+    value_class = word_size.value_class
+    index = value_class.interned(idx, idx_neg)
+
+    return decoder.IndexCarryError(msg.format(value_class(num), index))
@@ -0,0 +1,129 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Computers, engines and programs shared by the tests."""
+
+import cpu
+import machine
+import memory
+import prog_3_addnums
+
+# Batch jobs, the (data, program, start_ip) a machine.Computer takes.
+JOB = (prog_3_addnums.DATA, prog_3_addnums.PROGRAM, 0x20)
+
+# JMP to itself forever.
+LOOP_JOB = ((), ((0x20, 0x23), (0x21, 0x20)), 0x20)
+
+# An ADD,X that carries out of range.
+CARRY_JOB = (((0x10, 0x20),),
+             ((0x20, 0x26), (0x21, 0x10), (0x22, 0x40), (0x23, 0xf0)), 0x20)
+
+# The op codes random_cells() picks from.
+OP_CODES = (0x01, 0x20, 0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28,
+            0x29, 0x40, 0x41, 0x42)
+
+
+def make_computer(engine='reference', data=prog_3_addnums.DATA,
+                  program=prog_3_addnums.PROGRAM, **kwargs):
+    """Return an unthrottled, untraced computer with its program stored.
+
+    It runs prog_3_addnums unless given other data and program.  Other
+    keyword arguments are passed to machine.Computer.
+    """
+
+    computer = machine.Computer(data=data, program=program,
+                                freq_hz=cpu.UNTHROTTLED, trace='none',
+                                engine=engine, **kwargs)
+    computer.store()
+
+    return computer
+
+
+def job_computer(job, engine='fast'):
+    """Return a computer loaded with a batch style job."""
+
+    data, program, start_ip = job
+
+    return make_computer(engine, data, program,
+                         start_ip=memory.Address(start_ip))
+
+
+def build(engine_class, cells, start_ip=0x20, neg_zeros=(), bits=8,
+          paged=False):
+    """Return an engine over memory holding the signed cells.
+
+    The addresses in neg_zeros hold a negative zero instead.  The memory
+    is a memory.PagedMemory if paged.
+    """
+
+    word_size = memory.word(bits)
+    address_class = word_size.address_class
+    value_class = word_size.value_class
+
+    state = cpu.State()
+    reg = cpu.Registers(state, word_size)
+    if paged:
+        mem = memory.PagedMemory(word_size=word_size, page_size=64)
+    else:
+        mem = memory.Memory(word_size=word_size)
+    alu = cpu.ArithmeticLogicUnit(state, word_size)
+
+    for num, cell in enumerate(cells):
+        mem.write(address_class(num), value_class(cell))
+
+    for num in neg_zeros:
+        mem.write(address_class(num), value_class(0).negate())
+
+    reg.ip = address_class(start_ip)
+    reg.run_flag = True
+
+    return engine_class(reg, mem, alu)
+
+
+def run_steps(engine, steps):
+    """Run up to steps cycles and return the outcome.
+
+    Returns:
+        The state, cells, signs and the type of any error raised.
+    """
+
+    error_type = None
+    try:
+        for _ in range(steps):
+            if not engine.reg.run_flag:
+                break
+            engine.fetch_execute()
+    except Exception as err:
+        error_type = type(err)
+
+    return (engine.reg.state.copy(), bytes(engine.mem.cell_bytes()),
+            bytes(engine.mem.sign_view()), error_type)
+
+
+def run_bulk(engine, steps):
+    """Like run_steps but with a single call to run()."""
+
+    error_type = None
+    try:
+        engine.run(steps)
+    except Exception as err:
+        error_type = type(err)
+
+    return (engine.reg.state.copy(), bytes(engine.mem.cell_bytes()),
+            bytes(engine.mem.sign_view()), error_type)
+
+
+def random_cells(rand, size=memory.SIZE, max_cell=memory.MAX_NUM):
+    """Return random signed cells, mostly valid instructions."""
+
+    cells = []
+    for num in range(size):
+        if num % 2 == 0 and rand.random() < 0.8:
+            cells.append(rand.choice(OP_CODES))
+        else:
+            cell = rand.randint(0, max_cell)
+            if rand.random() < 0.2:
+                cell = -cell
+            cells.append(cell)
+
+    return cells
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Binary program images.
+
+An image holds the initial memory of a program and where to start it,
+in a form that loads with bulk copies instead of one Value at a time.
+It's laid out as
+
+    header     magic b'SMIM', version, start IP, memory size and the
+               number of segments
+    signs      the sign bitmap of the whole memory, one bit per address
+    segments   a (start, length) pair for each segment
+    cells      the magnitudes of each segment, one after the other
+
+A segment is a run of consecutive addresses.  load_image() memory maps
+the file and copies each segment straight into the memory's cells.
+
+To turn one of the prog_* programs into an image,
+
+    python3 image.py prog_3_addnums prog_3_addnums.img
+"""
+
+import importlib
+import mmap
+import struct
+import sys
+import error
+import memory
+
+MAGIC = b'SMIM'
+VERSION = 1
+
+HEADER = struct.Struct('<4sBxHIH')
+SEGMENT = struct.Struct('<II')
+
+
+class ImageError(error.Error):
+    """The image is malformed."""
+
+
+class Image(object):
+    """A program image.
+
+    Attributes:
+        start_ip: int.  The address to start running at.
+        size: int.  The size of the memory the image is for.
+        segments: list of (start, bytes) pairs.  The magnitudes of each
+            run of addresses.
+        signs: bytes.  The sign bitmap of the whole memory.
+    """
+
+    def __init__(self, start_ip, segments, signs, size=memory.SIZE):
+        """Save the parts of the image."""
+
+        self.start_ip = start_ip
+        self.segments = segments
+        self.signs = signs
+        self.size = size
+
+    @classmethod
+    def from_pairs(cls, pairs, start_ip=0x20, size=memory.SIZE):
+        """Make an image from (address, value) pairs.
+
+        Args:
+            pairs: iterable of (int, int) pairs, as the DATA and PROGRAM
+                of the prog_* programs.  A later pair for an address
+                replaces an earlier one.
+            start_ip: int.  The address to start running at.
+            size: int.  The size of the memory.
+        """
+
+        nums = {}
+        for addr, num in pairs:
+            if not 0 <= addr < size:
+                raise ImageError('Address {0} out of range'.format(addr))
+            if abs(num) > memory.MAX_NUM:
+                raise memory.ValueRangeError(abs(num))
+            nums[addr] = num
+
+        signs = bytearray((size + 7) // 8)
+        segments = []
+        run_start = None
+        run = bytearray()
+
+        for addr in sorted(nums):
+            if run_start is None or addr != run_start + len(run):
+                if run_start is not None:
+                    segments.append((run_start, bytes(run)))
+                run_start = addr
+                run = bytearray()
+
+            num = nums[addr]
+            run.append(abs(num))
+            if num < 0:
+                signs[addr >> 3] |= 1 << (addr & 7)
+
+        if run_start is not None:
+            segments.append((run_start, bytes(run)))
+
+        return cls(start_ip, segments, bytes(signs), size)
+
+    def tobytes(self):
+        """Return the image serialised."""
+
+        parts = [HEADER.pack(MAGIC, VERSION, self.start_ip, self.size,
+                             len(self.segments)),
+                 self.signs]
+        parts.extend(SEGMENT.pack(start, len(cells))
+                     for start, cells in self.segments)
+        parts.extend(cells for _, cells in self.segments)
+
+        return b''.join(parts)
+
+    @classmethod
+    def frombuffer(cls, buf):
+        """Return an image from a buffer made by tobytes()."""
+
+        view = memoryview(buf)
+        start_ip, size, table = read_header(view)
+
+        segments = [(start, bytes(view[offset:offset + length]))
+                    for start, offset, length in table]
+        signs = bytes(view[HEADER.size:HEADER.size + (size + 7) // 8])
+
+        return cls(start_ip, segments, signs, size)
+
+    def load_into(self, mem):
+        """Copy the image into a memory.Memory."""
+
+        buf = self.tobytes()
+        load_buffer(memoryview(buf), mem)
+
+
+def read_header(view):
+    """Check an image's header and read its segment table.
+
+    Args:
+        view: memoryview.  The whole image.
+    Returns:
+        The start IP, the memory size and a list of (start, offset,
+        length) triples, the offset being where the segment's cells are
+        in the image.
+    """
+
+    if len(view) < HEADER.size:
+        raise ImageError('Image too short for a header')
+
+    magic, version, start_ip, size, num_segments = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ImageError('Not an image, magic {0!r}'.format(magic))
+    if version != VERSION:
+        raise ImageError('Unknown image version {0}'.format(version))
+
+    offset = HEADER.size + (size + 7) // 8
+    cells_offset = offset + num_segments * SEGMENT.size
+    if cells_offset > len(view):
+        raise ImageError('Image truncated in the segment table')
+
+    table = []
+    for start, length in SEGMENT.iter_unpack(view[offset:cells_offset]):
+        if start + length > size:
+            raise ImageError('Segment at {0} runs past the memory'.format(
+                start))
+        table.append((start, cells_offset, length))
+        cells_offset += length
+
+    if cells_offset > len(view):
+        raise ImageError('Image truncated')
+
+    return start_ip, size, table
+
+
+def load_buffer(view, mem):
+    """Copy an image in a buffer into memory.
+
+    The segments are sliced into a copy of the cells and the sign bits
+    of the segments are merged with masks on whole ints, then the lot is
+    handed to Memory.load() at once.
+
+    Returns:
+        The start IP.
+    """
+
+    start_ip, size, table = read_header(view)
+    if size != mem.size:
+        raise ImageError('Image for {0} addresses, memory has {1}'.format(
+            size, mem.size))
+
+    signs_end = HEADER.size + (size + 7) // 8
+    image_signs = int.from_bytes(view[HEADER.size:signs_end], 'little')
+
+    cells = bytearray(mem.cell_bytes())
+    signs = int.from_bytes(mem.sign_view(), 'little')
+    for start, offset, length in table:
+        cells[start:start + length] = view[offset:offset + length]
+
+        mask = ((1 << length) - 1) << start
+        signs = (signs & ~mask) | (image_signs & mask)
+
+    mem.load(bytes(cells), signs.to_bytes(len(mem.signs), 'little'))
+
+    return start_ip
+
+
+def load_image(path, mem):
+    """Memory map an image file and load it into memory.
+
+    Returns:
+        The start IP.
+    """
+
+    with open(path, 'rb') as image_file:
+        try:
+            mapped = mmap.mmap(image_file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ImageError('Empty image file {0}'.format(path))
+
+    with mapped:
+        view = memoryview(mapped)
+        try:
+            return load_buffer(view, mem)
+        finally:
+            view.release()
+
+
+def read_image(path):
+    """Return the Image in a file."""
+
+    with open(path, 'rb') as image_file:
+        return Image.frombuffer(image_file.read())
+
+
+def write_image(path, data=(), program=(), start_ip=0x20):
+    """Write tuple data and program pairs as an image file.
+
+    Args:
+        path: str.  The file to write.
+        data: list of tuple pairs.  The data of a prog_* program.
+        program: list of tuple pairs.  The program of a prog_* program.
+        start_ip: int.  The address to start running at.
+    Returns:
+        The Image.
+    """
+
+    image = Image.from_pairs(tuple(data) + tuple(program), start_ip)
+
+    with open(path, 'wb') as image_file:
+        image_file.write(image.tobytes())
+
+    return image
+
+
+def main():
+    """Write the image of a prog_* module."""
+
+    if len(sys.argv) != 3:
+        print('Usage: image.py PROG_MODULE IMAGE_FILE')
+        sys.exit(2)
+
+    prog = importlib.import_module(sys.argv[1])
+    image = write_image(sys.argv[2], getattr(prog, 'DATA', ()),
+                        getattr(prog, 'PROGRAM', ()))
+
+    print('Wrote {0} segments to {1}'.format(len(image.segments),
+                                             sys.argv[2]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Swap an engine's methods for instrumented ones.
+
+The profiler, debugger, journal and trace recorder each watch every
+cycle of an engine.  Rather than have the engines check for them, each
+sets its own fetch_execute() and run() on the engine object, which
+hide the class's methods, and takes them away again when done.  An
+engine with nothing attached runs its own methods with no check at
+all.
+
+More than one can be attached at a time.  They form a chain, kept on
+the engine as instruments, each calling the engine_fetch_execute() of
+the one attached before it.  Detaching one, in any order, takes only
+that one out of the chain.
+"""
+
+# The engine methods that are replaced.
+METHODS = ('fetch_execute', 'run')
+
+
+def attach(engine, instrument):
+    """Set an instrument's methods on an engine object.
+
+    The instrument's engine_fetch_execute is set to the engine's
+    fetch_execute() before this, for the instrument to call.
+
+    Args:
+        engine: An execution engine, as in machine.ENGINES.
+        instrument: An object with fetch_execute() and run(limit=None)
+            methods.
+    """
+
+    chain = vars(engine).setdefault('instruments', [])
+
+    instrument.engine_fetch_execute = engine.fetch_execute
+    engine.fetch_execute = instrument.fetch_execute
+    engine.run = instrument.run
+    chain.append(instrument)
+
+
+def detach(engine, instrument):
+    """Take an instrument out of an engine's chain.
+
+    Args:
+        engine: An execution engine.
+        instrument: An instrument given to attach().
+    """
+
+    chain = vars(engine)['instruments']
+    index = chain.index(instrument)
+    del chain[index]
+
+    if index < len(chain):
+        # The one attached after it calls what it called.
+        chain[index].engine_fetch_execute = instrument.engine_fetch_execute
+    elif chain:
+        engine.fetch_execute = chain[-1].fetch_execute
+        engine.run = chain[-1].run
+    else:
+        for name in METHODS + ('instruments',):
+            del vars(engine)[name]
+
+
+def run_cycles(reg, fetch_execute, limit=None):
+    """Run fetch execute cycles one at a time until the computer halts.
+
+    Args:
+        reg: cpu.Registers.  The registers with the run flag.
+        fetch_execute: The method that runs one cycle.
+        limit: int.  The most cycles to run, or None for no limit.
+    Returns:
+        The number of cycles run.
+    Raises:
+        An error that stops the run is given a cycles attribute, the
+        cycles run before it.
+    """
+
+    count = 0
+    try:
+        while reg.run_flag and (limit is None or count < limit):
+            fetch_execute()
+            count += 1
+    except Exception as err:
+        err.cycles = count
+        raise
+
+    return count
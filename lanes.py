@@ -0,0 +1,366 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Run many machines in lockstep on NumPy arrays.
+
+A Lanes object holds N complete machines, the lanes, as arrays.  The
+memory is an N x 256 matrix of magnitudes and a matching matrix of
+negative flags.  The registers and flags are a NUM_FIELDS x N matrix,
+one length N vector for each field of a cpu.State record.
+
+Each step runs one fetch execute cycle on every lane that is still
+running.  The lanes don't have to agree on their IPs.  The op codes are
+gathered per lane and each instruction is applied to the lanes whose
+op code it is, so lanes that branch differently, halt early or stop on
+an error simply drop out of the later steps.
+
+This is meant for sweeps that run one program over many data inputs,
+
+    sweep = lanes.Lanes(10000, data=DATA, program=PROGRAM)
+    sweep.write(0x10, numpy.arange(10000) % 256)
+    sweep.run()
+    totals = sweep.read(0x18)
+
+Each lane ends in the same state as a machine.Computer run on the same
+memory.  An error that would raise in the Computer stops only its own
+lane and is recorded in the errors array.
+
+NumPy is optional.  The module imports without it but Lanes can't be
+created.
+"""
+
+import cpu
+import decoder
+import error
+import memory
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAX_NUM = memory.MAX_NUM
+NUM_VALUES = memory.NUM_VALUES
+LAST_FETCH = MAX_NUM - 2
+
+START_PROG = 0x20
+
+# The error codes of the lanes.
+OK = 0
+VALUE_RANGE = 1
+INDEX_CARRY = 2
+BAD_OP_CODE = 3
+
+# The exception the Computer would raise for each error code.
+ERROR_TYPES = (None, memory.ValueRangeError, decoder.IndexCarryError,
+               KeyError)
+
+
+class NumpyMissingError(error.Error):
+    """NumPy is needed to run lanes."""
+
+
+class Lanes(object):
+    """Many machines run in lockstep.
+
+    Attributes:
+        mags: numpy array.  The N x SIZE memory magnitudes.
+        negs: numpy array.  The N x SIZE memory negative flags.
+        state: numpy array.  The NUM_FIELDS x N registers and flags.
+        errors: numpy array.  The error code of each lane, OK if none.
+        cycles: numpy array.  The cycles each lane has run.
+    """
+
+    def __init__(self, num_lanes, data=(), program=(), start_ip=START_PROG):
+        """Create the lanes, all with the same memory.
+
+        Args:
+            num_lanes: int.  The number of machines.
+            data: list of tuple pairs.  The pairs are numbers, address and
+                value, as for machine.Computer.
+            program: list of tuple pairs.  Like data.
+            start_ip: int.  The starting address of the program code.
+        """
+
+        if numpy is None:
+            raise NumpyMissingError('NumPy is not installed')
+
+        self.num_lanes = num_lanes
+
+        self.mags = numpy.zeros((num_lanes, memory.SIZE), numpy.uint8)
+        self.negs = numpy.zeros((num_lanes, memory.SIZE), numpy.bool_)
+        self.state = numpy.zeros((cpu.NUM_FIELDS, num_lanes), numpy.int32)
+        self.errors = numpy.zeros(num_lanes, numpy.uint8)
+        self.cycles = numpy.zeros(num_lanes, numpy.int64)
+
+        self.load(data)
+        self.load(program)
+
+        self.state[cpu.IP] = start_ip
+        self.state[cpu.RUN] = 1
+
+    def load(self, pairs):
+        """Write (address, value) pairs into the memory of every lane."""
+
+        for addr, num in pairs:
+            self.write(addr, num)
+
+    def write(self, addr, nums):
+        """Write signed numbers at an address.
+
+        Args:
+            addr: int.  The address number.
+            nums: int or sequence of N ints.  One value for every lane or
+                a value per lane, each on range(-255, 256).
+        """
+
+        nums = numpy.asarray(nums)
+        if numpy.any(numpy.abs(nums) > MAX_NUM):
+            raise memory.ValueRangeError(int(numpy.abs(nums).max()))
+
+        self.mags[:, addr] = numpy.abs(nums)
+        self.negs[:, addr] = nums < 0
+
+    def read(self, addr):
+        """Return the signed number at an address in every lane."""
+
+        mags = self.mags[:, addr].astype(numpy.int32)
+
+        return numpy.where(self.negs[:, addr], -mags, mags)
+
+    def running(self):
+        """Return the indexes of the lanes still running."""
+
+        return numpy.flatnonzero((self.state[cpu.RUN] != 0) &
+                                 (self.errors == OK))
+
+    def run(self, limit=None):
+        """Step every lane until they have all stopped.
+
+        Args:
+            limit: int.  The most steps to run, or None for no limit.
+        Returns:
+            The number of steps run.
+        """
+
+        steps = 0
+        while limit is None or steps < limit:
+            if not self.step():
+                break
+            steps += 1
+
+        return steps
+
+    def step(self):
+        """Run one fetch execute cycle on every running lane.
+
+        Returns:
+            The number of lanes that ran.
+        """
+
+        state = self.state
+        mags = self.mags
+        negs = self.negs
+
+        rows = self.running()
+        if not rows.size:
+            return 0
+        num_rows = rows.size
+        self.cycles[rows] += 1
+
+        ip = state[cpu.IP][rows]
+
+        # A fetch from the last two addresses runs the IP off the end.
+        # From 0xfe it gets as far as 0xff first.
+        off_end = ip > LAST_FETCH
+        if off_end.any():
+            stopped = rows[off_end]
+            at_fe = stopped[ip[off_end] < MAX_NUM]
+            state[cpu.IP][at_fe] = MAX_NUM
+            state[cpu.IP_NEG][at_fe] = 0
+            self.errors[stopped] = VALUE_RANGE
+
+            rows = rows[~off_end]
+            ip = ip[~off_end]
+
+        # Gathering from the flattened matrix is quicker than pairing
+        # the row and column indexes.
+        cell = rows * memory.SIZE + ip
+        op = mags.ravel().take(cell)
+        addr = mags.ravel().take(cell + 1).astype(numpy.int32)
+        addr_neg = negs.ravel().take(cell + 1)
+
+        ip += 2
+        state[cpu.IP][rows] = ip
+        state[cpu.IP_NEG][rows] = 0
+
+        handled = numpy.zeros(rows.size, numpy.bool_)
+
+        def select(op_code):
+            sel = op == op_code
+            handled[sel] = True
+            return sel
+
+        sel = select(decoder.LDA)
+        if sel.any():
+            self.load_accum(rows[sel], addr[sel])
+
+        for op_code in (decoder.ADD, decoder.SUB):
+            sel = select(op_code)
+            if sel.any():
+                self.add(rows[sel], addr[sel], op_code == decoder.SUB)
+
+        sel = select(decoder.STA)
+        if sel.any():
+            self.store_accum(rows[sel], addr[sel])
+
+        sel = select(decoder.JMP)
+        if sel.any():
+            state[cpu.IP][rows[sel]] = addr[sel]
+            state[cpu.IP_NEG][rows[sel]] = addr_neg[sel]
+
+        for op_code, flag in ((decoder.SZA, cpu.ZERO),
+                              (decoder.SZX, cpu.ZEROX)):
+            sel = select(op_code)
+            if sel.any():
+                skip = sel.copy()
+                skip[sel] = state[flag][rows[sel]] != 0
+                self.skip(rows[skip], ip[skip])
+
+        sel = select(decoder.LDX)
+        if sel.any():
+            sel_rows = rows[sel]
+            sel_addr = addr[sel]
+            state[cpu.IDX][sel_rows] = mags[sel_rows, sel_addr]
+            state[cpu.IDX_NEG][sel_rows] = negs[sel_rows, sel_addr]
+
+        sel = select(decoder.STX)
+        if sel.any():
+            sel_rows = rows[sel]
+            sel_addr = addr[sel]
+            mags[sel_rows, sel_addr] = state[cpu.IDX][sel_rows]
+            negs[sel_rows, sel_addr] = state[cpu.IDX_NEG][sel_rows] != 0
+
+        sel = select(decoder.DCX)
+        if sel.any():
+            # As Value.inc(-1), which ignores the negative flag.
+            sel_rows = rows[sel]
+            idx = state[cpu.IDX][sel_rows]
+            at_zero = idx == 0
+            state[cpu.IDX][sel_rows] = numpy.where(at_zero, 1, idx - 1)
+            state[cpu.IDX_NEG][sel_rows] = at_zero
+            state[cpu.ZEROX][sel_rows] = idx == 1
+
+        sel = select(decoder.HLT)
+        if sel.any():
+            state[cpu.RUN][rows[sel]] = 0
+
+        indexed = (select(decoder.ADDX) | select(decoder.LDAX) |
+                   select(decoder.STAX))
+        if indexed.any():
+            self.indexed(rows[indexed], op[indexed], addr[indexed],
+                         addr_neg[indexed])
+
+        self.errors[rows[~handled]] = BAD_OP_CODE
+
+        return num_rows
+
+    def signed(self, rows, field, neg_field):
+        """Return a register of the rows as signed numbers."""
+
+        nums = self.state[field][rows]
+
+        return numpy.where(self.state[neg_field][rows] != 0, -nums, nums)
+
+    def load_accum(self, rows, addr):
+        """Load the accumulator of the rows from their addresses."""
+
+        self.state[cpu.ACCUM][rows] = self.mags[rows, addr]
+        self.state[cpu.ACCUM_NEG][rows] = self.negs[rows, addr]
+
+    def store_accum(self, rows, addr):
+        """Store the accumulator of the rows at their addresses."""
+
+        self.mags[rows, addr] = self.state[cpu.ACCUM][rows]
+        self.negs[rows, addr] = self.state[cpu.ACCUM_NEG][rows] != 0
+
+    def add(self, rows, addr, subtract=False):
+        """Add the numbers at the addresses to the accumulator.
+
+        The flags follow cpu.ArithmeticLogicUnit.add().  A sum below
+        -255 is a ValueRangeError, which leaves the accumulator alone.
+        """
+
+        state = self.state
+
+        nums = self.mags[rows, addr].astype(numpy.int32)
+        negative = self.negs[rows, addr] != subtract
+        total = (self.signed(rows, cpu.ACCUM, cpu.ACCUM_NEG) +
+                 numpy.where(negative, -nums, nums))
+
+        overflow = total > MAX_NUM
+        total[overflow] %= NUM_VALUES
+        under = total < -MAX_NUM
+
+        state[cpu.OVERFLOW][rows] = overflow
+        state[cpu.ZERO][rows] = total == 0
+
+        self.errors[rows[under]] = VALUE_RANGE
+
+        ok = ~under
+        state[cpu.ACCUM][rows[ok]] = numpy.abs(total[ok])
+        state[cpu.ACCUM_NEG][rows[ok]] = total[ok] < 0
+
+    def skip(self, rows, ip):
+        """Skip the next instruction of the rows at ip."""
+
+        off_end = ip > LAST_FETCH
+
+        self.state[cpu.IP][rows] = numpy.where(off_end, MAX_NUM, ip + 2)
+        self.errors[rows[off_end]] = VALUE_RANGE
+
+    def indexed(self, rows, op, addr, addr_neg):
+        """Run the ADD,X, LDA,X and STA,X instructions of the rows."""
+
+        eff = (numpy.where(addr_neg, -addr, addr) +
+               self.signed(rows, cpu.IDX, cpu.IDX_NEG))
+
+        carry = numpy.abs(eff) > MAX_NUM
+        self.errors[rows[carry]] = INDEX_CARRY
+
+        ok = ~carry
+        rows = rows[ok]
+        op = op[ok]
+        eff = numpy.abs(eff[ok])
+
+        for op_code in (decoder.ADDX, decoder.LDAX, decoder.STAX):
+            sel = op == op_code
+            if not sel.any():
+                continue
+
+            if op_code == decoder.ADDX:
+                self.add(rows[sel], eff[sel])
+            elif op_code == decoder.LDAX:
+                self.load_accum(rows[sel], eff[sel])
+            else:
+                self.store_accum(rows[sel], eff[sel])
+
+    def lane_state(self, lane):
+        """Return the registers and flags of a lane as a cpu.State."""
+
+        return cpu.State(self.state[:, lane].tolist())
+
+    def lane_memory(self, lane):
+        """Return the memory of a lane as a memory.Memory."""
+
+        mem = memory.Memory()
+        mem.cells[:] = self.mags[lane].tobytes()
+        mem.signs[:] = numpy.packbits(self.negs[lane],
+                                      bitorder='little').tobytes()
+
+        return mem
+
+    def lane_error(self, lane):
+        """Return the exception type that stopped a lane, or None."""
+
+        return ERROR_TYPES[self.errors[lane]]
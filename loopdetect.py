@@ -0,0 +1,206 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Detect a program stuck in an infinite loop.
+
+The machine has no input, so once its whole state, the registers, the
+flags and every address of memory, is the same as at some earlier
+cycle it will go around the same loop forever.  A LoopDetector watches
+for that,
+
+    detector = loopdetect.LoopDetector(computer.decoder_obj)
+    computer.clock.loop_detector = detector
+    computer.clock.run()        # Raises LoopError if the state repeats.
+
+Memory is hashed Zobrist style.  Each address holding anything but
+zero contributes a 64-bit key for its address, magnitude and sign, and
+the hash is the xor of the keys.  A write hook xors out the old key and
+xors in the new one, so keeping the hash costs O(1) per write.  The
+registers and flags are only a few ints and their bytes are hashed
+into it on each check.  Only that 64-bit hash is remembered for each
+state seen.
+
+A repeated hash is only a candidate.  The detector then steps the
+engine one instruction at a time for up to the candidate's period and
+compares the full state byte for byte, so a loop is never reported
+because of a hash collision.  The first exact repeat gives the loop's
+period.  The IP it reports is the one the loop was found at, which the
+loop goes through but needn't start at.
+"""
+
+import cpu
+import error
+
+# States to remember before starting over, which bounds the memory a
+# long run can use.  Each is a hash and a cycle in a dict, about 100
+# bytes, so about 7 MB.  A loop with a longer period isn't found.
+MAX_STATES = 1 << 16
+
+MASK = (1 << 64) - 1
+
+
+class LoopError(error.Error):
+    """The machine state repeated, so the program never halts.
+
+    Attributes:
+        ip: int.  The IP the loop was found at.  It's on the loop, but
+            not necessarily the loop's first instruction.
+        period: int.  The cycles once around the loop.
+        cycle: int.  The cycle the loop was confirmed at.
+    """
+
+    def __init__(self, ip, period, cycle):
+        """Save where the loop is."""
+
+        super().__init__(
+            'Infinite loop of {0} cycles at IP 0x{1:02x}'.format(period, ip))
+        self.ip = ip
+        self.period = period
+        self.cycle = cycle
+
+
+def mix(num):
+    """Return a well mixed 64-bit key for an int, as splitmix64."""
+
+    num = (num + 0x9e3779b97f4a7c15) & MASK
+    num = ((num ^ (num >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+    num = ((num ^ (num >> 27)) * 0x94d049bb133111eb) & MASK
+
+    return num ^ (num >> 31)
+
+
+def cell_key(num, mag, neg):
+    """Return the Zobrist key of an address holding a value.
+
+    An address holding zero has no key, so untouched memory costs
+    nothing to hash.
+    """
+
+    if not mag and not neg:
+        return 0
+
+    return mix(num << 17 | mag << 1 | neg)
+
+
+class LoopDetector(object):
+    """Watch an engine's machine for a repeated state.
+
+    Attributes:
+        mem_hash: int.  The Zobrist hash of memory.
+        candidates: int.  The repeated hashes checked in full.
+        collisions: int.  The candidates that weren't really repeats.
+    """
+
+    def __init__(self, engine, interval=1, max_states=MAX_STATES):
+        """Start watching the machine of an engine.
+
+        Args:
+            engine: An execution engine, as in machine.ENGINES.
+            interval: int.  The cycles between checks.  The Clock runs
+                the engine this many cycles at a time, so a larger
+                interval is quicker but finds a loop later.
+            max_states: int.  The states to remember before starting
+                over.
+        """
+
+        self.engine = engine
+        self.mem = engine.mem
+        self.data = engine.reg.state.data
+        self.flags = engine.alu.state.data
+        self.interval = interval
+        self.max_states = max_states
+
+        self.seen = {}
+        self.candidates = 0
+        self.collisions = 0
+
+        cells = self.mem.cells
+        self.mem_hash = 0
+        for num in range(self.mem.size):
+            self.mem_hash ^= cell_key(num, cells[num],
+                                      self.mem.is_negative(num))
+
+        self.mem.add_write_hook(self.write_hook)
+
+    def close(self):
+        """Stop watching memory."""
+
+        self.mem.remove_write_hook(self.write_hook)
+
+    def write_hook(self, num, old_num, old_neg):
+        """Update the hash for a write."""
+
+        mem = self.mem
+        self.mem_hash ^= (cell_key(num, old_num, old_neg) ^
+                          cell_key(num, mem.cells[num],
+                                   mem.signs[num >> 3] >> (num & 7) & 1))
+
+    def key(self):
+        """Return the 64-bit hash of the machine state."""
+
+        regs = self.data.tobytes()
+        if self.flags is not self.data:
+            regs += self.flags.tobytes()
+
+        return self.mem_hash ^ (hash(regs) & MASK)
+
+    def full_state(self):
+        """Return the whole machine state as bytes."""
+
+        return b''.join((self.data.tobytes(), self.flags.tobytes(),
+                         self.mem.cell_bytes(), self.mem.sign_view()))
+
+    def reset(self):
+        """Forget the states seen so far."""
+
+        self.seen.clear()
+
+    def check(self, cycle):
+        """Check the state at a cycle against the states seen before.
+
+        Args:
+            cycle: int.  The cycles run so far.
+        Returns:
+            The extra cycles run checking a candidate, 0 if there was
+            none.
+        Raises:
+            LoopError: The state repeated.
+        """
+
+        key = self.key()
+        earlier = self.seen.get(key)
+
+        if earlier is None:
+            if len(self.seen) >= self.max_states:
+                self.seen.clear()
+            self.seen[key] = cycle
+            return 0
+
+        self.candidates += 1
+        return self.verify(key, cycle, cycle - earlier)
+
+    def verify(self, key, cycle, max_period):
+        """Step the engine to find the exact period of a candidate.
+
+        If the state at cycle truly repeated, the machine comes back to
+        it within max_period cycles.
+        """
+
+        state = self.full_state()
+        ip = self.data[cpu.IP]
+        reg = self.engine.reg
+        fetch_execute = self.engine.fetch_execute
+
+        steps = 0
+        while steps < max_period and reg.run_flag:
+            fetch_execute()
+            steps += 1
+
+            if self.key() == key and self.full_state() == state:
+                raise LoopError(ip, steps, cycle + steps)
+
+        # A hash collision, so carry on from here.
+        self.collisions += 1
+        self.seen[self.key()] = cycle + steps
+
+        return steps
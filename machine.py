@@ -3,9 +3,17 @@
 
 """The simple machine."""
 
+import console
 import cpu
+import debugger
 import decoder
+import error
+import fast
+import image
 import memory
+import profiler
+import tracer
+import translator
 import version
 
 ADDR = memory.Address
@@ -13,11 +21,37 @@ VALUE = memory.Value
 
 START_PROG = ADDR(0x20)
 
+# The execution engines by name.  Each is built from the registers,
+# memory and ALU and has fetch_execute() and run().
+ENGINES = {
+    'reference': decoder.Decoder,
+    'fast': fast.FastEngine,
+    'translate': translator.Translator,
+}
+
+
+# A snapshot is the state record, the memory cells and the sign bitmap.
+# These are the sizes for an 8-bit word, see Computer.snapshot_size().
+STATE_SIZE = cpu.NUM_FIELDS * cpu.State().data.itemsize
+SIGNS_SIZE = (memory.SIZE + 7) // 8
+SNAPSHOT_SIZE = STATE_SIZE + memory.SIZE + SIGNS_SIZE
+
+
+class EngineError(error.Error):
+    """There is no execution engine by that name."""
+
+
+class SnapshotError(error.Error):
+    """The snapshot is the wrong size."""
+
 
 class Computer(object):
     """The assembled computer."""
 
-    def __init__(self, data=None, program=None, start_ip=START_PROG):
+    def __init__(self, data=None, program=None, start_ip=START_PROG,
+                 freq_hz=cpu.CLOCK_FREQ_HZ, trace='text',
+                 engine='reference', output=None,
+                 word_bits=memory.WORD_BITS, paged=False, profile=False):
         """Initialize and assemble the parts.
 
         Args:
@@ -27,6 +61,19 @@ class Computer(object):
                 value.
             start_ip: int.  This is an int, typically in hex, the starting
                 address of the program code.
+            freq_hz: float.  The clock frequency, or cpu.UNTHROTTLED to
+                run as fast as possible.
+            trace: str.  The kind of per cycle trace, 'none', 'text' or
+                'ring'.  See tracer.make_trace().
+            engine: str.  The name of the execution engine in ENGINES.
+            output: A stream for a console.Console at the output port
+                console.OUTPUT_PORT, or None for no console.
+            word_bits: int.  The bits in a word, 8 or 16.  Values and
+                addresses are both one word.
+            paged: bool.  Use a memory.PagedMemory, which only holds the
+                pages the program writes.
+            profile: bool.  Count the instructions run with a
+                profiler.Profiler and print its report after a run.
         """
 
         if data is None:
@@ -37,23 +84,134 @@ class Computer(object):
             program = ()
         self.program = program
 
+        self.freq_hz = freq_hz
+        self.trace_kind = trace
+        self.trace = tracer.make_trace(trace)
+        self.engine = engine
+        self.start_ip = start_ip
+        self.output = output
+        self.word_bits = word_bits
+        self.word = memory.word(word_bits)
+        self.paged = paged
+        self.profile = profile
+
         self.setup_computer(start_ip)
 
     def setup_computer(self, start_ip):
         """Build the computer."""
 
-        self.reg = cpu.Registers()
-        self.mem = memory.Memory()
-        self.alu = cpu.ArithmeticLogicUnit()
-        self.decoder_obj = decoder.Decoder(self.reg, self.mem, self.alu)
-        self.clock = cpu.Clock(self.reg, self.decoder_obj)
+        self.state = cpu.State()
+        self.reg = cpu.Registers(self.state, self.word)
+        if self.paged:
+            self.mem = memory.PagedMemory(word_size=self.word)
+        else:
+            self.mem = memory.Memory(word_size=self.word)
+        self.alu = cpu.ArithmeticLogicUnit(self.state, self.word)
+        if self.engine not in ENGINES:
+            raise EngineError(self.engine)
+
+        self.console = None
+        if self.output is not None:
+            self.console = console.Console(self.mem, stream=self.output)
+
+        engine_class = ENGINES[self.engine]
+        self.decoder_obj = engine_class(self.reg, self.mem, self.alu)
+
+        self.profiler = None
+        if self.profile:
+            self.profiler = profiler.Profiler(self.decoder_obj)
+            self.profiler.enable()
+        self.debugger = debugger.Debugger(self.decoder_obj)
+        self.clock = cpu.Clock(self.reg, self.decoder_obj,
+                               freq_hz=self.freq_hz, trace=self.trace)
 
         self.reg.ip = start_ip
 
+    def snapshot(self):
+        """Return the registers, flags and memory as one bytes blob."""
+
+        return b''.join((self.state.tobytes(), self.mem.cell_bytes(),
+                         self.mem.sign_view()))
+
+    def snapshot_size(self):
+        """Return the size of a snapshot of this computer."""
+
+        return STATE_SIZE + len(self.mem.cell_bytes()) + len(self.mem.signs)
+
+    def restore(self, blob):
+        """Put the computer back to a snapshot.
+
+        Args:
+            blob: bytes.  A snapshot from this or another computer.
+        """
+
+        size = self.snapshot_size()
+        if len(blob) != size:
+            raise SnapshotError('Snapshot of {0} bytes, not {1}'.format(
+                len(blob), size))
+
+        blob = memoryview(blob)
+        cells_end = STATE_SIZE + len(self.mem.cell_bytes())
+
+        self.state.load_bytes(blob[:STATE_SIZE])
+
+        self.mute_console(True)
+        try:
+            self.mem.load(bytes(blob[STATE_SIZE:cells_end]),
+                          bytes(blob[cells_end:]))
+        finally:
+            self.mute_console(False)
+
+    def mute_console(self, muted):
+        """Stop or restart the console taking output, if there is one."""
+
+        if self.console is not None:
+            self.console.muted = muted
+
+    def clone(self):
+        """Return a new computer in the same state as this one.
+
+        The clone has its own engine, clock and trace.  Its memory is
+        copied, except that a paged memory shares its pages copy on
+        write, so a clone of a 16-bit machine costs little until it
+        runs.
+        """
+
+        computer = Computer(data=self.data, program=self.program,
+                            start_ip=self.start_ip, freq_hz=self.freq_hz,
+                            trace=self.trace_kind, engine=self.engine,
+                            output=self.output, word_bits=self.word_bits,
+                            paged=self.paged, profile=self.profile)
+        computer.state.load_bytes(self.state.tobytes())
+
+        computer.mute_console(True)
+        try:
+            computer.mem.load_from(self.mem)
+        finally:
+            computer.mute_console(False)
+
+        return computer
+
+    def load_image(self, path):
+        """Load a binary program image and set the IP to its start.
+
+        See the image module.
+        """
+
+        self.mute_console(True)
+        try:
+            start_num = image.load_image(path, self.mem)
+        finally:
+            self.mute_console(False)
+
+        self.reg.ip = self.word.address_class(start_num)
+
     def read_in_data(self, data_in):
         """Read in tuple pairs of address data and store."""
 
-        data = [(ADDR(a), VALUE(v)) for a, v in data_in]
+        address_class = self.word.address_class
+        value_class = self.word.value_class
+        data = [(address_class(a), value_class(v)) for a, v in data_in]
 
         for pair in data:
             self.mem.write(*pair)
@@ -68,6 +226,12 @@ class Computer(object):
 
         self.read_in_data(self.program)
 
+    def store(self):
+        """Store our data and program."""
+
+        self.store_data()
+        self.store_program()
+
     def prog_display(self):
         """Display the data and program memory."""
 
@@ -84,11 +248,28 @@ class Computer(object):
         start_num = a_list[0][0]
         end_num = a_list[-1][0] + 1
 
-        start_addr = memory.Address(start_num)
-        end_addr = memory.Address(end_num)
+        start_addr = self.word.address_class(start_num)
+        end_addr = self.word.address_class(end_num)
 
         return self.mem.display_range(start_addr, end_addr, printable)
 
+    async def run_async(self, max_steps=None, max_sec=None):
+        """Run the stored program as a coroutine on an asyncio event loop.
+
+        Args:
+            max_steps: int.  The most cycles to run, or None for no limit.
+            max_sec: float.  The most seconds to run, or None for no
+                limit.
+        Returns:
+            The clock's stop_reason.
+        """
+
+        await self.clock.run_async(max_steps, max_sec)
+        if self.console is not None:
+            self.console.flush()
+
+        return self.clock.stop_reason
+
     def run(self, title, run_flag=False, printable=False, print_after=False):
         """Run the program."""
 
@@ -96,8 +277,7 @@ class Computer(object):
         print(title)
         print()
 
-        self.store_data()
-        self.store_program()
+        self.store()
 
         print('Data:\n')
         print(self.data_display(printable=printable))
@@ -111,10 +291,18 @@ class Computer(object):
             print('*** Running...\n')
 
             self.clock.run()
+            if self.console is not None:
+                self.console.flush()
             print()
             print('*** Halted.')
+            msg = '*** {0} cycles at {1:.1f} Hz.'
+            print(msg.format(self.clock.cycles, self.clock.achieved_hz()))
             print()
 
+            if self.profiler is not None:
+                print(self.profiler.report())
+                print()
+
         if run_flag and print_after:
             print('Data:\n')
             print(self.data_display(printable=printable))
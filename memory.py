@@ -3,38 +3,88 @@
 
 """Computer memory.
 
-One-byte values in one-byte addresses.
+One-byte values in one-byte addresses, or with a 16-bit Word two-byte
+values in two-byte addresses.
 """
 
+import array
 import error
 
+WORD_BITS = 8
 SIZE = 256
+NUM_VALUES = 256
+MAX_NUM = NUM_VALUES - 1
+PAGE_SIZE = 256
 
 
 class ValueRangeError(error.Error):
     """The value is out of range."""
 
 
+class WordSizeError(error.Error):
+    """There is no word of that many bits."""
+
+
+class PageSizeError(error.Error):
+    """A page size must be a power of two of at least 8 addresses."""
+
+
 class Value(object):
-    """A value from memory."""
+    """A value from memory.
+
+    Values are immutable and interned.  There is one object for each of
+    the 512 sign and magnitude combinations, made when the module is
+    loaded, and creating a Value only looks it up.  Nothing in the fetch
+    execute cycle allocates a new Value.
+    """
+
+    __slots__ = ('num', 'negative_flag')
+
+    table = ()
+    num_values = NUM_VALUES
+    max_num = MAX_NUM
+    min_num = -MAX_NUM
 
-    def __init__(self, num):
-        """Initialize with an input num.
+    def __new__(cls, num):
+        """Return the value for an input num.
 
         Args:
-          num: int. The num must be on range(256).
+          num: int. The num must be on range(-255, 256), or the range of
+            the class's word.
         """
 
         if num < 0:
-            self.negative_flag = True
             num = -num
-        else:
-            self.negative_flag = False
+            if num > cls.max_num:
+                raise ValueRangeError(num)
+
+            return cls.table[True][num]
 
-        if num < 0 or num > 255:
+        if num > cls.max_num:
             raise ValueRangeError(num)
-        else:
-            self.num = num
+
+        return cls.table[False][num]
+
+    @classmethod
+    def interned(cls, num, negative_flag=False):
+        """Return the value for a magnitude and negative flag.
+
+        The num must already be on range(256).
+        """
+
+        return cls.table[bool(negative_flag)][num]
+
+    def __setattr__(self, name, value):
+        """Values are immutable."""
+
+        raise AttributeError('{0} is immutable'.format(
+            self.__class__.__name__))
+
+    def __reduce__(self):
+        """Unpickle to the interned value."""
+
+        return (unpickle_value, (self.__class__, self.num,
+                                 self.negative_flag))
 
     def hex(self):
         """Return a two digit hex representation."""
@@ -67,13 +117,15 @@ class Value(object):
 
         return ne_num or ne_neg
 
-    def copy(self):
-        """Create a copy of this value."""
+    def __hash__(self):
+        """Hash equal values alike."""
 
-        copy_value = self.__class__(self.num)
-        copy_value.negative_flag = self.negative_flag
+        return hash((self.num, self.negative_flag))
 
-        return copy_value
+    def copy(self):
+        """Return this value, since values are immutable."""
+
+        return self
 
     def inc(self, increment=1):
         """Increment by some value."""
@@ -83,9 +135,9 @@ class Value(object):
         return new_value
 
     def negate(self):
-        """Negate a value."""
+        """Return the negated value."""
 
-        self.negative_flag = not self.negative_flag
+        return self.table[not self.negative_flag][self.num]
 
     def get_num(self):
         """Get the arithmetic number value.
@@ -109,7 +161,7 @@ class Value(object):
     def eq_zero(self):
         """Return true if this value is zero."""
 
-        return self == Value(0)
+        return self.num == 0 and not self.negative_flag
 
     def __add__(self, value):
         """Add another value to this one.
@@ -122,60 +174,389 @@ class Value(object):
         num_sum = self.get_num() + value.get_num()
         carry_flag = False
 
-        if num_sum > 255:
-            new_num = num_sum - 256
+        if num_sum > self.max_num:
+            new_num = num_sum - self.num_values
             carry_flag = True
-        elif num_sum < -255:
-            new_num = num_sum + 256
+        elif num_sum < self.min_num:
+            new_num = num_sum + self.num_values
             carry_flag = True
         else:
             new_num = num_sum
 
-        result_val = Value(new_num)
+        result_val = self.value_class(new_num)
 
         return result_val, carry_flag
 
     def is_printable(self):
         """Return True if this is a printable ASCII character."""
 
-        return self.num in range(0x20, 0x7f)
+        return 0x20 <= self.num < 0x7f
 
 
 class Address(Value):
     """A memory address which is also on the range(256)."""
 
+    __slots__ = ()
+
     def __repr__(self):
         """A str representation of the value."""
 
         return 'Address({0})'.format(self.hex())
 
 
+class Value16(Value):
+    """A value of a 16-bit word, on range(-65535, 65536)."""
+
+    __slots__ = ()
+
+    # Made by word(16) when it's first asked for.
+    table = ()
+    num_values = 1 << 16
+    max_num = num_values - 1
+    min_num = -max_num
+
+
+class Address16(Address):
+    """A 16-bit memory address."""
+
+    __slots__ = ()
+
+    table = ()
+    num_values = Value16.num_values
+    max_num = Value16.max_num
+    min_num = Value16.min_num
+
+
+def intern_table(cls):
+    """Make the table of every value of a class.
+
+    The table is indexed first by the negative flag and then by the
+    magnitude, so table[False][5] is the value 5 and table[True][5] is
+    the value -5.
+    """
+
+    table = []
+    for negative_flag in (False, True):
+        values = []
+        for num in range(cls.num_values):
+            value = object.__new__(cls)
+            object.__setattr__(value, 'num', num)
+            object.__setattr__(value, 'negative_flag', negative_flag)
+            values.append(value)
+        table.append(tuple(values))
+
+    return tuple(table)
+
+
+def unpickle_value(cls, num, negative_flag):
+    """Return the interned value, making the word's tables if needed."""
+
+    if not cls.table:
+        word(cls.num_values.bit_length() - 1)
+
+    return cls.interned(num, negative_flag)
+
+
+Value.table = intern_table(Value)
+Address.table = intern_table(Address)
+
+# The sum of two values or addresses is a value of the same word.
+Value.value_class = Value
+Value16.value_class = Value16
+Address16.value_class = Value16
+
+POSITIVE_VALUES, NEGATIVE_VALUES = Value.table
+
+
+class Word(object):
+    """A word size.
+
+    Everything that depends on the width of a word is looked up here
+    once, when a machine is built, so nothing checks the word size per
+    instruction.
+
+    Attributes:
+        bits: int.  The bits in a word, 8 or 16.
+        num_values: int.  The number of magnitudes, 2 ** bits.
+        max_num: int.  The largest magnitude.
+        size: int.  The number of addresses.
+        value_class: The Value class of the word.
+        address_class: The Address class of the word.
+        cell_type: str.  The array type code of a memory cell.
+    """
+
+    def __init__(self, bits, value_class, address_class, cell_type):
+        """Save the parts of the word size."""
+
+        self.bits = bits
+        self.num_values = 1 << bits
+        self.max_num = self.num_values - 1
+        self.size = self.num_values
+        self.value_class = value_class
+        self.address_class = address_class
+        self.cell_type = cell_type
+
+    def __repr__(self):
+        """A str representation of the word size."""
+
+        return 'Word({0})'.format(self.bits)
+
+
+WORD_CLASSES = {
+    8: (Value, Address, 'B'),
+    16: (Value16, Address16, 'H'),
+}
+
+WORDS = {}
+
+
+def word(bits=WORD_BITS):
+    """Return the Word for a number of bits, 8 or 16.
+
+    The interned values of a 16-bit word are only made the first time
+    it's asked for.
+    """
+
+    if bits not in WORDS:
+        if bits not in WORD_CLASSES:
+            raise WordSizeError(bits)
+
+        value_class, address_class, cell_type = WORD_CLASSES[bits]
+        for cls in (value_class, address_class):
+            if not cls.table:
+                cls.table = intern_table(cls)
+
+        WORDS[bits] = Word(bits, value_class, address_class, cell_type)
+
+    return WORDS[bits]
+
+
 class Memory(object):
-    """Computer memory with a given number of addresses."""
+    """Computer memory with a given number of addresses.
 
-    def __init__(self, size=SIZE):
-        """Create a list of values for the size.
+    The magnitudes are kept in a bytearray, one byte per address, and
+    the negative flags in a separate bitmap, one bit per address.  An
+    address that was never written reads as Value(0).  With a 16-bit
+    word the magnitudes are an array of unsigned shorts instead.
 
-        If a location is None, it's a Value(0).
+    Write hooks are called after every write as hook(num, old_num,
+    old_neg) with the address number and the magnitude and negative
+    flag it held before.  Code that writes the cells directly for speed
+    must go through store() instead while there are any hooks.  A hook
+    given a load hook has that called once after a load() instead.
+    """
+
+    def __init__(self, size=None, word_size=None):
+        """Create the cells and sign bitmap for the size.
+
+        Args:
+            size: int.  The number of addresses, all of them in the word
+                if None.
+            word_size: Word.  The word size, 8 bits if None.
         """
 
-        self.mem_list = [None] * size
+        if word_size is None:
+            word_size = word()
+        if size is None:
+            size = word_size.size
+
+        if word_size.cell_type == 'B':
+            self.cells = bytearray(size)
+        else:
+            self.cells = array.array(word_size.cell_type, [0]) * size
+        self.signs = bytearray((size + 7) // 8)
         self.size = size
+        self.word = word_size
+
+        self.positive, self.negative = word_size.value_class.table
+
+        self.hooks = []
+        self.load_hooks = {}
+        self.write_hook = None
+
+    def add_write_hook(self, hook, load_hook=None):
+        """Call hook after each write.
+
+        Args:
+            hook: The function called as hook(num, old_num, old_neg).
+            load_hook: A function called with no arguments after a
+                load(), rather than hook for each address it changes,
+                or None.
+        """
+
+        self.hooks.append(hook)
+        if load_hook is not None:
+            self.load_hooks[hook] = load_hook
+        self.write_hook = self.make_write_hook()
+
+    def remove_write_hook(self, hook):
+        """Stop calling hook after writes."""
+
+        self.hooks.remove(hook)
+        self.load_hooks.pop(hook, None)
+        self.write_hook = self.make_write_hook()
+
+    def make_write_hook(self):
+        """Return one callable that calls all the hooks, or None.
+
+        A single hook is called directly, since looping over the list
+        would allocate an iterator on every write.
+        """
+
+        hooks = tuple(self.hooks)
+
+        if not hooks:
+            return None
+        if len(hooks) == 1:
+            return hooks[0]
+
+        def call_hooks(num, old_num, old_neg):
+            for hook in hooks:
+                hook(num, old_num, old_neg)
+
+        return call_hooks
 
     def read(self, addr):
         """Return the value at the given address."""
 
-        value = self.mem_list[addr.num]
-        if value is None:
-            value = Value(0)
+        num = addr.num
+
+        if self.signs[num >> 3] & (1 << (num & 7)):
+            return self.negative[self.cells[num]]
 
-        return value
+        return self.positive[self.cells[num]]
 
     def write(self, addr, value):
-        """Write a value into memory at this address."""
+        """Write a value into memory at this address.
+
+        Values are immutable, so only the sign and magnitude are kept.
+        """
+
+        self.store(addr.num, value.num, value.negative_flag)
+
+    def store(self, num, mag, neg):
+        """Write a magnitude and negative flag at address number num."""
+
+        write_hook = self.write_hook
+
+        if write_hook is not None:
+            old_num = self.cells[num]
+            old_neg = self.signs[num >> 3] >> (num & 7) & 1
+
+        self.cells[num] = mag
 
-        value_copy = value.copy()
-        self.mem_list[addr.num] = value_copy
+        if neg:
+            self.signs[num >> 3] |= 1 << (num & 7)
+        else:
+            self.signs[num >> 3] &= ~(1 << (num & 7))
+
+        if write_hook is not None:
+            write_hook(num, old_num, old_neg)
+
+    def load(self, cells, signs):
+        """Overwrite the whole memory from magnitudes and a sign bitmap.
+
+        The write hooks are called for each address that changes, so
+        caches of the old contents are kept right, except that a hook
+        with a load hook has just that called once.
+
+        Args:
+            cells: bytes.  The raw bytes of the cells, as from
+                cell_bytes().
+            signs: bytes.  The sign bitmap.
+        """
+
+        hooks = self.cell_hooks()
+
+        if hooks:
+            self.load_changes(cells, signs, hooks)
+        else:
+            self.copy_in(cells, signs)
+
+        self.call_load_hooks()
+
+    def load_from(self, other):
+        """Overwrite the whole memory with another's contents, as load().
+
+        Args:
+            other: Memory.  A memory of the same size and word.
+        """
+
+        self.load(bytes(other.cell_bytes()), bytes(other.sign_view()))
+
+    def cell_hooks(self):
+        """Return the write hooks without a load hook."""
+
+        return [hook for hook in self.hooks if hook not in self.load_hooks]
+
+    def call_load_hooks(self):
+        """Call the load hooks, in the order their hooks were added."""
+
+        for hook in self.hooks:
+            if hook in self.load_hooks:
+                self.load_hooks[hook]()
+
+    def load_changes(self, cells, signs, hooks):
+        """Load the memory and call the hooks for each changed address."""
+
+        old_cells = bytes(self.cell_bytes())
+        old_signs = bytes(self.sign_view())
+
+        self.copy_in(cells, signs)
+
+        # The changed addresses are the set bits of the xor of the old
+        # and new contents, so unchanged memory costs nothing.
+        changed = set()
+
+        old_nums = memoryview(old_cells).cast(self.word.cell_type)
+        cell_width = 8 * old_nums.itemsize
+        cell_mask = (1 << cell_width) - 1
+        cell_bits = (int.from_bytes(old_cells, 'little') ^
+                     int.from_bytes(self.cell_bytes(), 'little'))
+        while cell_bits:
+            low_bit = cell_bits & -cell_bits
+            num = (low_bit.bit_length() - 1) // cell_width
+            changed.add(num)
+            cell_bits &= ~(cell_mask << (num * cell_width))
+
+        sign_bits = (int.from_bytes(old_signs, 'little') ^
+                     int.from_bytes(self.sign_view(), 'little'))
+        while sign_bits:
+            low_bit = sign_bits & -sign_bits
+            changed.add(low_bit.bit_length() - 1)
+            sign_bits ^= low_bit
+
+        for num in sorted(changed):
+            old_num = old_nums[num]
+            old_neg = old_signs[num >> 3] >> (num & 7) & 1
+            for hook in hooks:
+                hook(num, old_num, old_neg)
+
+    def copy_in(self, cells, signs):
+        """Copy raw cell bytes and a sign bitmap over the memory."""
+
+        self.cell_bytes()[:] = cells
+        self.signs[:] = signs
+
+    def cell_bytes(self):
+        """Return a memoryview of the raw bytes of the cells."""
+
+        return memoryview(self.cells).cast('B')
+
+    def view(self):
+        """Return a memoryview of the magnitudes without copying them."""
+
+        return memoryview(self.cells)
+
+    def sign_view(self):
+        """Return a memoryview of the sign bitmap without copying it."""
+
+        return memoryview(self.signs)
+
+    def is_negative(self, num):
+        """Return True if the negative flag is set at address number num."""
+
+        return bool(self.signs[num >> 3] & (1 << (num & 7)))
 
     def display(self, addr):
         """Display a single address."""
@@ -212,3 +593,263 @@ class Memory(object):
             addr = addr.inc()
 
         return '\n'.join(display_list)
+
+
+# The read only pages of zeros by (type code, length), shared by every
+# PagedMemory.
+ZERO_PAGES = {}
+
+
+def zero_page(cell_type, length):
+    """Return the shared read only page of zeros."""
+
+    key = (cell_type, length)
+    if key not in ZERO_PAGES:
+        zeros = bytes(length * array.array(cell_type).itemsize)
+        ZERO_PAGES[key] = memoryview(zeros).cast(cell_type)
+
+    return ZERO_PAGES[key]
+
+
+class PageTable(object):
+    """The cells or sign bitmap of a PagedMemory.
+
+    It's indexed like the bytearray of a Memory, so the engines read and
+    write it without knowing about pages.  Every page starts as the
+    shared zero page.  A write of anything but zero to the zero page, or
+    of anything to a page shared with a clone, first has the memory give
+    the page its own copy.  Both kinds of page are read only, so that
+    costs nothing on a write to a page of its own.
+    """
+
+    __slots__ = ('pages', 'zero', 'shift', 'mask', 'length', 'allocate')
+
+    def __init__(self, num_pages, zero, shift, length, allocate):
+        """Make the table with every page the zero page.
+
+        Args:
+            num_pages: int.  The number of pages.
+            zero: The shared zero page.
+            shift: int.  An index shifted right by this is the page.
+            length: int.  The number of items in the table.
+            allocate: A callable taking a page number, which gives it
+                its own copy of its pages.
+        """
+
+        self.pages = [zero] * num_pages
+        self.zero = zero
+        self.shift = shift
+        self.mask = (1 << shift) - 1
+        self.length = length
+        self.allocate = allocate
+
+    def __len__(self):
+        """The number of items."""
+
+        return self.length
+
+    def __getitem__(self, num):
+        """Return the item at index num."""
+
+        return self.pages[num >> self.shift][num & self.mask]
+
+    def __setitem__(self, num, item):
+        """Set the item at index num, allocating its page if needed."""
+
+        page_num = num >> self.shift
+        page = self.pages[page_num]
+
+        try:
+            page[num & self.mask] = item
+        except TypeError:
+            # A read only page, the zero page or a shared one.
+            if page is self.zero and not item:
+                return
+            self.allocate(page_num)
+            self.pages[page_num][num & self.mask] = item
+
+    def tobytes(self):
+        """Return the raw bytes of all the items."""
+
+        raw = b''.join(memoryview(page).tobytes() for page in self.pages)
+
+        return raw[:self.length * memoryview(self.zero).itemsize]
+
+
+class PagedMemory(Memory):
+    """Memory kept in fixed size pages made on first write.
+
+    An address that was never written is on the shared zero page, so a
+    machine with a 16-bit word costs memory for the pages its program
+    touches rather than for all 65536 addresses.  The cells and signs
+    attributes are PageTables, indexed like the bytearrays of a Memory,
+    so every engine runs on either.  A memory loaded from another with
+    load_from() shares its pages copy on write.
+    """
+
+    def __init__(self, size=None, word_size=None, page_size=PAGE_SIZE):
+        """Create an empty memory.
+
+        Args:
+            size: int.  The number of addresses, all of them in the word
+                if None.
+            word_size: Word.  The word size, 8 bits if None.
+            page_size: int.  The addresses in a page, a power of two of
+                at least 8.
+        """
+
+        if word_size is None:
+            word_size = word()
+        if size is None:
+            size = word_size.size
+
+        if page_size < 8 or page_size & (page_size - 1):
+            raise PageSizeError(page_size)
+
+        self.page_size = page_size
+        self.num_pages = -(-size // page_size)
+        self.resident = 0
+
+        shift = page_size.bit_length() - 1
+        self.cells = PageTable(self.num_pages,
+                               zero_page(word_size.cell_type, page_size),
+                               shift, size, self.own)
+        self.signs = PageTable(self.num_pages, zero_page('B', page_size // 8),
+                               shift - 3, (size + 7) // 8, self.own)
+        self.size = size
+        self.word = word_size
+
+        self.positive, self.negative = word_size.value_class.table
+
+        self.hooks = []
+        self.load_hooks = {}
+        self.write_hook = None
+
+    def allocate(self, page_num, cells=None, signs=None):
+        """Give a page its own cells and signs.
+
+        Args:
+            page_num: int.  The page number.
+            cells: bytes.  The raw bytes of the page's cells, zeros if
+                None.
+            signs: bytes.  The page's sign bitmap, zeros if None.
+        """
+
+        page_size = self.page_size
+
+        if self.word.cell_type == 'B':
+            page = bytearray(page_size)
+        else:
+            page = array.array(self.word.cell_type, [0]) * page_size
+        if cells is not None:
+            memoryview(page).cast('B')[:len(cells)] = cells
+
+        sign_page = bytearray(page_size // 8)
+        if signs is not None:
+            sign_page[:len(signs)] = signs
+
+        if self.cells.pages[page_num] is self.cells.zero:
+            self.resident += 1
+        self.cells.pages[page_num] = page
+        self.signs.pages[page_num] = sign_page
+
+    def own(self, page_num):
+        """Give a page its own copy of the cells and signs it holds.
+
+        Args:
+            page_num: int.  The page number.
+        """
+
+        self.allocate(page_num,
+                      memoryview(self.cells.pages[page_num]).cast('B'),
+                      self.signs.pages[page_num])
+
+    def load_from(self, other):
+        """Overwrite the whole memory with another's contents, as load().
+
+        The pages of another PagedMemory of the same shape are shared
+        rather than copied.  They're made read only in both memories, so
+        the first write to one gives that memory its own copy.  If there
+        are hooks without a load hook the contents are copied, to call
+        them for each address that changes.
+
+        Args:
+            other: Memory.  A memory of the same size and word.
+        """
+
+        if (not isinstance(other, PagedMemory) or other.size != self.size or
+                other.cells.zero is not self.cells.zero or
+                self.cell_hooks()):
+            Memory.load_from(self, other)
+            return
+
+        for table in (other.cells, other.signs):
+            pages = table.pages
+            for page_num, page in enumerate(pages):
+                view = memoryview(page)
+                if not view.readonly:
+                    pages[page_num] = view.toreadonly()
+
+        self.cells.pages[:] = other.cells.pages
+        self.signs.pages[:] = other.signs.pages
+        self.resident = other.resident
+
+        self.call_load_hooks()
+
+    def resident_pages(self):
+        """Return the number of pages that aren't the zero page."""
+
+        return self.resident
+
+    def resident_bytes(self):
+        """Return the bytes held by the allocated pages."""
+
+        page_bytes = self.page_size * memoryview(self.cells.zero).itemsize
+
+        return self.resident * (page_bytes + self.page_size // 8)
+
+    def copy_in(self, cells, signs):
+        """Copy raw cell bytes and a sign bitmap over the memory.
+
+        Pages that are all zeros afterward go back to the zero page.
+        """
+
+        cells = bytes(cells)
+        signs = bytes(signs)
+
+        cell_width = memoryview(self.cells.zero).itemsize
+        cell_step = self.page_size * cell_width
+        sign_step = self.page_size // 8
+
+        for page_num in range(self.num_pages):
+            page_cells = cells[page_num * cell_step:
+                               (page_num + 1) * cell_step]
+            page_signs = signs[page_num * sign_step:
+                               (page_num + 1) * sign_step]
+
+            if page_cells.count(0) == len(page_cells) and (
+                    page_signs.count(0) == len(page_signs)):
+                if self.cells.pages[page_num] is not self.cells.zero:
+                    self.cells.pages[page_num] = self.cells.zero
+                    self.signs.pages[page_num] = self.signs.zero
+                    self.resident -= 1
+            else:
+                self.allocate(page_num, page_cells, page_signs)
+
+    def cell_bytes(self):
+        """Return the raw bytes of the cells.
+
+        Unlike Memory.cell_bytes() this is a copy.
+        """
+
+        return memoryview(self.cells.tobytes())
+
+    def view(self):
+        """Return a read only copy of the magnitudes as a memoryview."""
+
+        return self.cell_bytes().cast(self.word.cell_type)
+
+    def sign_view(self):
+        """Return a read only copy of the sign bitmap as a memoryview."""
+
+        return memoryview(self.signs.tobytes())
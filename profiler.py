@@ -0,0 +1,198 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Count where a program spends its cycles.
+
+A Profiler counts the instructions an engine executes, by op code and
+by the address of the instruction, along with how often each SZA and
+SZX skip is taken, and the wall time spent executing them,
+
+    prof = profiler.Profiler(computer.decoder_obj)
+    prof.enable()
+    computer.clock.run()
+    print(prof.report())
+
+The counters are flat arrays indexed by the op code or address number.
+
+Enabling the profiler attaches instrumented fetch_execute() and run()
+methods to the engine object itself, as in the instrument module.
+Disabling it takes them away again, so an engine that isn't being
+profiled runs its usual methods with no check at all per cycle.  The
+fast engines run one instruction at a time while profiled.
+"""
+
+import array
+import time
+import assembler
+import cpu
+import decoder
+import instrument
+
+HOT_SPOTS = 10
+
+# The op codes whose skips are counted.
+SKIPS = (decoder.SZA, decoder.SZX)
+
+
+def counters(size):
+    """Return a flat array of size zero counts."""
+
+    return array.array('Q', [0]) * size
+
+
+class Profiler(object):
+    """An execution profiler for one engine.
+
+    Attributes:
+        op_counts: array.  The executions of each op code.
+        ip_counts: array.  The executions of the instruction at each
+            address.
+        taken: array.  The skips taken by each op code.
+        not_taken: array.  The skips not taken by each op code.
+        elapsed_sec: float.  The wall time spent in the engine's
+            fetch_execute().
+    """
+
+    def __init__(self, engine):
+        """Make the counters for an engine.
+
+        Args:
+            engine: An execution engine, as in machine.ENGINES.
+        """
+
+        self.engine = engine
+        self.enabled = False
+
+        num_values = engine.mem.word.num_values
+        self.op_counts = counters(num_values)
+        self.ip_counts = counters(engine.mem.size)
+        self.taken = counters(num_values)
+        self.not_taken = counters(num_values)
+        self.elapsed_sec = 0.0
+
+    def enable(self):
+        """Start counting the engine's instructions."""
+
+        if self.enabled:
+            return
+
+        instrument.attach(self.engine, self)
+        self.enabled = True
+
+    def disable(self):
+        """Stop counting and give the engine back its own methods."""
+
+        if not self.enabled:
+            return
+
+        instrument.detach(self.engine, self)
+        self.enabled = False
+
+    def reset(self):
+        """Zero the counters and the wall time."""
+
+        for counts in (self.op_counts, self.ip_counts, self.taken,
+                       self.not_taken):
+            counts[:] = counters(len(counts))
+        self.elapsed_sec = 0.0
+
+    def fetch_execute(self):
+        """Count then run one fetch execute cycle of the engine."""
+
+        data = self.engine.reg.state.data
+        ip = data[cpu.IP]
+        op = self.engine.mem.cells[ip]
+
+        self.ip_counts[ip] += 1
+        self.op_counts[op] += 1
+
+        start = time.perf_counter()
+        try:
+            self.engine_fetch_execute()
+        finally:
+            self.elapsed_sec += time.perf_counter() - start
+
+        if op in SKIPS:
+            if data[cpu.IP] == ip + 4:
+                self.taken[op] += 1
+            else:
+                self.not_taken[op] += 1
+
+    def run(self, limit=None):
+        """Run and count fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        """
+
+        return instrument.run_cycles(self.engine.reg, self.fetch_execute,
+                                     limit)
+
+    def cycles(self):
+        """Return the number of instructions counted."""
+
+        return sum(self.op_counts)
+
+    def hot_spots(self, count=HOT_SPOTS):
+        """Return the (ip, executions) pairs of the busiest addresses.
+
+        The busiest come first and addresses never run are left out.
+        """
+
+        ips = sorted(range(len(self.ip_counts)),
+                     key=lambda ip: -self.ip_counts[ip])
+
+        return [(ip, self.ip_counts[ip]) for ip in ips[:count]
+                if self.ip_counts[ip]]
+
+    def disassemble(self, ip):
+        """Return the instruction at address number ip as text."""
+
+        mem = self.engine.mem
+        line = assembler.disassemble(mem.view(), mem.sign_view(), ip,
+                                     min(ip + 2, mem.size))[0]
+
+        # Leave off the address.
+        return line.split(' ', 1)[1]
+
+    def report(self, count=HOT_SPOTS):
+        """Return the profile as text.
+
+        The op codes are listed busiest first with the skips taken and
+        not taken, then the hot spot addresses with the instruction at
+        each.
+        """
+
+        total = self.cycles()
+        lines = ['{0} instructions in {1:.6f} sec'.format(
+            total, self.elapsed_sec)]
+        if not total:
+            return lines[0]
+
+        lines.extend(['', 'Op code      count      %'])
+        ops = sorted((op for op in range(len(self.op_counts))
+                      if self.op_counts[op]),
+                     key=lambda op: -self.op_counts[op])
+        for op in ops:
+            name = None
+            if op < len(assembler.OP_NAMES):
+                name = assembler.OP_NAMES[op]
+            if name is None:
+                name = '0x{0:02x}'.format(op)
+
+            line = '{0:<8} {1:>9} {2:>6.1f}'.format(
+                name, self.op_counts[op], 100.0 * self.op_counts[op] / total)
+            if op in SKIPS:
+                line += '  taken {0}, not taken {1}'.format(
+                    self.taken[op], self.not_taken[op])
+            lines.append(line)
+
+        lines.extend(['', 'Address      count      %  Instruction'])
+        for ip, executions in self.hot_spots(count):
+            lines.append('0x{0:02x}     {1:>9} {2:>6.1f}  {3}'.format(
+                ip, executions, 100.0 * executions / total,
+                self.disassemble(ip)))
+
+        return '\n'.join(lines)
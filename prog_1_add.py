@@ -11,6 +11,7 @@ import sys
 import cpu
 import decoder
 import memory
+import tracer
 import version
 
 ADDR = memory.Address
@@ -24,7 +25,7 @@ def setup_computer():
     mem = memory.Memory()
     alu = cpu.ArithmeticLogicUnit()
     decoder_obj = decoder.Decoder(reg, mem, alu)
-    clock = cpu.Clock(reg, decoder_obj)
+    clock = cpu.Clock(reg, decoder_obj, trace=tracer.TextTrace())
 
     reg.ip = ADDR(0x20)
 
@@ -81,8 +81,12 @@ PROGRAM = (
 def main():
     """Run the program."""
 
-    computer = machine.Computer(data=DATA, program=PROGRAM)
-    machine.cpu.CLOCK_CYCLE_SEC = 0.10  # Overclock to 10 Hz. CAUTION!
+    freq_hz = 10  # Overclock to 10 Hz. CAUTION!
+    if '--fast' in sys.argv:
+        freq_hz = machine.cpu.UNTHROTTLED
+
+    computer = machine.Computer(data=DATA, program=PROGRAM, freq_hz=freq_hz,
+                                profile='--profile' in sys.argv)
 
     opt_run = len(sys.argv) >= 2 and '--run' in sys.argv
     computer.run(title=TITLE, run_flag=opt_run, printable=True,
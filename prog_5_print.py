@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""The fifth program that prints a string.
+
+Storing a value at the console output port, address 0xff, prints it as
+a character.  The characters are collected by the console and written
+out in one go when the computer halts, rather than one at a time.
+
+Like the string copy this uses the Pascal-like format with the length
+first.  Since idx counts down, the characters are stored back to
+front, so the last address holds the first character.
+
+SRC = 0x40
+PORT = 0xff
+
+     LDX SRC      ;; Get the count
+LOOP LDA,X SRC    ;; Get a char
+     STA PORT     ;; Print it
+     DCX          ;; Decrement to next char
+     SZX          ;; Skip on idx zero
+     JMP LOOP     ;; Jump to the LOOP addr
+     HLT          ;; Else we're done
+"""
+
+import sys
+import machine
+
+TITLE = 'Program 5. Print String'
+
+TEXT = 'Hello, World!\n'
+
+DATA = ((0x40, len(TEXT)),) + tuple(
+    (0x40 + len(TEXT) - offset, ord(char))
+    for offset, char in enumerate(TEXT))
+
+PROGRAM = (
+    (0x20, 0x26),  # i: LDX
+    (0x21, 0x40),  # a: 0x40 = SRC -->  count 14
+    (0x22, 0x41),  # i: LDA,X    LOOP = 0x22
+    (0x23, 0x40),  # a: SRC
+    (0x24, 0x22),  # i: STA
+    (0x25, 0xff),  # a: PORT
+    (0x26, 0x29),  # i: DCX
+    (0x27, 0x00),  # a: (ignored)
+    (0x28, 0x28),  # i: SZX
+    (0x29, 0x00),  # a: (ignored)
+    (0x2a, 0x23),  # i: JMP
+    (0x2b, 0x22),  # a: 0x22 = LOOP
+    (0x2c, 0x01),  # i: HLT
+    (0x2d, 0x00))  # a: (ignored)
+
+
+def main():
+    """Run the program."""
+
+    freq_hz = 10  # Overclock to 10 Hz. CAUTION!
+    if '--fast' in sys.argv:
+        freq_hz = machine.cpu.UNTHROTTLED
+
+    computer = machine.Computer(data=DATA, program=PROGRAM, freq_hz=freq_hz,
+                                output=sys.stdout,
+                                profile='--profile' in sys.argv)
+
+    opt_run = len(sys.argv) >= 2 and '--run' in sys.argv
+    computer.run(title=TITLE, run_flag=opt_run)
+
+
+if __name__ == '__main__':
+    main()
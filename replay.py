@@ -0,0 +1,548 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Record a run as a binary trace and check another run against it.
+
+A Recorder writes every cycle of an engine to a binary stream,
+
+    with open('addnums.trace', 'wb') as stream:
+        recorder = replay.Recorder(computer.decoder_obj, stream)
+        recorder.enable()
+        computer.clock.run()
+        recorder.close()
+
+and a Replayer runs a program again, on any engine, and stops with a
+ReplayMismatch at the first cycle that differs from the recording,
+
+    with open('addnums.trace', 'rb') as stream:
+        replayer = replay.Replayer(computer.decoder_obj, stream)
+        replayer.restore(computer)      # Where the recording started.
+        replayer.enable()
+        computer.clock.run()
+        replayer.close()        # Raises if the recording went further.
+
+The trace starts with a HEADER and a snapshot of the state record and
+memory.  Then come the cycles in chunks, each a CHUNK header of the
+payload size and the number of cycles, then the payload, compressed
+with zlib if the header says so.
+
+Each cycle is delta encoded, as varints, against the state record
+after the cycle before it, or the snapshot for the first.  So a change
+made between cycles, such as the clock setting the run flag, is
+recorded with the next cycle.
+
+    mask        a bit for each field of the state record that changed,
+                the IP's bit only if it didn't move on by 2
+    op code     the op code run
+    operand     the address after it, doubled, plus 1 if negative
+    address     the address it read or wrote less the operand, zigzag
+                encoded, so 0 unless it was indexed
+    changes     for each bit of the mask, the change in the field,
+                zigzag encoded, less 2 for the IP
+
+A typical cycle is 5 or 6 bytes before compression.  The Replayer
+encodes each cycle of the new run the same way and compares the bytes
+with the recording, so it only decodes a cycle to report a mismatch.
+
+As with the profiler, enable() attaches instrumented fetch_execute()
+and run() methods to the engine and close() takes them away.
+"""
+
+import struct
+import zlib
+import cpu
+import debugger
+import error
+import instrument
+import machine
+
+MAGIC = b'SMTR'
+VERSION = 1
+
+# The header flags.
+COMPRESSED = 0x01
+
+# Magic, version, word bits, flags and the snapshot size.
+HEADER = struct.Struct('<4sBBBxI')
+
+# The payload size and cycles of a chunk.
+CHUNK = struct.Struct('<II')
+
+CHUNK_SIZE = 1 << 16
+
+
+class TraceFormatError(error.Error):
+    """The stream isn't a trace this module can read."""
+
+
+class ReplayMismatch(error.Error):
+    """The run differs from the recording.
+
+    Attributes:
+        cycle: int.  The cycle that differs, counting from 0.
+        field: str.  What differs, 'op', 'operand', 'operand_neg',
+            'addr', a field of the state record, or 'end' if one run
+            went further.
+        expected: The recorded value.
+        actual: The value in this run.
+    """
+
+    def __init__(self, cycle, field, expected, actual):
+        """Save what differs."""
+
+        super().__init__('Cycle {0}: {1} is {2}, recorded {3}'.format(
+            cycle, field, actual, expected))
+        self.cycle = cycle
+        self.field = field
+        self.expected = expected
+        self.actual = actual
+
+
+def put_varint(out, num):
+    """Append an unsigned int to a bytearray as a varint."""
+
+    while num >= 0x80:
+        out.append(num & 0x7f | 0x80)
+        num >>= 7
+    out.append(num)
+
+
+def get_varint(buf, pos):
+    """Return a varint from a buffer and the position after it."""
+
+    num = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        num |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return num, pos
+        shift += 7
+
+
+def zigzag(num):
+    """Return a signed int as an unsigned one, small if num is small."""
+
+    return num << 1 if num >= 0 else (-num << 1) - 1
+
+
+def unzigzag(num):
+    """Return the signed int of a zigzag encoded one."""
+
+    return -(num + 1 >> 1) if num & 1 else num >> 1
+
+
+def fetch(engine):
+    """Return the op code, operand and address of the next instruction.
+
+    Returns:
+        The op code, the operand as twice its magnitude plus 1 if
+        negative, and the address read or written, or the operand's
+        magnitude if the instruction doesn't access memory.
+    """
+
+    mem = engine.mem
+    data = engine.reg.state.data
+    ip = data[cpu.IP]
+
+    if ip + 1 >= mem.size:
+        return mem.cells[ip], 0, 0
+
+    operand = mem.cells[ip + 1]
+    kind, addr = debugger.access(mem, data, ip)
+    if kind is None:
+        addr = operand
+
+    return (mem.cells[ip], operand << 1 | mem.is_negative(ip + 1), addr)
+
+
+def encode(out, before, after, op, operand, addr):
+    """Append one cycle to a bytearray.
+
+    Args:
+        out: bytearray.
+        before: list of int.  The state record after the last cycle.
+        after: array.  The state record after this one.
+        op, operand, addr: int.  As from fetch().
+    """
+
+    expected_ip = before[cpu.IP] + 2
+
+    mask = 0
+    for field, num in enumerate(before):
+        if field == cpu.IP:
+            if after[field] != expected_ip:
+                mask |= 1 << field
+        elif after[field] != num:
+            mask |= 1 << field
+
+    put_varint(out, mask)
+    put_varint(out, op)
+    put_varint(out, operand)
+    put_varint(out, zigzag(addr - (operand >> 1)))
+
+    field = 0
+    while mask:
+        if mask & 1:
+            if field == cpu.IP:
+                put_varint(out, zigzag(after[field] - expected_ip))
+            else:
+                put_varint(out, zigzag(after[field] - before[field]))
+        mask >>= 1
+        field += 1
+
+
+def decode(buf, pos, before):
+    """Decode one cycle.
+
+    Args:
+        buf: bytes.  The payload of a chunk.
+        pos: int.  Where the cycle starts.
+        before: list of int.  The state record after the last cycle.
+    Returns:
+        A dict of the op code, the operand's magnitude and negative
+        flag, the address and the state record fields after the cycle,
+        by name, and the position after the cycle.
+    """
+
+    mask, pos = get_varint(buf, pos)
+    op, pos = get_varint(buf, pos)
+    operand, pos = get_varint(buf, pos)
+    addr, pos = get_varint(buf, pos)
+
+    after = list(before)
+    after[cpu.IP] += 2
+    for field in range(cpu.NUM_FIELDS):
+        if mask >> field & 1:
+            change, pos = get_varint(buf, pos)
+            after[field] += unzigzag(change)
+
+    cycle = {'op': op, 'operand': operand >> 1, 'operand_neg': operand & 1,
+             'addr': unzigzag(addr) + (operand >> 1)}
+    for field, num in enumerate(after):
+        cycle[cpu.FIELD_NAMES[field]] = num
+
+    return cycle, pos
+
+
+def engine_snapshot(engine):
+    """Return the state record and memory of an engine as bytes."""
+
+    mem = engine.mem
+
+    return b''.join((engine.reg.state.tobytes(), mem.cell_bytes(),
+                     mem.sign_view()))
+
+
+def read_header(stream):
+    """Read the header of a trace.
+
+    Returns:
+        The word bits, the flags and the snapshot.
+    Raises:
+        TraceFormatError: The stream isn't a trace.
+    """
+
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise TraceFormatError('Too short for a trace')
+
+    magic, version, bits, flags, size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise TraceFormatError('Not a version {0} trace'.format(VERSION))
+
+    snapshot = stream.read(size)
+    if len(snapshot) < size:
+        raise TraceFormatError('The snapshot is cut short')
+
+    return bits, flags, snapshot
+
+
+def read_chunk(stream, flags):
+    """Return the next chunk's payload and cycles, or None at the end."""
+
+    header = stream.read(CHUNK.size)
+    if not header:
+        return None
+    if len(header) < CHUNK.size:
+        raise TraceFormatError('A chunk header is cut short')
+
+    size, cycles = CHUNK.unpack(header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        raise TraceFormatError('A chunk is cut short')
+
+    if flags & COMPRESSED:
+        payload = zlib.decompress(payload)
+
+    return payload, cycles
+
+
+def cycles(stream):
+    """Yield each recorded cycle of a trace as a dict, as from decode()."""
+
+    bits, flags, snapshot = read_header(stream)
+    before = list(cpu.State.frombytes(snapshot[:machine.STATE_SIZE]).data)
+
+    while True:
+        chunk = read_chunk(stream, flags)
+        if chunk is None:
+            return
+
+        payload, count = chunk
+        pos = 0
+        for _ in range(count):
+            cycle, pos = decode(payload, pos, before)
+            yield cycle
+            before = [cycle[name] for name in cpu.FIELD_NAMES]
+
+
+class Recorder(object):
+    """Write each cycle of an engine to a binary trace.
+
+    Attributes:
+        cycles: int.  The cycles recorded.
+        bytes_written: int.  The size of the trace so far.
+    """
+
+    def __init__(self, engine, stream, compress=True,
+                 chunk_size=CHUNK_SIZE):
+        """Save the engine and the stream to write to.
+
+        Args:
+            engine: An execution engine, as in machine.ENGINES.
+            stream: A binary file to write the trace to.
+            compress: bool.  Compress each chunk with zlib.
+            chunk_size: int.  The bytes of cycles to gather per chunk.
+        """
+
+        self.engine = engine
+        self.data = engine.reg.state.data
+        self.stream = stream
+        self.compress = compress
+        self.chunk_size = chunk_size
+
+        self.enabled = False
+
+        self.out = bytearray()
+        self.last = None
+        self.chunk_cycles = 0
+        self.cycles = 0
+        self.bytes_written = 0
+
+    def enable(self):
+        """Write the header and start recording."""
+
+        if self.enabled:
+            return
+
+        snapshot = engine_snapshot(self.engine)
+        self.write(HEADER.pack(MAGIC, VERSION, self.engine.mem.word.bits,
+                               COMPRESSED if self.compress else 0,
+                               len(snapshot)))
+        self.write(snapshot)
+        self.last = self.data.tolist()
+
+        instrument.attach(self.engine, self)
+        self.enabled = True
+
+    def close(self):
+        """Stop recording and write out the last chunk."""
+
+        if not self.enabled:
+            return
+
+        instrument.detach(self.engine, self)
+        self.enabled = False
+        self.flush()
+
+    def write(self, blob):
+        """Write bytes to the stream."""
+
+        self.stream.write(blob)
+        self.bytes_written += len(blob)
+
+    def flush(self):
+        """Write the cycles gathered so far as a chunk."""
+
+        if not self.chunk_cycles:
+            return
+
+        payload = bytes(self.out)
+        if self.compress:
+            payload = zlib.compress(payload)
+
+        self.write(CHUNK.pack(len(payload), self.chunk_cycles))
+        self.write(payload)
+
+        self.out = bytearray()
+        self.chunk_cycles = 0
+
+    def fetch_execute(self):
+        """Run and record one fetch execute cycle."""
+
+        op, operand, addr = fetch(self.engine)
+
+        self.engine_fetch_execute()
+
+        encode(self.out, self.last, self.data, op, operand, addr)
+        self.last = self.data.tolist()
+        self.chunk_cycles += 1
+        self.cycles += 1
+
+        if len(self.out) >= self.chunk_size:
+            self.flush()
+
+    def run(self, limit=None):
+        """Run and record fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        """
+
+        return instrument.run_cycles(self.engine.reg, self.fetch_execute,
+                                     limit)
+
+
+class Replayer(object):
+    """Check each cycle of an engine against a recorded trace.
+
+    Attributes:
+        cycles: int.  The cycles checked.
+    """
+
+    def __init__(self, engine, stream):
+        """Read the header of the trace.
+
+        Args:
+            engine: An execution engine, as in machine.ENGINES.
+            stream: A binary file to read the trace from.
+        Raises:
+            TraceFormatError: The stream isn't a trace for this
+                engine's word size.
+        """
+
+        self.engine = engine
+        self.data = engine.reg.state.data
+        self.stream = stream
+
+        bits, self.flags, self.snapshot = read_header(stream)
+        if bits != engine.mem.word.bits:
+            raise TraceFormatError('A trace of {0}-bit words'.format(bits))
+
+        self.enabled = False
+
+        self.payload = b''
+        self.pos = 0
+        self.cycles = 0
+        self.out = bytearray()
+        self.last = None
+
+    def restore(self, computer):
+        """Put a computer in the state the recording began.
+
+        Args:
+            computer: machine.Computer.  The computer of the engine.
+        """
+
+        computer.restore(self.snapshot)
+
+    def enable(self):
+        """Start checking the cycles.
+
+        Raises:
+            ReplayMismatch: The registers differ from the recording's
+                start.
+        """
+
+        if self.enabled:
+            return
+
+        start = cpu.State.frombytes(self.snapshot[:machine.STATE_SIZE]).data
+        for field, num in enumerate(start):
+            if self.data[field] != num:
+                raise ReplayMismatch(0, cpu.FIELD_NAMES[field], num,
+                                     self.data[field])
+        self.last = start.tolist()
+
+        instrument.attach(self.engine, self)
+        self.enabled = True
+
+    def close(self):
+        """Stop checking.
+
+        Raises:
+            ReplayMismatch: The recording has cycles this run didn't
+                reach.
+        """
+
+        if not self.enabled:
+            return
+
+        instrument.detach(self.engine, self)
+        self.enabled = False
+
+        if self.pos < len(self.payload) or read_chunk(self.stream,
+                                                      self.flags):
+            raise ReplayMismatch(self.cycles, 'end', 'more cycles',
+                                 'stopped')
+
+    def fetch_execute(self):
+        """Run one fetch execute cycle and check it against the recording.
+
+        Raises:
+            ReplayMismatch: The cycle differs, or the recording ended.
+        """
+
+        op, operand, addr = fetch(self.engine)
+
+        self.engine_fetch_execute()
+
+        out = self.out
+        del out[:]
+        encode(out, self.last, self.data, op, operand, addr)
+
+        if self.pos >= len(self.payload):
+            chunk = read_chunk(self.stream, self.flags)
+            if chunk is None:
+                raise ReplayMismatch(self.cycles, 'end', 'stopped',
+                                     'more cycles')
+            self.payload = chunk[0]
+            self.pos = 0
+
+        end = self.pos + len(out)
+        if self.payload[self.pos:end] != out:
+            self.mismatch()
+        self.pos = end
+        self.last = self.data.tolist()
+        self.cycles += 1
+
+    def mismatch(self):
+        """Raise a ReplayMismatch for the first difference in the cycle."""
+
+        expected, _ = decode(self.payload, self.pos, self.last)
+        actual, _ = decode(self.out, 0, self.last)
+
+        names = ('op', 'operand', 'operand_neg', 'addr') + cpu.FIELD_NAMES
+        for name in names:
+            if expected[name] != actual[name]:
+                raise ReplayMismatch(self.cycles, name, expected[name],
+                                     actual[name])
+
+        raise ReplayMismatch(self.cycles, 'encoding', bytes(
+            self.payload[self.pos:self.pos + len(self.out)]), bytes(self.out))
+
+    def run(self, limit=None):
+        """Run and check fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        """
+
+        return instrument.run_cycles(self.engine.reg, self.fetch_execute,
+                                     limit)
@@ -0,0 +1,246 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Run a computer backwards.
+
+A Journal records enough as a computer runs to put it back to any
+earlier cycle,
+
+    journal = reverse.Journal(computer)
+    journal.enable()
+    computer.clock.run()
+    journal.step_back()         # Undo the last instruction.
+    journal.rewind(10)          # Back to just after cycle 10.
+
+Each memory write adds its cycle, address and old value to the write
+journal, and each cycle adds the registers and flags it changed, with
+their old values, to the register journal.  Both are flat arrays, so
+they grow with the writes and register changes, a few bytes each,
+rather than with a copy of memory per cycle.
+
+Every interval cycles a full snapshot is kept as well.  Rewinding
+restores the first snapshot at or after the cycle wanted, then undoes
+the journal entries back to it, so it takes at most interval undos
+however long the run.  Whatever was recorded after that cycle is
+dropped, since running on from there may go another way.
+
+The journal needs the registers after every cycle, so while it's
+enabled the fast engines give up their bulk run() and step one
+instruction at a time.
+"""
+
+import array
+import bisect
+import error
+import instrument
+
+INTERVAL = 1024
+
+
+class RewindError(error.Error):
+    """The cycle isn't in the journal."""
+
+
+class Journal(object):
+    """A journal of a computer's writes and register changes.
+
+    Attributes:
+        cycle: int.  The cycles run since the journal was enabled.
+        write_cycles, write_addrs, write_nums, write_negs: array.  For
+            each write, the cycle, address number and old magnitude and
+            negative flag.
+        reg_cycles, reg_fields, reg_nums: array.  For each register or
+            flag changed, the cycle, field and old value.
+        snapshots: list.  The (write count, register change count,
+            snapshot) taken every interval cycles.
+        snapshot_cycles: list.  The cycle of each snapshot.
+    """
+
+    def __init__(self, computer, interval=INTERVAL):
+        """Make an empty journal for a computer.
+
+        Args:
+            computer: machine.Computer.  The computer to record.
+            interval: int.  The cycles between full snapshots.
+        """
+
+        self.computer = computer
+        self.engine = computer.decoder_obj
+        self.mem = computer.mem
+        self.data = computer.state.data
+        self.interval = interval
+
+        self.enabled = False
+        self.rewinding = False
+
+        self.cycle = 0
+        self.write_cycles = array.array('Q')
+        self.write_addrs = array.array('I')
+        self.write_nums = array.array('H')
+        self.write_negs = array.array('B')
+        self.reg_cycles = array.array('Q')
+        self.reg_fields = array.array('B')
+        self.reg_nums = array.array('H')
+        self.snapshots = []
+        self.snapshot_cycles = []
+
+    def enable(self):
+        """Start recording from the computer's current state."""
+
+        if self.enabled:
+            return
+
+        instrument.attach(self.engine, self)
+        self.mem.add_write_hook(self.write_hook)
+        self.enabled = True
+
+        self.clear()
+
+    def disable(self):
+        """Stop recording and give the engine back its own methods."""
+
+        if not self.enabled:
+            return
+
+        instrument.detach(self.engine, self)
+        self.mem.remove_write_hook(self.write_hook)
+        self.enabled = False
+
+    def clear(self):
+        """Forget the journal and start again from cycle 0 here."""
+
+        self.cycle = 0
+        for journal in (self.write_cycles, self.write_addrs,
+                        self.write_nums, self.write_negs, self.reg_cycles,
+                        self.reg_fields, self.reg_nums):
+            del journal[:]
+        self.snapshots = []
+        self.snapshot_cycles = []
+        self.take_snapshot()
+
+    def take_snapshot(self):
+        """Keep a full snapshot of the current cycle."""
+
+        self.snapshots.append((len(self.write_cycles), len(self.reg_cycles),
+                               self.computer.snapshot()))
+        self.snapshot_cycles.append(self.cycle)
+
+    def write_hook(self, num, old_num, old_neg):
+        """Journal the old value of a write."""
+
+        if self.rewinding:
+            return
+
+        self.write_cycles.append(self.cycle)
+        self.write_addrs.append(num)
+        self.write_nums.append(old_num)
+        self.write_negs.append(old_neg)
+
+    def fetch_execute(self):
+        """Run one fetch execute cycle and journal the registers."""
+
+        data = self.data
+        before = data.tolist()
+
+        self.engine_fetch_execute()
+
+        cycle = self.cycle
+        for field, num in enumerate(before):
+            if data[field] != num:
+                self.reg_cycles.append(cycle)
+                self.reg_fields.append(field)
+                self.reg_nums.append(num)
+
+        self.cycle = cycle + 1
+        if not self.cycle % self.interval:
+            self.take_snapshot()
+
+    def run(self, limit=None):
+        """Run and journal fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        """
+
+        return instrument.run_cycles(self.engine.reg, self.fetch_execute,
+                                     limit)
+
+    def step_back(self, count=1):
+        """Undo the last count cycles, as far as the journal goes back.
+
+        Returns:
+            The cycle the computer is now at.
+        """
+
+        return self.rewind(max(0, self.cycle - count))
+
+    def rewind(self, cycle):
+        """Put the computer back to just after a cycle.
+
+        Args:
+            cycle: int.  The cycles run, 0 for where the journal began.
+        Returns:
+            The cycle the computer is now at.
+        Raises:
+            RewindError: The cycle is ahead of the computer or before
+                the journal began.
+        """
+
+        if not 0 <= cycle <= self.cycle:
+            raise RewindError('Cycle {0} is not in the journal of {1}'.format(
+                cycle, self.cycle))
+
+        computer = self.computer
+        mem = self.mem
+        data = self.data
+
+        self.rewinding = True
+        computer.mute_console(True)
+        try:
+            # The first snapshot at or after the cycle, else undo from
+            # where the computer is now.
+            index = bisect.bisect_left(self.snapshot_cycles, cycle)
+            if index < len(self.snapshots):
+                writes, changes, blob = self.snapshots[index]
+                computer.restore(blob)
+            else:
+                writes = len(self.write_cycles)
+                changes = len(self.reg_cycles)
+
+            first_write = bisect.bisect_left(self.write_cycles, cycle)
+            for pos in range(writes - 1, first_write - 1, -1):
+                mem.store(self.write_addrs[pos], self.write_nums[pos],
+                          self.write_negs[pos])
+
+            first_change = bisect.bisect_left(self.reg_cycles, cycle)
+            for pos in range(changes - 1, first_change - 1, -1):
+                data[self.reg_fields[pos]] = self.reg_nums[pos]
+        finally:
+            computer.mute_console(False)
+            self.rewinding = False
+
+        for journal in (self.write_cycles, self.write_addrs,
+                        self.write_nums, self.write_negs):
+            del journal[first_write:]
+        for journal in (self.reg_cycles, self.reg_fields, self.reg_nums):
+            del journal[first_change:]
+        if index < len(self.snapshots) and self.snapshot_cycles[index] > cycle:
+            index -= 1
+        del self.snapshots[index + 1:]
+        del self.snapshot_cycles[index + 1:]
+        self.cycle = cycle
+
+        return cycle
+
+    def journal_bytes(self):
+        """Return the bytes held by the journal and its snapshots."""
+
+        total = sum(len(snapshot[2]) for snapshot in self.snapshots)
+        for journal in (self.write_cycles, self.write_addrs,
+                        self.write_nums, self.write_negs, self.reg_cycles,
+                        self.reg_fields, self.reg_nums):
+            total += len(journal) * journal.itemsize
+
+        return total
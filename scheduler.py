@@ -0,0 +1,341 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Run many computers in one process, a slice at a time.
+
+Clock.run() keeps the thread until its program halts.  A Scheduler
+instead runs each of its computers for a slice of instructions in
+turn, so a long program doesn't starve the others,
+
+    sched = scheduler.Scheduler(slice_size=1000)
+    for computer in computers:
+        sched.add(computer)
+    sched.run()
+    print(sched.report())
+
+With the ROUND_ROBIN policy the ready computers take turns.  With the
+PRIORITY policy each is given slices in proportion to its priority by
+stride scheduling.  The computer whose pass value is lowest runs next,
+and each slice moves its pass on by STRIDE / priority.  A low priority
+computer runs less often but is never starved.
+
+A computer that halts, or stops on an error, is parked and not run
+again.  One can also be blocked and woken by the host, say while it
+waits for input.
+"""
+
+import collections
+import heapq
+import time
+import decoder
+import error
+import memory
+
+SLICE_SIZE = 1000
+
+ROUND_ROBIN = 'round-robin'
+PRIORITY = 'priority'
+POLICIES = (ROUND_ROBIN, PRIORITY)
+
+STRIDE = 1 << 20
+
+# The errors that stop a computer, as in batch.
+ERROR_TYPES = (memory.ValueRangeError, decoder.IndexCarryError, KeyError)
+
+# The states of a task.
+READY = 'ready'
+BLOCKED = 'blocked'
+HALTED = 'halted'
+FAILED = 'failed'
+
+
+class PolicyError(error.Error):
+    """There is no scheduling policy by that name."""
+
+
+class Task(object):
+    """A computer in a scheduler and its progress.
+
+    Attributes:
+        computer: machine.Computer.  The computer run.
+        name: str.  The name in reports.
+        priority: int.  The share of slices under the PRIORITY policy.
+        state: str.  READY, BLOCKED, HALTED or FAILED.
+        error: Exception.  What stopped a FAILED task.
+        cycles: int.  The instructions run.
+        slices: int.  The slices run.
+        elapsed_sec: float.  The wall time of its slices.
+        max_wait: int.  The most slices other tasks ran between two of
+            its slices while it was ready.
+    """
+
+    def __init__(self, computer, name, priority, seq):
+        """Make a ready task."""
+
+        self.computer = computer
+        self.name = name
+        self.priority = priority
+        self.seq = seq
+
+        self.state = READY
+        self.error = None
+        self.cycles = 0
+        self.slices = 0
+        self.elapsed_sec = 0.0
+        self.max_wait = 0
+
+        self.pass_value = 0
+        self.ready_since = 0
+        self.queued = False
+
+    def __lt__(self, other):
+        """Order tasks by pass value, then by when they were added."""
+
+        return (self.pass_value, self.seq) < (other.pass_value, other.seq)
+
+    def __repr__(self):
+        """A str representation of the task."""
+
+        return 'Task({0!r}, {1}, {2} cycles)'.format(self.name, self.state,
+                                                    self.cycles)
+
+
+class Scheduler(object):
+    """Time slices for many computers.
+
+    Attributes:
+        tasks: list of Task.  Every task added, in order.
+        slices: int.  The slices run in all.
+    """
+
+    def __init__(self, slice_size=SLICE_SIZE, policy=ROUND_ROBIN):
+        """Make an empty scheduler.
+
+        Args:
+            slice_size: int.  The instructions a computer runs per turn.
+            policy: str.  ROUND_ROBIN or PRIORITY.
+        """
+
+        if policy not in POLICIES:
+            raise PolicyError(policy)
+
+        self.slice_size = slice_size
+        self.policy = policy
+
+        self.tasks = []
+        self.slices = 0
+
+        self.queue = collections.deque()
+        self.heap = []
+        self.pass_now = 0
+
+    def add(self, computer, priority=1, name=None):
+        """Add a computer, ready to run from its current IP.
+
+        Args:
+            computer: machine.Computer.  It should already hold its data
+                and program.
+            priority: int.  Its share of slices under PRIORITY, at least
+                1.
+            name: str.  The name in reports, its number if None.
+        Returns:
+            The Task.
+        """
+
+        if name is None:
+            name = str(len(self.tasks))
+
+        task = Task(computer, name, max(1, priority), len(self.tasks))
+        computer.reg.run_flag = True
+        self.tasks.append(task)
+        self.make_ready(task)
+
+        return task
+
+    def make_ready(self, task):
+        """Put a task in the ready queue."""
+
+        task.state = READY
+        task.ready_since = self.slices
+
+        # A task blocked and woken again before its turn came is still
+        # in the queue.
+        if task.queued:
+            return
+        task.queued = True
+
+        if self.policy == ROUND_ROBIN:
+            self.queue.append(task)
+        else:
+            # A task joining or waking starts level with the others
+            # rather than catching up on the slices it missed.
+            task.pass_value = max(task.pass_value, self.pass_now)
+            heapq.heappush(self.heap, task)
+
+    def next_task(self):
+        """Take the next ready task off the queue, or None."""
+
+        if self.policy == ROUND_ROBIN:
+            while self.queue:
+                task = self.queue.popleft()
+                task.queued = False
+                if task.state == READY:
+                    return task
+        else:
+            while self.heap:
+                task = heapq.heappop(self.heap)
+                task.queued = False
+                if task.state == READY:
+                    self.pass_now = task.pass_value
+                    return task
+
+        return None
+
+    def block(self, task):
+        """Park a ready task until it's woken."""
+
+        if task.state == READY:
+            task.state = BLOCKED
+
+    def wake(self, task):
+        """Make a blocked task ready again."""
+
+        if task.state == BLOCKED:
+            self.make_ready(task)
+
+    def ready_count(self):
+        """Return the number of tasks ready to run."""
+
+        return sum(1 for task in self.tasks if task.state == READY)
+
+    def step(self):
+        """Run one slice of the next ready task.
+
+        Returns:
+            The Task run, or None if none were ready.
+        Raises:
+            An error other than ERROR_TYPES, such as a debugger.Break,
+            with the task left ready to run again.
+        """
+
+        task = self.next_task()
+        if task is None:
+            return None
+
+        task.max_wait = max(task.max_wait, self.slices - task.ready_since)
+
+        computer = task.computer
+        cycles = 0
+        start = time.perf_counter()
+        try:
+            cycles = computer.decoder_obj.run(self.slice_size)
+        except ERROR_TYPES as err:
+            task.state = FAILED
+            task.error = err
+            cycles = err.cycles
+        except Exception as err:
+            # Anything else, such as a debugger.Break, goes to the
+            # caller, and the task stays ready to carry on.
+            cycles = getattr(err, 'cycles', 0)
+            raise
+        finally:
+            task.elapsed_sec += time.perf_counter() - start
+
+            task.cycles += cycles
+            task.slices += 1
+            self.slices += 1
+
+            if task.state == FAILED:
+                self.park(task)
+            elif not computer.reg.run_flag:
+                task.state = HALTED
+                self.park(task)
+            else:
+                task.pass_value += STRIDE // task.priority
+                self.make_ready(task)
+
+        return task
+
+    def park(self, task):
+        """Finish with a task that halted or failed."""
+
+        if task.computer.console is not None:
+            task.computer.console.flush()
+
+    def run(self, max_slices=None):
+        """Run slices until no task is ready.
+
+        Args:
+            max_slices: int.  The most slices to run, or None for no
+                limit.
+        Returns:
+            The number of slices run.
+        """
+
+        count = 0
+        while max_slices is None or count < max_slices:
+            if self.step() is None:
+                break
+            count += 1
+
+        return count
+
+    def fairness(self):
+        """Return Jain's fairness index of the tasks that have run.
+
+        Each task's cycles are divided by its priority, so 1.0 means
+        every task got exactly its share and 1/n means one task got it
+        all.
+        """
+
+        shares = [task.cycles / task.priority for task in self.tasks
+                  if task.slices]
+        if not shares or not any(shares):
+            return 1.0
+
+        return sum(shares) ** 2 / (len(shares) * sum(
+            share * share for share in shares))
+
+    def stats(self):
+        """Return the progress of each task and the fairness.
+
+        Returns:
+            A dict with 'tasks', a list of per task dicts, 'slices' and
+            'fairness'.
+        """
+
+        total = sum(task.cycles for task in self.tasks) or 1
+
+        tasks = [{
+            'name': task.name,
+            'state': task.state,
+            'priority': task.priority,
+            'cycles': task.cycles,
+            'slices': task.slices,
+            'share': task.cycles / total,
+            'elapsed_sec': task.elapsed_sec,
+            'max_wait': task.max_wait,
+        } for task in self.tasks]
+
+        return {'tasks': tasks, 'slices': self.slices,
+                'fairness': self.fairness()}
+
+    def report(self):
+        """Return the stats as text."""
+
+        stats = self.stats()
+        lines = ['{0} slices, fairness {1:.3f}'.format(stats['slices'],
+                                                       stats['fairness']),
+                 '',
+                 '{0:<12} {1:<8} {2:>4} {3:>10} {4:>7} {5:>7} {6:>8}'.format(
+                     'Name', 'State', 'Pri', 'Cycles', 'Slices', 'Share',
+                     'Max wait')]
+
+        for task in stats['tasks']:
+            lines.append(
+                '{0:<12} {1:<8} {2:>4} {3:>10} {4:>7} {5:>6.1%} {6:>8}'.format(
+                    task['name'], task['state'], task['priority'],
+                    task['cycles'], task['slices'], task['share'],
+                    task['max_wait']))
+
+        return '\n'.join(lines)
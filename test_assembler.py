@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the assembler, disassembler and assembly cache."""
+
+import array
+import os
+import shutil
+import tempfile
+import unittest
+import assembler
+import prog_2a_countdown
+import prog_4_cpstr
+
+# The program in the prog_4_cpstr.py docstring.
+CP_STR = """
+SRC = 0x40
+DST = 0x50
+
+     LDX SRC      ;; Get the count
+     STX DST      ;; Store the count at the start of the other str.
+
+LOOP LDA,X SRC    ;; Get a char
+     STA,X DST    ;; Store in dest
+     DCX          ;; Decrement to next char
+     SZX          ;; Skip on idx zero
+     JMP LOOP     ;; Jump to the LOOP addr
+     HLT          ;; Else we're done
+"""
+
+COUNTDOWN = """
+     ORG 0x10
+M1:  DB -1
+     DB 10
+
+     ORG 0x20
+     LDA 0x11
+LOOP ADD M1
+     SZA
+     JMP LOOP
+     HLT
+"""
+
+
+class TestAssembler(unittest.TestCase):
+    def test_cp_str(self):
+        self.assertEqual(assembler.assemble_pairs(CP_STR),
+                         prog_4_cpstr.PROGRAM)
+
+    def test_data(self):
+        self.assertEqual(assembler.assemble_pairs(COUNTDOWN),
+                         prog_2a_countdown.DATA + prog_2a_countdown.PROGRAM)
+
+    def test_start(self):
+        img = assembler.assemble('START = 0x30\n    HLT\n')
+
+        self.assertEqual(img.start_ip, 0x30)
+
+    def test_negative_operand(self):
+        self.assertEqual(assembler.assemble_pairs('JMP -0x24'),
+                         ((0x20, 0x23), (0x21, -0x24)))
+
+    def test_errors(self):
+        for source in ('LDA', 'LDX,X 0x10', 'JMP NOWHERE', 'LDA 0x100',
+                       'A HLT\nA HLT', '1A HLT', 'LDA 1, 2'):
+            self.assertRaises(assembler.AssemblerError,
+                              assembler.assemble, source)
+
+    def test_org_label(self):
+        self.assertEqual(assembler.assemble_pairs('A HLT\nORG A\nDB 5'),
+                         ((0x20, 0x01), (0x21, 0x00), (0x20, 0x05)))
+
+        with self.assertRaises(assembler.AssemblerError) as context:
+            assembler.assemble('ORG DATA\nDATA DB 5\n')
+
+        self.assertTrue(str(context.exception).startswith('Line 1:'))
+
+    def test_error_line(self):
+        with self.assertRaises(assembler.AssemblerError) as context:
+            assembler.assemble('HLT\nBOGUS BOGUS\n')
+
+        self.assertTrue(str(context.exception).startswith('Line 2:'))
+
+
+class TestDisassembler(unittest.TestCase):
+    def test_disassemble_image(self):
+        img = assembler.assemble(CP_STR)
+        lines = assembler.disassemble_image(img)
+
+        self.assertEqual(lines[:3], ['0x20 LDX 0x40', '0x22 STX 0x50',
+                                     '0x24 LDA,X 0x40'])
+        self.assertEqual(len(lines), 8)
+
+    def test_data_and_signs(self):
+        img = assembler.assemble('DB 0x3b, 0x10\nJMP -0x24\n')
+
+        self.assertEqual(assembler.disassemble_image(img),
+                         ['0x20 DB 0x3b, 0x10', '0x22 JMP -0x24'])
+
+    def test_odd_end(self):
+        self.assertEqual(assembler.disassemble(b'\x01\x00\x07', b'\x00'),
+                         ['0x00 HLT 0x00', '0x02 DB 0x07'])
+
+    def test_wide_word(self):
+        cells = array.array('H', [0] * 0x102)
+        cells[0x100:] = array.array('H', [0x21, 0x1234])
+
+        self.assertEqual(assembler.disassemble(memoryview(cells), bytes(33),
+                                               0x100),
+                         ['0x100 LDA 0x1234'])
+
+
+class TestAssemblyCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = assembler.AssemblyCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_miss_then_hit(self):
+        first = self.cache.assemble(CP_STR)
+        second = self.cache.assemble(CP_STR)
+
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(second.tobytes(), first.tobytes())
+        self.assertTrue(os.path.exists(self.cache.path(CP_STR)))
+
+    def test_key_depends_on_source(self):
+        self.assertNotEqual(self.cache.key(CP_STR),
+                            self.cache.key(CP_STR + '\n'))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the batch runner."""
+
+import unittest
+import batch
+import cpu
+import decoder
+import fixtures
+import memory
+
+
+class TestRunJob(unittest.TestCase):
+    def test_halted(self):
+        result = batch.run_job(fixtures.JOB)
+
+        self.assertEqual(result.status, batch.HALTED)
+        self.assertEqual(result.cycles, 2 + 8 * 4 - 1 + 2)
+        self.assertEqual(result.read(0x18), memory.Value(0xfc))
+        self.assertEqual(result.error_type(), None)
+
+    def test_step_limit(self):
+        result = batch.run_job(fixtures.LOOP_JOB, max_steps=100)
+
+        self.assertEqual(result.status, batch.STEP_LIMIT)
+        self.assertEqual(result.cycles, 100)
+
+    def test_failed(self):
+        result = batch.run_job(fixtures.CARRY_JOB)
+
+        self.assertEqual(result.status, batch.FAILED)
+        self.assertEqual(result.error_type(), decoder.IndexCarryError)
+        self.assertEqual(result.state.ip, 0x24)
+
+    def test_time_limit(self):
+        result = batch.run_job(fixtures.LOOP_JOB, max_sec=0.05)
+
+        self.assertEqual(result.status, batch.TIME_LIMIT)
+        self.assertTrue(result.cycles > 0)
+
+    def test_looped(self):
+        result = batch.run_job(fixtures.LOOP_JOB, max_steps=100000,
+                               detect_loops=True)
+
+        self.assertEqual(result.status, batch.LOOPED)
+        self.assertEqual(result.state.ip, 0x20)
+        self.assertTrue(result.cycles < 1000)
+
+    def test_detect_loops_halted(self):
+        result = batch.run_job(fixtures.JOB, detect_loops=True)
+
+        self.assertEqual(result.pack(), batch.run_job(fixtures.JOB).pack())
+
+    def test_reference_engine(self):
+        fast_result = batch.run_job(fixtures.JOB)
+        ref_result = batch.run_job(fixtures.JOB, engine='reference')
+
+        self.assertEqual(ref_result.pack(), fast_result.pack())
+
+
+class TestResult(unittest.TestCase):
+    def test_pack_unpack(self):
+        result = batch.run_job(fixtures.JOB)
+        blob = result.pack()
+        copy = batch.Result.unpack(blob)
+
+        self.assertTrue(isinstance(blob, bytes))
+        self.assertEqual(copy.state, result.state)
+        self.assertEqual(copy.memory().cells, bytearray(result.cells))
+        self.assertEqual(copy.cycles, result.cycles)
+
+    def test_unpack_size(self):
+        self.assertRaises(batch.BatchError, batch.Result.unpack, b'\x00')
+
+
+class TestRunBatch(unittest.TestCase):
+    def test_run_batch(self):
+        jobs = [fixtures.JOB, fixtures.LOOP_JOB, fixtures.CARRY_JOB] * 5
+        results = dict(batch.run_batch(jobs, max_steps=50, workers=2,
+                                       chunk_size=2))
+
+        self.assertEqual(sorted(results), list(range(len(jobs))))
+        for num, job in enumerate(jobs):
+            self.assertEqual(results[num].pack(),
+                             batch.run_job(job, max_steps=50).pack())
+
+    def test_state_type(self):
+        num, result = next(batch.run_batch([fixtures.JOB], workers=1))
+
+        self.assertEqual(num, 0)
+        self.assertTrue(isinstance(result.state, cpu.State))
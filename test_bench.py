@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the benchmarks."""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import bench
+import machine
+import memory
+
+ARGS = ['--engine', 'fast', '--workload', 'prog_3_addnums',
+        '--min-time', '0']
+
+
+def main(args):
+    """Run bench.main() quietly and return its exit status."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return bench.main(args)
+
+
+class TestBench(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.baseline = os.path.join(self.temp_dir.name, 'baseline.json')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_workloads_halt(self):
+        for workload in bench.WORKLOADS:
+            computer = workload.make_computer('translate')
+            computer.reg.run_flag = True
+            computer.decoder_obj.run()
+
+            self.assertFalse(computer.reg.run_flag)
+
+    def test_same_on_each_engine(self):
+        workload = bench.Workload.from_source('alu', bench.ALU_SOURCE)
+        snapshots = set()
+        for engine in machine.ENGINES:
+            computer = workload.make_computer(engine)
+            computer.reg.run_flag = True
+            computer.decoder_obj.run()
+            snapshots.add(computer.snapshot())
+
+        self.assertEqual(len(snapshots), 1)
+
+    def test_run_workload(self):
+        workload = bench.Workload.from_source('loops', bench.LOOPS_SOURCE)
+        result = bench.run_workload(workload, 'fast', min_time=0)
+
+        self.assertEqual(result['cycles'], 151000)
+        self.assertEqual(result['runs'], 1)
+        self.assertGreater(result['instr_per_sec'], 0)
+        self.assertGreater(result['peak_bytes'], 0)
+
+    def test_copy(self):
+        workload = bench.Workload.from_source('copy', bench.COPY_SOURCE)
+        computer = workload.make_computer('fast')
+        computer.reg.run_flag = True
+        computer.decoder_obj.run()
+
+        self.assertEqual(computer.mem.read(memory.Address(0xc5)),
+                         memory.Value(-0x2c))
+
+    def test_compare(self):
+        results = bench.run_all(bench.WORKLOADS[:1], ['fast'], 0)
+        baseline = {'results': [dict(results['results'][0])]}
+
+        self.assertEqual(bench.compare(results, baseline), [])
+
+        baseline['results'][0]['instr_per_sec'] *= 2
+        regressions = bench.compare(results, baseline)
+
+        self.assertEqual([regression[:2] for regression in regressions],
+                         [('prog_1a_add', 'fast')])
+
+    def test_no_baseline(self):
+        self.assertEqual(main(ARGS + ['--baseline', self.baseline]), 0)
+
+    def test_regression_exit(self):
+        output = os.path.join(self.temp_dir.name, 'results.json')
+        self.assertEqual(main(ARGS + ['--baseline', self.baseline,
+                                      '--save-baseline',
+                                      '--output', output]), 0)
+        self.assertEqual(bench.read_results(output)['version'],
+                         bench.RESULTS_VERSION)
+
+        baseline = bench.read_results(self.baseline)
+        for result in baseline['results']:
+            result['instr_per_sec'] *= 100
+        bench.write_results(self.baseline, baseline)
+
+        self.assertEqual(main(ARGS + ['--baseline', self.baseline]), 1)
+        self.assertEqual(main(ARGS + ['--baseline', self.baseline,
+                                      '--threshold', '1']), 0)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the console output port."""
+
+import io
+import unittest
+import console
+import fixtures
+import machine
+import memory
+import prog_5_print
+
+PORT = memory.Address(console.OUTPUT_PORT)
+
+
+class TestConsole(unittest.TestCase):
+    def setUp(self):
+        self.mem = memory.Memory()
+        self.stream = io.StringIO()
+        self.console = console.Console(self.mem, stream=self.stream,
+                                       buffer_size=4)
+
+    def test_create(self):
+        self.assertEqual(self.console.output(), b'')
+
+    def test_buffers(self):
+        for char in 'abc':
+            self.mem.write(PORT, memory.Value(ord(char)))
+
+        self.assertEqual(self.console.output(), b'abc')
+        self.assertEqual(self.stream.getvalue(), '')
+
+    def test_flush_when_full(self):
+        for char in 'abcde':
+            self.mem.write(PORT, memory.Value(ord(char)))
+
+        self.assertEqual(self.stream.getvalue(), 'abcd')
+        self.assertEqual(self.console.output(), b'e')
+        self.assertEqual(self.console.writes, 1)
+
+    def test_other_addresses(self):
+        self.mem.write(memory.Address(0x10), memory.Value(0x41))
+        self.console.flush()
+
+        self.assertEqual(self.stream.getvalue(), '')
+
+    def test_binary_stream(self):
+        stream = io.BytesIO()
+        out = console.Console(self.mem, port=0x80, stream=stream)
+        self.mem.write(memory.Address(0x80), memory.Value(0xe9))
+        out.close()
+
+        self.assertEqual(stream.getvalue(), b'\xe9')
+        self.assertEqual(out.bytes_written, 1)
+
+    def test_muted(self):
+        self.console.muted = True
+        self.mem.write(PORT, memory.Value(0x41))
+
+        self.assertEqual(self.console.output(), b'')
+
+
+class TestComputerConsole(unittest.TestCase):
+    def make_computer(self, engine):
+        self.stream = io.StringIO()
+        return fixtures.make_computer(engine, prog_5_print.DATA,
+                                      prog_5_print.PROGRAM,
+                                      output=self.stream)
+
+    def test_engines(self):
+        for engine in machine.ENGINES:
+            computer = self.make_computer(engine)
+            computer.clock.run()
+            computer.console.flush()
+
+            self.assertEqual(self.stream.getvalue(), prog_5_print.TEXT)
+            self.assertEqual(computer.console.writes, 1)
+
+    def test_restore_is_not_output(self):
+        computer = self.make_computer('fast')
+        blob = computer.snapshot()
+        computer.clock.run()
+        computer.console.flush()
+        computer.restore(blob)
+
+        self.assertEqual(computer.console.output(), b'')
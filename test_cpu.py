@@ -4,6 +4,7 @@
 
 """Test the CPU."""
 
+import asyncio
 import unittest
 import cpu
 import decoder
@@ -17,6 +18,45 @@ ZERO_ADDR = memory.Address(0)
 ZERO_VAL = memory.Value(0)
 
 
+class TestState(unittest.TestCase):
+    def setUp(self):
+        self.state = cpu.State()
+
+    def test_create(self):
+        self.assertEqual(list(self.state.data), [0] * cpu.NUM_FIELDS)
+
+    def test_fields(self):
+        self.state.accum = VALUE_0A_HEX
+        self.state.zero = 1
+
+        self.assertEqual(self.state.data[cpu.ACCUM], VALUE_0A_HEX)
+        self.assertEqual(self.state.zero, 1)
+
+    def test_copy(self):
+        self.state.ip = ADDR_20_HEX
+        copy_state = self.state.copy()
+
+        self.assertEqual(copy_state, self.state)
+
+        copy_state.ip = 0
+        self.assertNotEqual(copy_state, self.state)
+
+    def test_bytes(self):
+        self.state.idx = VALUE_0A_HEX
+        self.state.run = 1
+        blob = self.state.tobytes()
+
+        self.assertEqual(cpu.State.frombytes(blob), self.state)
+
+    def test_load(self):
+        other = cpu.State()
+        other.accum = VALUE_0A_HEX
+        self.state.load(other)
+
+        self.assertEqual(self.state, other)
+        self.assertFalse(self.state.data is other.data)
+
+
 class TestRegisters(unittest.TestCase):
     def setUp(self):
         self.reg = cpu.Registers()
@@ -32,6 +72,22 @@ class TestRegisters(unittest.TestCase):
         self.assertFalse(self.reg.run_flag)
         self.assertFalse(self.reg.zerox_flag)
 
+    def test_state(self):
+        self.reg.accum = memory.Value(-VALUE_0A_HEX)
+        self.reg.run_flag = True
+
+        self.assertEqual(self.reg.state.accum, VALUE_0A_HEX)
+        self.assertEqual(self.reg.state.accum_neg, 1)
+        self.assertEqual(self.reg.state.run, 1)
+        self.assertEqual(self.reg.accum, memory.Value(-VALUE_0A_HEX))
+
+    def test_shared_state(self):
+        alu = cpu.ArithmeticLogicUnit(self.reg.state)
+        alu.add(memory.Value(1), memory.Value(-1))
+
+        self.assertEqual(self.reg.state.zero, 1)
+        self.assertTrue(alu.zero_flag)
+
     def test_ip_inc(self):
         self.assertEqual(self.reg.ip, ZERO_ADDR)
         self.reg.ip_inc()
@@ -101,3 +157,140 @@ class TestClock(unittest.TestCase):
 
     def test_create(self):
         self.assertTrue(self.reg is not None)
+        self.assertEqual(self.clock.freq_hz, cpu.CLOCK_FREQ_HZ)
+
+    def test_bad_frequency(self):
+        for freq_hz in (0, -1.5):
+            self.assertRaises(cpu.FrequencyError, cpu.Clock, self.reg,
+                              self.decoder, freq_hz=freq_hz)
+
+        with self.assertRaises(cpu.FrequencyError):
+            self.clock.freq_hz = 0
+        self.assertEqual(self.clock.freq_hz, cpu.CLOCK_FREQ_HZ)
+
+    def store_loop(self, count):
+        """Store a program that loops count times and halts."""
+
+        self.mem.write(memory.Address(0x10), memory.Value(-1))
+        self.mem.write(memory.Address(0x11), memory.Value(count))
+
+        program = (0x21, 0x11, 0x20, 0x10, 0x24, 0x00, 0x23, 0x22, 0x01, 0x00)
+        for offset, num in enumerate(program):
+            self.mem.write(memory.Address(0x20 + offset), memory.Value(num))
+
+        self.reg.ip = memory.Address(0x20)
+
+    def test_run_unthrottled(self):
+        self.clock.freq_hz = cpu.UNTHROTTLED
+        self.store_loop(3)
+
+        self.clock.run()
+
+        self.assertFalse(self.reg.run_flag)
+        self.assertEqual(self.clock.cycles, 1 + 3 * 3)
+        self.assertTrue(self.clock.achieved_hz() > 0)
+
+    def test_run_paced(self):
+        self.clock.freq_hz = 200
+        self.store_loop(2)
+
+        self.clock.run()
+
+        self.assertEqual(self.clock.cycles, 7)
+        self.assertTrue(self.clock.elapsed_sec >= 7 / 200)
+        self.assertTrue(self.clock.achieved_hz() <= 200)
+
+    def store_forever(self):
+        """Store a JMP to itself."""
+
+        self.mem.write(memory.Address(0x20), memory.Value(0x23))
+        self.mem.write(memory.Address(0x21), memory.Value(0x20))
+        self.reg.ip = memory.Address(0x20)
+
+    def test_halted(self):
+        self.clock.freq_hz = cpu.UNTHROTTLED
+        self.store_loop(3)
+
+        self.clock.run(max_steps=1000, max_sec=10.0)
+
+        self.assertEqual(self.clock.stop_reason, cpu.HALTED)
+        self.assertEqual(self.clock.cycles, 1 + 3 * 3)
+
+    def test_step_budget(self):
+        self.clock.freq_hz = cpu.UNTHROTTLED
+        self.store_forever()
+
+        self.clock.run(max_steps=10000)
+
+        self.assertEqual(self.clock.stop_reason, cpu.STEP_LIMIT)
+        self.assertEqual(self.clock.cycles, 10000)
+        self.assertTrue(self.reg.run_flag)
+
+    def test_time_budget(self):
+        self.clock.freq_hz = cpu.UNTHROTTLED
+        self.store_forever()
+
+        self.clock.run(max_sec=0.05)
+
+        self.assertEqual(self.clock.stop_reason, cpu.TIME_LIMIT)
+        self.assertTrue(self.clock.cycles > 0)
+        self.assertTrue(self.reg.run_flag)
+
+    def test_paced_budgets(self):
+        self.clock.freq_hz = 1000
+        self.store_forever()
+
+        self.clock.run(max_steps=5)
+
+        self.assertEqual(self.clock.stop_reason, cpu.STEP_LIMIT)
+        self.assertEqual(self.clock.cycles, 5)
+
+        self.clock.run(max_sec=0.02)
+
+        self.assertEqual(self.clock.stop_reason, cpu.TIME_LIMIT)
+
+    def test_run_async(self):
+        self.clock.freq_hz = cpu.UNTHROTTLED
+        self.store_loop(3)
+
+        asyncio.run(self.clock.run_async())
+
+        self.assertFalse(self.reg.run_flag)
+        self.assertEqual(self.clock.stop_reason, cpu.HALTED)
+        self.assertEqual(self.clock.cycles, 1 + 3 * 3)
+
+    def test_run_async_budgets(self):
+        self.clock.freq_hz = cpu.UNTHROTTLED
+        self.store_forever()
+
+        asyncio.run(self.clock.run_async(max_steps=2500, yield_every=1000))
+
+        self.assertEqual(self.clock.stop_reason, cpu.STEP_LIMIT)
+        self.assertEqual(self.clock.cycles, 2500)
+
+        asyncio.run(self.clock.run_async(max_sec=0.02))
+
+        self.assertEqual(self.clock.stop_reason, cpu.TIME_LIMIT)
+        self.assertTrue(self.reg.run_flag)
+
+    def test_run_async_shares_loop(self):
+        self.store_forever()
+        seen = []
+
+        async def other():
+            while not seen or seen[-1] < 100:
+                seen.append(self.clock.cycles)
+                await asyncio.sleep(0)
+
+        async def both():
+            await asyncio.gather(self.clock.run_async(max_steps=300,
+                                                      yield_every=100),
+                                 other())
+
+        for freq_hz in (cpu.UNTHROTTLED, 10000):
+            seen.clear()
+            self.clock.freq_hz = freq_hz
+            asyncio.run(both())
+
+            self.assertEqual(self.clock.cycles, 300)
+            self.assertTrue(0 < seen[0] < 300)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the breakpoints and watchpoints."""
+
+import unittest
+import debugger
+import fixtures
+import machine
+import memory
+import profiler
+
+# The addresses of prog_3_addnums.
+LOOP = 0x24
+ADDX = 0x26
+STA = 0x2c
+RESULT = 0x18
+COUNT = 0x19
+
+
+def run_to_halt(computer):
+    """Run the computer, carrying on after each Break.
+
+    Returns:
+        The list of (kind, ip, addr) of the breaks.
+    """
+
+    breaks = []
+    while True:
+        try:
+            computer.clock.run()
+            return breaks
+        except debugger.Break as brk:
+            breaks.append((brk.kind, brk.ip, brk.addr))
+
+
+class TestDebugger(unittest.TestCase):
+    def setUp(self):
+        self.computer = fixtures.make_computer('fast')
+        self.dbg = self.computer.debugger
+
+    def test_no_points(self):
+        engine = self.computer.decoder_obj
+
+        self.assertFalse(self.dbg.active())
+        self.assertNotIn('fetch_execute', vars(engine))
+
+        self.dbg.add_breakpoint(LOOP)
+        self.assertIn('fetch_execute', vars(engine))
+
+        self.dbg.remove_breakpoint(LOOP)
+        self.assertNotIn('fetch_execute', vars(engine))
+        self.assertNotIn('run', vars(engine))
+
+    def test_breakpoint(self):
+        for engine in machine.ENGINES:
+            computer = fixtures.make_computer(engine)
+            computer.debugger.add_breakpoint(LOOP)
+
+            breaks = run_to_halt(computer)
+
+            self.assertEqual(breaks, [('breakpoint', LOOP, LOOP)] * 8)
+            self.assertEqual(computer.mem.read(memory.Address(RESULT)),
+                             memory.Value(0xfc))
+
+    def test_stop_before(self):
+        self.dbg.add_breakpoint(STA)
+
+        self.assertRaises(debugger.Break, self.computer.clock.run)
+        self.assertEqual(self.computer.reg.ip, memory.Address(STA))
+        self.assertEqual(self.computer.reg.accum, memory.Value(0xfc))
+        self.assertEqual(self.computer.mem.read(memory.Address(RESULT)),
+                         memory.Value(0))
+
+        self.computer.clock.run()
+        self.assertEqual(self.computer.mem.read(memory.Address(RESULT)),
+                         memory.Value(0xfc))
+
+    def test_moved_after_break(self):
+        self.dbg.add_breakpoint(LOOP)
+        self.assertRaises(debugger.Break, self.computer.clock.run)
+
+        # Start again from the top, which passes LOOP before any ADD,X.
+        self.computer.reg.ip = memory.Address(0x20)
+        self.assertRaises(debugger.Break, self.computer.clock.run)
+        self.assertEqual(self.computer.reg.ip, memory.Address(LOOP))
+        self.assertEqual(self.computer.reg.idx, memory.Value(8))
+
+    def test_cycles_before_break(self):
+        for engine in machine.ENGINES:
+            computer = fixtures.make_computer(engine)
+            computer.debugger.add_breakpoint(LOOP)
+
+            self.assertRaises(debugger.Break, computer.clock.run)
+            self.assertEqual(computer.clock.cycles, 2)
+
+            # Once round the loop.
+            self.assertRaises(debugger.Break, computer.clock.run)
+            self.assertEqual(computer.clock.cycles, 4)
+
+    def test_watchpoints(self):
+        for engine in machine.ENGINES:
+            computer = fixtures.make_computer(engine)
+            computer.debugger.add_watchpoint(RESULT, debugger.WRITE)
+            computer.debugger.add_watchpoint(COUNT, debugger.READ)
+
+            self.assertEqual(run_to_halt(computer),
+                             [('read', 0x22, COUNT), ('write', STA, RESULT)])
+
+    def test_indexed_watchpoint(self):
+        self.dbg.add_watchpoint(0x13, debugger.ACCESS)
+
+        self.assertEqual(run_to_halt(self.computer), [('read', ADDX, 0x13)])
+
+    def test_callback(self):
+        seen = []
+
+        def callback(kind, ip, addr):
+            seen.append(self.computer.reg.idx.num)
+            return len(seen) == 3
+
+        self.dbg.add_breakpoint(ADDX, callback)
+
+        self.assertEqual(run_to_halt(self.computer),
+                         [('breakpoint', ADDX, ADDX)])
+        self.assertEqual(seen, list(range(7, -1, -1)))
+        self.assertEqual(self.dbg.hits, 8)
+
+    def test_bad_kind(self):
+        self.assertRaises(debugger.PointKindError, self.dbg.add_watchpoint,
+                          RESULT, 'execute')
+
+    def test_with_profiler(self):
+        engine = self.computer.decoder_obj
+        prof = profiler.Profiler(engine)
+        prof.enable()
+
+        self.dbg.add_breakpoint(LOOP)
+        run_to_halt(self.computer)
+        self.dbg.clear()
+
+        self.assertEqual(engine.fetch_execute, prof.fetch_execute)
+        self.assertEqual(prof.cycles(), 35)
+
+    def test_detach_out_of_order(self):
+        computer = fixtures.make_computer('fast', profile=True)
+        engine = computer.decoder_obj
+        computer.debugger.add_breakpoint(LOOP)
+        computer.profiler.disable()
+
+        self.assertRaises(debugger.Break, computer.clock.run)
+        self.assertEqual(computer.reg.ip, memory.Address(LOOP))
+
+        computer.debugger.clear()
+        self.assertNotIn('fetch_execute', vars(engine))
+        self.assertNotIn('instruments', vars(engine))
+
+        computer.clock.run()
+        self.assertEqual(computer.mem.read(memory.Address(RESULT)),
+                         memory.Value(0xfc))
@@ -4,10 +4,15 @@
 
 """Test the instruction decoder."""
 
+import random
 import unittest
 import cpu
 import decoder
+import fixtures
 import memory
+import prog_1a_add
+import prog_2a_countdown
+import prog_4_cpstr
 
 ADDR1 = memory.Address(0x10)
 ADDR2 = memory.Address(0x20)
@@ -205,6 +210,174 @@ class TestDecoder(unittest.TestCase):
         self.assertEqual(self.reg.ip, memory.Address(0x12))
         self.assertEqual(fake_obj.addr, memory.Address(0x22))
 
+    def test_cache_hits(self):
+        self.mem.write(memory.Address(0x10), memory.Value(decoder.LDA))
+        self.mem.write(memory.Address(0x11), memory.Value(0x30))
+
+        for _ in range(3):
+            self.reg.ip = memory.Address(0x10)
+            self.decoder.fetch_execute()
+
+        self.assertEqual(self.decoder.misses, 1)
+        self.assertEqual(self.decoder.hits, 2)
+        self.assertEqual(self.decoder.hit_rate(), 2 / 3)
+        self.assertEqual(self.reg.ip, memory.Address(0x12))
+
+    def test_write_invalidates(self):
+        self.mem.write(memory.Address(0x10), memory.Value(decoder.LDA))
+        self.mem.write(memory.Address(0x11), memory.Value(0x30))
+        self.mem.write(memory.Address(0x30), memory.Value(0x05))
+        self.mem.write(memory.Address(0x31), memory.Value(0x07))
+
+        self.reg.ip = memory.Address(0x10)
+        self.decoder.fetch_execute()
+
+        self.mem.write(memory.Address(0x11), memory.Value(0x31))
+        self.assertEqual(self.decoder.cache, {})
+
+        self.reg.ip = memory.Address(0x10)
+        self.decoder.fetch_execute()
+
+        self.assertEqual(self.reg.accum, memory.Value(0x07))
+        self.assertEqual(self.decoder.misses, 2)
+
+    def test_self_modifying(self):
+        # STA over its own address, then run it again.
+        self.mem.write(memory.Address(0x10), memory.Value(decoder.STA))
+        self.mem.write(memory.Address(0x11), memory.Value(0x11))
+        self.reg.accum = memory.Value(0x30)
+
+        self.reg.ip = memory.Address(0x10)
+        self.decoder.fetch_execute()
+        self.reg.ip = memory.Address(0x10)
+        self.decoder.fetch_execute()
+
+        self.assertEqual(self.decoder.misses, 2)
+        self.assertEqual(self.mem.read(memory.Address(0x30)),
+                         memory.Value(0x30))
+
+    def test_clear_cache(self):
+        self.reg.ip = memory.Address(0x10)
+        self.mem.write(memory.Address(0x10), memory.Value(decoder.LDA))
+        self.decoder.fetch_execute()
+        self.decoder.clear_cache()
+
+        self.assertEqual(self.decoder.cache, {})
+        self.assertEqual(self.decoder.misses, 0)
+        self.assertEqual(self.decoder.hit_rate(), 0.0)
+
+
+def prog_cells(prog):
+    """Return the cells of a prog_* module's data and program."""
+
+    cells = [0] * memory.SIZE
+    for num, cell in tuple(prog.DATA) + tuple(prog.PROGRAM):
+        cells[num] = cell
+
+    return cells
+
+
+def fused_cells(rand):
+    """Return random cells with many runs of op codes that are fused."""
+
+    cells = fixtures.random_cells(rand)
+    for _ in range(24):
+        ops = rand.choice(decoder.FUSIONS)[1]
+        start = rand.randrange(0, memory.SIZE - 2 * len(ops), 2)
+        for pos, op in enumerate(ops):
+            cells[start + 2 * pos] = op
+            cells[start + 2 * pos + 1] = rand.randrange(memory.SIZE)
+
+    return cells
+
+
+class TestFusion(unittest.TestCase):
+    def test_progs(self):
+        fusions = ((prog_1a_add, 'LDA ADD STA', 1),
+                   (prog_2a_countdown, 'ADD SZA JMP', 10),
+                   (prog_4_cpstr, 'LDA,X STA,X DCX SZX', 13))
+
+        for prog, name, count in fusions:
+            cells = prog_cells(prog)
+            ref = fixtures.build(decoder.Decoder, cells)
+            ref.fuse = False
+            fused = fixtures.build(decoder.Decoder, cells)
+
+            self.assertEqual(fixtures.run_bulk(fused, 10000),
+                             fixtures.run_bulk(ref, 10000))
+            self.assertEqual(fused.fusion_counts[name], count)
+            self.assertEqual(sum(fused.fusion_counts.values()), count)
+            self.assertEqual((fused.hits, fused.misses),
+                             (ref.hits, ref.misses))
+
+    def test_random_programs(self):
+        rand = random.Random(7)
+        for _ in range(300):
+            cells = fused_cells(rand)
+            start_ip = rand.randrange(0, memory.SIZE, 2)
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip)
+            fused = fixtures.build(decoder.Decoder, cells, start_ip)
+
+            self.assertEqual(fixtures.run_bulk(fused, 200),
+                             fixtures.run_steps(ref, 200))
+
+    def test_limit(self):
+        cells = prog_cells(prog_1a_add)
+        fused = fixtures.build(decoder.Decoder, cells)
+
+        self.assertEqual(fused.run(2), 2)
+        self.assertEqual(fused.reg.ip, memory.Address(0x24))
+        self.assertEqual(fused.run(), 2)
+        self.assertEqual(fused.dispatches_saved(), 0)
+
+    def test_written_over(self):
+        # STA,X stores the HLT in the accumulator over the DCX after it.
+        cells = [0] * memory.SIZE
+        cells[0x10] = 2
+        cells[0x30] = decoder.HLT
+        cells[0x20:0x2c] = [decoder.LDX, 0x10, decoder.LDAX, 0x2e,
+                            decoder.STAX, 0x24, decoder.DCX, 0x00,
+                            decoder.SZX, 0x00, decoder.HLT, 0x00]
+        fused = fixtures.build(decoder.Decoder, cells)
+
+        self.assertEqual(fused.run(), 4)
+        self.assertEqual(fused.reg.ip, memory.Address(0x28))
+        self.assertEqual(fused.fusion_counts['LDA,X STA,X DCX SZX'], 1)
+        self.assertEqual(fused.fused_instructions, 2)
+
+    def test_top_of_memory(self):
+        # LDA ADD STA at 0xfa runs LDA and ADD before the IP overflows.
+        cells = [0] * memory.SIZE
+        cells[0x10:0x12] = [2, 3]
+        cells[0xfa:0x100] = [decoder.LDA, 0x10, decoder.ADD, 0x11,
+                             decoder.STA, 0x12]
+
+        results = []
+        for fuse in (False, True):
+            engine = fixtures.build(decoder.Decoder, cells, start_ip=0xfa)
+            engine.fuse = fuse
+            results.append(fixtures.run_bulk(engine, 10))
+
+            self.assertEqual(engine.reg.accum, memory.Value(5))
+            self.assertEqual(engine.reg.ip, memory.Address(0xff))
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][3], memory.ValueRangeError)
+
+    def test_report(self):
+        fused = fixtures.build(decoder.Decoder, prog_cells(prog_4_cpstr))
+        fused.run()
+        report = fused.fusion_report()
+
+        self.assertIn('LDA,X STA,X DCX SZX', report)
+        self.assertIn('52 of 67 instructions fused, 39 dispatches saved',
+                      report)
+
+        fused.clear_cache()
+        self.assertEqual(fused.fused, {})
+        self.assertEqual(fused.dispatches_saved(), 0)
+
 
 class TestMemoryInterface(unittest.TestCase):
     def setUp(self):
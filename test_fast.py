@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the fast engine against the reference decoder."""
+
+import random
+import unittest
+import decoder
+import fast
+import fixtures
+import memory
+
+# Sum the eight numbers at 0x10 with ADD,X and store the total at 0x18.
+ADD_NUMS = (0x21, 0x1a, 0x26, 0x19, 0x29, 0x00, 0x40, 0x10,
+            0x28, 0x00, 0x23, 0x24, 0x22, 0x18, 0x01, 0x00)
+
+
+class TestFastEngine(unittest.TestCase):
+    def setUp(self):
+        cells = [0] * memory.SIZE
+        cells[0x10:0x18] = [0x3b, 0x36, 0x06, 0x08, 0x15, 0x18, 0x30, 0x20]
+        cells[0x19] = 0x08
+        cells[0x20:0x20 + len(ADD_NUMS)] = ADD_NUMS
+        self.cells = cells
+
+        self.engine = fixtures.build(fast.FastEngine, self.cells)
+
+    def test_create(self):
+        self.assertTrue(self.engine is not None)
+
+    def test_run(self):
+        count = self.engine.run()
+
+        self.assertEqual(self.engine.mem.read(memory.Address(0x18)),
+                         memory.Value(0xfc))
+        self.assertFalse(self.engine.reg.run_flag)
+        self.assertEqual(count, 2 + 8 * 4 - 1 + 2)
+
+    def test_run_limit(self):
+        self.assertEqual(self.engine.run(limit=5), 5)
+        self.assertTrue(self.engine.reg.run_flag)
+        self.assertEqual(self.engine.reg.ip, memory.Address(0x2a))
+
+    def test_run_not_running(self):
+        self.engine.reg.run_flag = False
+
+        self.assertEqual(self.engine.run(), 0)
+
+    def test_same_as_reference(self):
+        ref = fixtures.build(decoder.Decoder, self.cells)
+
+        self.assertEqual(fixtures.run_steps(self.engine, 100),
+                         fixtures.run_steps(ref, 100))
+
+    def test_index_carry(self):
+        self.cells[0x20:0x24] = [0x26, 0x11, 0x41, 0xf0]
+        self.cells[0x11] = 0x20
+        engine = fixtures.build(fast.FastEngine, self.cells)
+
+        self.assertRaises(decoder.IndexCarryError, engine.run)
+        self.assertEqual(engine.reg.ip, memory.Address(0x24))
+
+    def test_ip_overflow(self):
+        self.cells[0xfe] = 0x29
+        engine = fixtures.build(fast.FastEngine, self.cells, start_ip=0xfe)
+
+        self.assertRaises(memory.ValueRangeError, engine.run)
+        self.assertEqual(engine.reg.ip, memory.Address(0xff))
+
+    def test_random_programs(self):
+        rand = random.Random(1)
+        for _ in range(300):
+            cells = fixtures.random_cells(rand)
+            start_ip = rand.randrange(0, memory.SIZE, 2)
+            neg_zeros = [rand.randrange(memory.SIZE) for _ in range(8)]
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip, neg_zeros)
+            engine = fixtures.build(fast.FastEngine, cells, start_ip,
+                                    neg_zeros)
+
+            self.assertEqual(fixtures.run_bulk(engine, 200),
+                             fixtures.run_steps(ref, 200))
+
+    def test_random_programs_16_bits(self):
+        # The programs fill the low addresses but their operands reach
+        # anywhere in the larger memory.
+        rand = random.Random(3)
+        for _ in range(50):
+            cells = fixtures.random_cells(rand, 512, 0xffff)
+            start_ip = rand.randrange(0, 512, 2)
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip, bits=16)
+            engine = fixtures.build(fast.FastEngine, cells, start_ip, bits=16)
+
+            self.assertEqual(fixtures.run_bulk(engine, 200),
+                             fixtures.run_steps(ref, 200))
+
+    def test_random_programs_paged(self):
+        rand = random.Random(5)
+        for _ in range(50):
+            cells = fixtures.random_cells(rand, 512, 0xffff)
+            start_ip = rand.randrange(0, 512, 2)
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip, bits=16)
+            engine = fixtures.build(fast.FastEngine, cells, start_ip, bits=16,
+                                    paged=True)
+
+            self.assertEqual(fixtures.run_bulk(engine, 200),
+                             fixtures.run_steps(ref, 200))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the binary program images."""
+
+import os
+import tempfile
+import unittest
+import cpu
+import image
+import machine
+import memory
+import prog_4_cpstr
+
+PAIRS = ((0x10, 0x05), (0x11, -0x06), (0x20, 0x21), (0x21, 0x10),
+         (0x22, 0x01))
+
+
+class TestImage(unittest.TestCase):
+    def setUp(self):
+        self.image = image.Image.from_pairs(PAIRS, start_ip=0x20)
+
+    def test_segments(self):
+        self.assertEqual(self.image.segments,
+                         [(0x10, b'\x05\x06'), (0x20, b'\x21\x10\x01')])
+        self.assertEqual(self.image.signs[0x11 >> 3], 1 << (0x11 & 7))
+
+    def test_round_trip(self):
+        copy = image.Image.frombuffer(self.image.tobytes())
+
+        self.assertEqual(copy.start_ip, 0x20)
+        self.assertEqual(copy.segments, self.image.segments)
+        self.assertEqual(copy.signs, self.image.signs)
+
+    def test_load_into(self):
+        mem = memory.Memory()
+        mem.write(memory.Address(0x11), memory.Value(0x33))
+        mem.write(memory.Address(0x40), memory.Value(-0x07))
+        self.image.load_into(mem)
+
+        self.assertEqual(mem.read(memory.Address(0x11)), memory.Value(-0x06))
+        self.assertEqual(mem.read(memory.Address(0x22)), memory.Value(0x01))
+        self.assertEqual(mem.read(memory.Address(0x40)), memory.Value(-0x07))
+
+    def test_bad_magic(self):
+        blob = b'XXXX' + self.image.tobytes()[4:]
+
+        self.assertRaises(image.ImageError, image.Image.frombuffer, blob)
+
+    def test_truncated(self):
+        blob = self.image.tobytes()[:-1]
+
+        self.assertRaises(image.ImageError, image.Image.frombuffer, blob)
+
+    def test_truncated_table(self):
+        table = image.HEADER.size + (memory.SIZE + 7) // 8
+        blob = self.image.tobytes()[:table + image.SEGMENT.size + 3]
+
+        self.assertRaises(image.ImageError, image.Image.frombuffer, blob)
+
+    def test_address_range(self):
+        self.assertRaises(image.ImageError, image.Image.from_pairs,
+                          ((0x100, 0x01),))
+
+
+class TestImageFile(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.img')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_load_image(self):
+        image.write_image(self.path, prog_4_cpstr.DATA, prog_4_cpstr.PROGRAM)
+
+        computer = machine.Computer(freq_hz=cpu.UNTHROTTLED, trace='none')
+        computer.load_image(self.path)
+
+        expected = machine.Computer(data=prog_4_cpstr.DATA,
+                                    program=prog_4_cpstr.PROGRAM)
+        expected.store()
+
+        self.assertEqual(computer.snapshot(), expected.snapshot())
+
+        computer.clock.run()
+        self.assertEqual(computer.mem.read(memory.Address(0x5d)),
+                         memory.Value(0x21))
+
+    def test_read_image(self):
+        written = image.write_image(self.path, (), PAIRS, start_ip=0x30)
+
+        self.assertEqual(image.read_image(self.path).segments,
+                         written.segments)
+        self.assertEqual(image.read_image(self.path).start_ip, 0x30)
+
+    def test_empty_file(self):
+        self.assertRaises(image.ImageError, image.load_image, self.path,
+                          memory.Memory())
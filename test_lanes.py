@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the lockstep lanes against the reference computer."""
+
+import random
+import unittest
+import cpu
+import decoder
+import fixtures
+import lanes
+import memory
+import prog_3_addnums
+
+numpy = lanes.numpy
+
+
+def run_computer(data, program, steps=None):
+    """Run a Computer unthrottled and return it."""
+
+    computer = fixtures.make_computer(data=data, program=program)
+    computer.clock.run()
+
+    return computer
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestLanes(unittest.TestCase):
+    def setUp(self):
+        self.lanes = lanes.Lanes(4, data=prog_3_addnums.DATA,
+                                 program=prog_3_addnums.PROGRAM)
+
+    def test_create(self):
+        self.assertEqual(self.lanes.mags.shape, (4, memory.SIZE))
+        self.assertEqual(list(self.lanes.read(0x10)), [0x3b] * 4)
+
+    def test_run(self):
+        steps = self.lanes.run()
+
+        self.assertEqual(list(self.lanes.read(0x18)), [0xfc] * 4)
+        self.assertEqual(steps, 2 + 8 * 4 - 1 + 2)
+        self.assertEqual(self.lanes.running().size, 0)
+
+    def test_sweep_same_as_computer(self):
+        counts = [8, 3, 0, 1]
+        self.lanes.write(0x19, counts)
+        self.lanes.write(0x10, [-5, 0, 7, 250])
+        self.lanes.run()
+
+        for lane, count in enumerate(counts):
+            data = dict(prog_3_addnums.DATA)
+            data[0x19] = count
+            data[0x10] = [-5, 0, 7, 250][lane]
+            computer = run_computer(sorted(data.items()),
+                                    prog_3_addnums.PROGRAM)
+
+            self.assertEqual(self.lanes.lane_state(lane), computer.state)
+            mem = self.lanes.lane_memory(lane)
+            self.assertEqual(mem.cells, computer.mem.cells)
+            self.assertEqual(mem.signs, computer.mem.signs)
+
+    def test_divergent_lanes(self):
+        self.lanes.write(0x19, [8, 2, 8, 8])
+        self.lanes.write(0x11, [0x36, 0x36, -200, 0x36])
+        self.lanes.write(0x12, [0x06, 0x06, -200, 0x06])
+        self.lanes.run()
+
+        self.assertEqual(list(self.lanes.errors),
+                         [lanes.OK, lanes.OK, lanes.VALUE_RANGE, lanes.OK])
+        self.assertEqual(list(self.lanes.cycles), [35, 11, 28, 35])
+        self.assertEqual(self.lanes.lane_error(2), memory.ValueRangeError)
+        self.assertEqual(self.lanes.lane_error(0), None)
+
+    def test_run_limit(self):
+        self.assertEqual(self.lanes.run(limit=5), 5)
+        self.assertEqual(list(self.lanes.cycles), [5] * 4)
+
+    def test_write_range(self):
+        self.assertRaises(memory.ValueRangeError, self.lanes.write, 0x10,
+                          [0, 256, 0, 0])
+
+    def test_random_programs(self):
+        rand = random.Random(3)
+        num_lanes = 200
+        programs = [fixtures.random_cells(rand) for _ in range(num_lanes)]
+        starts = [rand.randrange(0, memory.SIZE, 2) for _ in programs]
+
+        sweep = lanes.Lanes(num_lanes)
+        for num in range(memory.SIZE):
+            sweep.write(num, [cells[num] for cells in programs])
+        sweep.state[cpu.IP] = starts
+        sweep.run(200)
+
+        for lane, cells in enumerate(programs):
+            ref = fixtures.build(decoder.Decoder, cells, starts[lane])
+            state, ref_cells, ref_signs, error_type = fixtures.run_steps(
+                ref, 200)
+
+            self.assertEqual(sweep.lane_state(lane), state)
+            mem = sweep.lane_memory(lane)
+            self.assertEqual(bytes(mem.cells), ref_cells)
+            self.assertEqual(bytes(mem.signs), ref_signs)
+            self.assertEqual(sweep.lane_error(lane), error_type)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the infinite loop detector."""
+
+import unittest
+import decoder
+import fixtures
+import loopdetect
+import machine
+import memory
+
+# Count the index down from 5, then DCX flips it between 0 and -1
+# forever, a loop of four cycles.
+COUNTDOWN_JOB = (((0x10, 5),),
+                 ((0x20, decoder.LDX), (0x21, 0x10),
+                  (0x22, decoder.DCX), (0x23, 0x00),
+                  (0x24, decoder.JMP), (0x25, 0x22)), 0x20)
+
+
+class TestLoopDetector(unittest.TestCase):
+    def test_loop(self):
+        for engine in machine.ENGINES:
+            for interval in (1, 7):
+                computer = fixtures.job_computer(COUNTDOWN_JOB, engine)
+                computer.clock.loop_detector = loopdetect.LoopDetector(
+                    computer.decoder_obj, interval)
+
+                with self.assertRaises(loopdetect.LoopError) as context:
+                    computer.clock.run()
+
+                self.assertEqual(context.exception.period, 4)
+                self.assertEqual(context.exception.ip, 0x24)
+                self.assertEqual(computer.reg.ip, memory.Address(0x24))
+
+    def test_jump_to_self(self):
+        computer = fixtures.job_computer(fixtures.LOOP_JOB, 'reference')
+        computer.clock.loop_detector = loopdetect.LoopDetector(
+            computer.decoder_obj, max_states=1)
+
+        with self.assertRaises(loopdetect.LoopError) as context:
+            computer.clock.run()
+
+        self.assertEqual(context.exception.period, 1)
+        self.assertEqual(context.exception.ip, 0x20)
+        self.assertEqual(context.exception.cycle, 3)
+
+    def test_halts(self):
+        plain = fixtures.make_computer('fast')
+        plain.clock.run()
+
+        computer = fixtures.make_computer('fast')
+        computer.clock.loop_detector = loopdetect.LoopDetector(
+            computer.decoder_obj)
+        computer.clock.run()
+
+        self.assertEqual(computer.snapshot(), plain.snapshot())
+        self.assertEqual(computer.clock.cycles, plain.clock.cycles)
+
+    def test_paced(self):
+        computer = fixtures.job_computer(COUNTDOWN_JOB, 'reference')
+        computer.clock.freq_hz = 1e6
+        computer.clock.loop_detector = loopdetect.LoopDetector(
+            computer.decoder_obj)
+
+        self.assertRaises(loopdetect.LoopError, computer.clock.run)
+
+    def test_hash_follows_writes(self):
+        computer = fixtures.make_computer('fast')
+        detector = loopdetect.LoopDetector(computer.decoder_obj)
+        computer.clock.run()
+        computer.mem.write(memory.Address(0x80), memory.Value(0).negate())
+
+        fresh = loopdetect.LoopDetector(computer.decoder_obj)
+
+        self.assertEqual(detector.mem_hash, fresh.mem_hash)
+        self.assertNotEqual(detector.mem_hash, 0)
+
+    def test_collision(self):
+        computer = fixtures.make_computer()
+        detector = loopdetect.LoopDetector(computer.decoder_obj)
+        computer.reg.run_flag = True
+
+        # Pretend the state was seen 5 cycles ago.
+        steps = detector.verify(detector.key(), 0, 5)
+
+        self.assertEqual(steps, 5)
+        self.assertEqual(detector.collisions, 1)
+        self.assertEqual(computer.reg.ip, memory.Address(0x2a))
+
+    def test_close(self):
+        computer = fixtures.job_computer(COUNTDOWN_JOB, 'reference')
+        detector = loopdetect.LoopDetector(computer.decoder_obj)
+        detector.close()
+
+        self.assertNotIn(detector.write_hook, computer.mem.hooks)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the assembled computer."""
+
+import asyncio
+import unittest
+import cpu
+import decoder
+import fixtures
+import machine
+import memory
+
+
+# Add two numbers that overflow 16 bits, then add the three numbers at
+# 0x2000 with ADD,X and store the total at 0x1002.
+WIDE_DATA = ((0x1000, 40000), (0x1001, 30000), (0x1100, 3),
+             (0x2000, 1000), (0x2001, 2000), (0x2002, 3000))
+WIDE_PROGRAM = ((0x20, decoder.LDA), (0x21, 0x1000),
+                (0x22, decoder.ADD), (0x23, 0x1001),
+                (0x24, decoder.LDX), (0x25, 0x1100),
+                (0x26, decoder.ADDX), (0x27, 0x1fff),
+                (0x28, decoder.DCX), (0x29, 0),
+                (0x2a, decoder.SZX), (0x2b, 0),
+                (0x2c, decoder.JMP), (0x2d, 0x26),
+                (0x2e, decoder.STA), (0x2f, 0x1002),
+                (0x30, decoder.HLT), (0x31, 0))
+
+
+def make_wide_computer(engine='reference'):
+    """Return a 16-bit computer loaded with the wide program."""
+
+    return fixtures.make_computer(engine, WIDE_DATA, WIDE_PROGRAM,
+                                  word_bits=16)
+
+
+class TestComputer(unittest.TestCase):
+    def setUp(self):
+        self.computer = fixtures.make_computer()
+
+    def test_create(self):
+        self.assertEqual(self.computer.reg.ip, machine.START_PROG)
+
+    def test_unknown_engine(self):
+        self.assertRaises(machine.EngineError, machine.Computer,
+                          engine='bogus')
+
+    def test_run(self):
+        self.computer.clock.run()
+
+        self.assertEqual(self.computer.mem.read(memory.Address(0x18)),
+                         memory.Value(0xfc))
+
+    def test_run_async(self):
+        computers = [fixtures.make_computer(engine)
+                     for engine in machine.ENGINES]
+        for computer in computers:
+            computer.clock.freq_hz = 1000
+
+        async def run_all():
+            return await asyncio.gather(*[computer.run_async()
+                                          for computer in computers])
+
+        self.assertEqual(asyncio.run(run_all()), [cpu.HALTED] * len(computers))
+        for computer in computers:
+            self.assertEqual(computer.mem.read(memory.Address(0x18)),
+                             memory.Value(0xfc))
+            self.assertEqual(computer.clock.cycles, 35)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.computer = fixtures.make_computer()
+
+    def test_snapshot_size(self):
+        self.assertEqual(len(self.computer.snapshot()),
+                         machine.SNAPSHOT_SIZE)
+
+    def test_restore(self):
+        self.computer.decoder_obj.run(limit=5)
+        blob = self.computer.snapshot()
+        state = self.computer.state.copy()
+
+        self.computer.clock.run()
+        self.computer.restore(blob)
+
+        self.assertEqual(self.computer.state, state)
+        self.assertEqual(self.computer.mem.read(memory.Address(0x18)),
+                         memory.Value(0))
+        self.assertEqual(self.computer.snapshot(), blob)
+
+    def test_restore_runs_the_same(self):
+        blob = self.computer.snapshot()
+        self.computer.clock.run()
+        after = self.computer.snapshot()
+
+        self.computer.restore(blob)
+        self.computer.clock.run()
+
+        self.assertEqual(self.computer.snapshot(), after)
+
+    def test_restore_invalidates_code(self):
+        # Run once to fill the predecode cache, then restore a snapshot
+        # with different code.
+        other = fixtures.make_computer()
+        other.mem.write(memory.Address(0x2c), memory.Value(0x22))
+        other.mem.write(memory.Address(0x2d), memory.Value(0x1c))
+        blob = other.snapshot()
+
+        self.computer.clock.run()
+        self.computer.restore(blob)
+        self.computer.clock.run()
+
+        self.assertEqual(self.computer.mem.read(memory.Address(0x1c)),
+                         memory.Value(0xfc))
+
+    def test_restore_size(self):
+        self.assertRaises(machine.SnapshotError, self.computer.restore,
+                          b'\x00')
+
+    def test_clone(self):
+        self.computer.decoder_obj.run(limit=5)
+        clone = self.computer.clone()
+
+        self.assertEqual(clone.snapshot(), self.computer.snapshot())
+
+        clone.clock.run()
+
+        self.assertEqual(clone.mem.read(memory.Address(0x18)),
+                         memory.Value(0xfc))
+        self.assertEqual(self.computer.mem.read(memory.Address(0x18)),
+                         memory.Value(0))
+
+    def test_clone_translate(self):
+        computer = fixtures.make_computer('translate')
+        computer.clock.run()
+        clone = computer.clone()
+        clone.restore(fixtures.make_computer().snapshot())
+        clone.clock.run()
+
+        self.assertEqual(clone.snapshot(), computer.snapshot())
+
+
+class TestWordBits(unittest.TestCase):
+    def test_run(self):
+        for engine in machine.ENGINES:
+            computer = make_wide_computer(engine)
+            computer.clock.run()
+
+            self.assertEqual(computer.mem.read(memory.Address16(0x1002)),
+                             memory.Value16(70000 - 0x10000 + 6000))
+            self.assertEqual(computer.reg.ip, memory.Address16(0x32))
+
+    def test_unknown_word(self):
+        self.assertRaises(memory.WordSizeError, machine.Computer,
+                          word_bits=12)
+
+    def test_snapshot(self):
+        computer = make_wide_computer('fast')
+        computer.decoder_obj.run(limit=4)
+        clone = computer.clone()
+
+        self.assertEqual(len(clone.snapshot()), computer.snapshot_size())
+        self.assertEqual(clone.snapshot(), computer.snapshot())
+        self.assertRaises(machine.SnapshotError, computer.restore,
+                          fixtures.make_computer().snapshot())
+
+    def test_display(self):
+        computer = make_wide_computer()
+
+        self.assertIn('9c40', computer.data_display())
+
+    def test_paged(self):
+        for engine in machine.ENGINES:
+            computer = make_wide_computer(engine)
+            paged = fixtures.make_computer(engine, WIDE_DATA, WIDE_PROGRAM,
+                                           word_bits=16, paged=True)
+
+            computer.clock.run()
+            paged.clock.run()
+
+            self.assertEqual(paged.snapshot(), computer.snapshot())
+            self.assertEqual(paged.mem.resident_pages(), 4)
+            self.assertEqual(paged.clone().mem.resident_pages(), 4)
+
+    def test_paged_clone(self):
+        for engine in machine.ENGINES:
+            paged = fixtures.make_computer(engine, WIDE_DATA, WIDE_PROGRAM,
+                                           word_bits=16, paged=True)
+            clone = paged.clone()
+
+            for page, clone_page in zip(paged.mem.cells.pages,
+                                        clone.mem.cells.pages):
+                self.assertIs(clone_page, page)
+
+            clone.clock.run()
+            self.assertNotEqual(clone.snapshot(), paged.snapshot())
+
+            paged.clock.run()
+            self.assertEqual(clone.snapshot(), paged.snapshot())
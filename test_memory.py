@@ -4,7 +4,11 @@
 
 """Test the memory."""
 
+import pickle
+import tracemalloc
 import unittest
+import cpu
+import decoder
 import memory
 
 VALUE_0A_HEX = 0x0a
@@ -49,8 +53,7 @@ class TestValue(unittest.TestCase):
         self.assertEqual(num, VALUE_0A_HEX)
 
     def test_get_num_neg(self):
-        value = memory.Value(VALUE_0A_HEX)
-        value.negate()
+        value = memory.Value(VALUE_0A_HEX).negate()
         num = value.get_num()
         self.assertEqual(num, -VALUE_0A_HEX)
 
@@ -103,6 +106,20 @@ class TestValue(unittest.TestCase):
         self.assertFalse(memory.Value(0x7f).is_printable())
         self.assertFalse(memory.Value(0xa0).is_printable())
 
+    def test_interned(self):
+        self.assertTrue(memory.Value(VALUE_0A_HEX) is self.value)
+        self.assertTrue(memory.Value(-0x01) is memory.Value(0x01).negate())
+        self.assertTrue(self.value.copy() is self.value)
+        self.assertTrue(memory.Value.interned(0, True).negative_flag)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.value.num = VALUE_10_HEX
+
+    def test_range(self):
+        self.assertRaises(memory.ValueRangeError, memory.Value, 256)
+        self.assertRaises(memory.ValueRangeError, memory.Value, -256)
+
 
 class TestAddress(unittest.TestCase):
     def setUp(self):
@@ -127,6 +144,10 @@ class TestAddress(unittest.TestCase):
     def test_inc(self):
         self.assertEqual(self.addr.inc(), memory.Address(VALUE_0A_HEX + 1))
 
+    def test_interned(self):
+        self.assertTrue(self.addr.inc() is memory.Address(VALUE_0A_HEX + 1))
+        self.assertTrue(isinstance(self.addr.inc(), memory.Address))
+
 
 class TestMemory(unittest.TestCase):
     def setUp(self):
@@ -184,3 +205,289 @@ class TestMemory(unittest.TestCase):
 
         value_expected = memory.Value(-VALUE_0A_HEX)
         self.assertEqual(self.mem.read(addr), value_expected)
+
+    def test_read_neg_zero(self):
+        value = memory.Value(0).negate()
+        addr = memory.Address(ADDR_20_HEX)
+        self.mem.write(addr, value)
+
+        self.assertTrue(self.mem.read(addr).negative_flag)
+        self.assertTrue(self.mem.is_negative(ADDR_20_HEX))
+
+    def test_write_clears_sign(self):
+        addr = memory.Address(ADDR_20_HEX)
+        self.mem.write(addr, memory.Value(-VALUE_0A_HEX))
+        self.mem.write(addr, memory.Value(VALUE_0A_HEX))
+
+        self.assertFalse(self.mem.is_negative(ADDR_20_HEX))
+        self.assertEqual(self.mem.read(addr), memory.Value(VALUE_0A_HEX))
+
+    def test_view(self):
+        view = self.mem.view()
+        self.mem.write(memory.Address(ADDR_20_HEX), memory.Value(-0x43))
+
+        self.assertEqual(len(view), SIZE)
+        self.assertEqual(view[ADDR_20_HEX], 0x43)
+        self.assertEqual(self.mem.sign_view()[ADDR_20_HEX >> 3],
+                         1 << (ADDR_20_HEX & 7))
+
+    def test_write_hook(self):
+        calls = []
+
+        def hook(num, old_num, old_neg):
+            calls.append((num, old_num, old_neg))
+
+        self.mem.write(memory.Address(ADDR_20_HEX), memory.Value(-0x05))
+        self.mem.add_write_hook(hook)
+        self.mem.write(memory.Address(ADDR_20_HEX), memory.Value(0x43))
+        self.mem.remove_write_hook(hook)
+        self.mem.write(memory.Address(ADDR_20_HEX), memory.Value(0x44))
+
+        self.assertEqual(calls, [(ADDR_20_HEX, 0x05, 1)])
+
+    def test_load(self):
+        calls = []
+
+        def hook(num, old_num, old_neg):
+            calls.append(num)
+
+        self.mem.add_write_hook(hook)
+        self.mem.write(memory.Address(0x03), memory.Value(0x07))
+
+        cells = bytearray(SIZE)
+        cells[0x05] = 0x09
+        signs = bytearray((SIZE + 7) // 8)
+        signs[0x0b >> 3] = 1 << (0x0b & 7)
+        del calls[:]
+        self.mem.load(bytes(cells), bytes(signs))
+
+        self.assertEqual(calls, [0x03, 0x05, 0x0b])
+        self.assertEqual(self.mem.read(memory.Address(0x05)),
+                         memory.Value(0x09))
+        self.assertTrue(self.mem.is_negative(0x0b))
+
+    def test_load_hook(self):
+        calls = []
+        loads = []
+
+        def hook(num, old_num, old_neg):
+            calls.append(num)
+
+        self.mem.add_write_hook(hook, lambda: loads.append(True))
+        cells = bytearray(SIZE)
+        cells[0x05] = 0x09
+        self.mem.load(bytes(cells), bytes((SIZE + 7) // 8))
+
+        self.assertEqual(calls, [])
+        self.assertEqual(loads, [True])
+
+        self.mem.remove_write_hook(hook)
+        self.mem.load(bytes(SIZE), bytes((SIZE + 7) // 8))
+        self.assertEqual(loads, [True])
+
+
+class TestWord(unittest.TestCase):
+    def setUp(self):
+        self.word = memory.word(16)
+        self.mem = memory.Memory(word_size=self.word)
+
+    def test_word(self):
+        self.assertIs(memory.word(), memory.word(8))
+        self.assertIs(memory.word().value_class, memory.Value)
+        self.assertEqual(self.word.bits, 16)
+        self.assertEqual(self.word.max_num, 0xffff)
+        self.assertEqual(self.mem.size, 0x10000)
+
+    def test_unknown_word(self):
+        self.assertRaises(memory.WordSizeError, memory.word, 12)
+
+    def test_value_range(self):
+        self.assertEqual(memory.Value16(-0xffff).get_num(), -0xffff)
+        self.assertRaises(memory.ValueRangeError, memory.Value16, 0x10000)
+
+    def test_add_over(self):
+        value, carry = memory.Value16(0xffff) + memory.Value16(0x02)
+
+        self.assertEqual(value, memory.Value16(0x01))
+        self.assertIsInstance(value, memory.Value16)
+        self.assertTrue(carry)
+
+    def test_pickle(self):
+        value = memory.Value16(-0x1234)
+
+        self.assertIs(pickle.loads(pickle.dumps(value)), value)
+
+    def test_read_write(self):
+        addr = memory.Address16(0x4000)
+        self.mem.write(addr, memory.Value16(-0x1234))
+
+        self.assertIs(self.mem.read(addr), memory.Value16(-0x1234))
+        self.assertEqual(self.mem.cells[0x4000], 0x1234)
+
+    def test_load(self):
+        calls = []
+
+        def hook(num, old_num, old_neg):
+            calls.append(num)
+
+        self.mem.write(memory.Address16(0x0300), memory.Value16(0x0005))
+        self.mem.add_write_hook(hook)
+
+        # Only the high byte of 0x0300 changes.
+        cells = self.mem.cells[:]
+        cells[0x0300] = 0x0105
+        self.mem.load(memoryview(cells).cast('B').tobytes(),
+                      bytes(self.mem.signs))
+
+        self.assertEqual(calls, [0x0300])
+        self.assertEqual(self.mem.cells[0x0300], 0x0105)
+
+
+class TestPagedMemory(unittest.TestCase):
+    def setUp(self):
+        self.word = memory.word(16)
+        self.mem = memory.PagedMemory(word_size=self.word)
+
+    def test_create(self):
+        self.assertEqual(self.mem.num_pages, 0x10000 // memory.PAGE_SIZE)
+        self.assertEqual(self.mem.resident_pages(), 0)
+        self.assertEqual(self.mem.read(memory.Address16(0x8000)),
+                         memory.Value16(0))
+
+    def test_bad_page_size(self):
+        self.assertRaises(memory.PageSizeError, memory.PagedMemory,
+                          page_size=12)
+
+    def test_write_allocates(self):
+        self.mem.write(memory.Address16(0x4001), memory.Value16(-0x1234))
+        self.mem.write(memory.Address16(0x4002), memory.Value16(0x05))
+
+        self.assertEqual(self.mem.resident_pages(), 1)
+        self.assertEqual(self.mem.read(memory.Address16(0x4001)),
+                         memory.Value16(-0x1234))
+        self.assertEqual(self.mem.resident_bytes(),
+                         memory.PAGE_SIZE * 2 + memory.PAGE_SIZE // 8)
+
+    def test_write_zero(self):
+        self.mem.write(memory.Address16(0x4001), memory.Value16(0))
+        self.assertEqual(self.mem.resident_pages(), 0)
+
+        self.mem.write(memory.Address16(0x4001), memory.Value16(0).negate())
+        self.assertEqual(self.mem.resident_pages(), 1)
+        self.assertTrue(self.mem.is_negative(0x4001))
+
+    def test_shared_zero_page(self):
+        other = memory.PagedMemory(word_size=self.word)
+
+        self.assertIs(self.mem.cells.pages[0], other.cells.pages[0])
+
+    def test_same_as_memory(self):
+        dense = memory.Memory(word_size=self.word)
+        for num in (0x00, 0x11, 0x4001, 0xffff):
+            for mem in (dense, self.mem):
+                mem.write(memory.Address16(num), memory.Value16(-num))
+
+        self.assertEqual(bytes(self.mem.cell_bytes()),
+                         bytes(dense.cell_bytes()))
+        self.assertEqual(bytes(self.mem.sign_view()),
+                         bytes(dense.sign_view()))
+
+    def test_load(self):
+        calls = []
+
+        def hook(num, old_num, old_neg):
+            calls.append(num)
+
+        self.mem.write(memory.Address16(0x0300), memory.Value16(0x0005))
+        self.mem.add_write_hook(hook)
+
+        dense = memory.Memory(word_size=self.word)
+        dense.write(memory.Address16(0x9000), memory.Value16(0x0105))
+        self.mem.load(dense.cell_bytes(), dense.sign_view())
+
+        self.assertEqual(calls, [0x0300, 0x9000])
+        self.assertEqual(self.mem.resident_pages(), 1)
+        self.assertEqual(self.mem.read(memory.Address16(0x9000)),
+                         memory.Value16(0x0105))
+
+    def test_load_from_shares_pages(self):
+        self.mem.write(memory.Address16(0x4001), memory.Value16(-0x1234))
+        other = memory.PagedMemory(word_size=self.word)
+        other.write(memory.Address16(0x9000), memory.Value16(0x05))
+        other.load_from(self.mem)
+
+        page_num = 0x4001 // memory.PAGE_SIZE
+        self.assertIs(other.cells.pages[page_num],
+                      self.mem.cells.pages[page_num])
+        self.assertEqual(other.resident_pages(), 1)
+        self.assertEqual(other.read(memory.Address16(0x9000)),
+                         memory.Value16(0))
+
+        other.write(memory.Address16(0x4002), memory.Value16(-0x07))
+        self.mem.write(memory.Address16(0x4001), memory.Value16(0x01))
+
+        self.assertEqual(other.read(memory.Address16(0x4001)),
+                         memory.Value16(-0x1234))
+        self.assertEqual(self.mem.read(memory.Address16(0x4002)),
+                         memory.Value16(0))
+        self.assertEqual(self.mem.read(memory.Address16(0x4001)),
+                         memory.Value16(0x01))
+        self.assertTrue(other.is_negative(0x4002))
+        self.assertFalse(self.mem.is_negative(0x4001))
+
+
+def run_cycles(dec, count):
+    """Run up to count fetch execute cycles.
+
+    Keep count under 256 so the counter itself stays a cached int.
+    """
+
+    num = 0
+    while dec.reg.run_flag and num < count:
+        dec.fetch_execute()
+        num += 1
+
+
+class TestAllocation(unittest.TestCase):
+    def setUp(self):
+        self.reg = cpu.Registers()
+        self.mem = memory.Memory(SIZE)
+        self.alu = cpu.ArithmeticLogicUnit()
+        self.decoder = decoder.Decoder(self.reg, self.mem, self.alu)
+
+        # Sum 0x10..0x17 with ADD,X then count down with SUB and SZA.
+        program = (0x21, 0x1a, 0x26, 0x19, 0x29, 0x00, 0x40, 0x10,
+                   0x28, 0x00, 0x23, 0x24, 0x22, 0x18, 0x25, 0x1b,
+                   0x24, 0x00, 0x23, 0x2e, 0x01, 0x00)
+        for offset, num in enumerate(program):
+            self.mem.write(memory.Address(0x20 + offset), memory.Value(num))
+
+        for offset in range(8):
+            self.mem.write(memory.Address(0x10 + offset),
+                           memory.Value(offset - 3))
+
+        self.mem.write(memory.Address(0x19), memory.Value(0x08))
+        self.mem.write(memory.Address(0x1b), memory.Value(0x01))
+
+        self.reg.ip = memory.Address(0x20)
+        self.reg.run_flag = True
+
+    def test_fetch_execute_allocates_nothing(self):
+        # A first run warms up the interpreter's specialized bytecode.
+        run_cycles(self.decoder, 255)
+        self.reg.ip = memory.Address(0x20)
+        self.reg.run_flag = True
+
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+            run_cycles(self.decoder, 255)
+
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertFalse(self.reg.run_flag)
+        self.assertEqual(peak - before, 0)
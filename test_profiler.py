@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the execution profiler."""
+
+import unittest
+import decoder
+import fixtures
+import machine
+import profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.computer = fixtures.make_computer()
+        self.prof = profiler.Profiler(self.computer.decoder_obj)
+
+    def test_disabled(self):
+        engine = self.computer.decoder_obj
+
+        self.assertNotIn('fetch_execute', vars(engine))
+        self.assertNotIn('run', vars(engine))
+
+        self.prof.enable()
+        self.prof.disable()
+        self.computer.clock.run()
+
+        self.assertNotIn('fetch_execute', vars(engine))
+        self.assertEqual(self.prof.cycles(), 0)
+
+    def test_counts(self):
+        for engine in machine.ENGINES:
+            computer = fixtures.make_computer(engine)
+            prof = profiler.Profiler(computer.decoder_obj)
+            prof.enable()
+            computer.clock.run()
+
+            self.assertEqual(prof.cycles(), computer.clock.cycles)
+            self.assertEqual(prof.cycles(), 35)
+            self.assertEqual(prof.op_counts[decoder.DCX], 8)
+            self.assertEqual(prof.ip_counts[0x2a], 7)
+            self.assertEqual(prof.taken[decoder.SZX], 1)
+            self.assertEqual(prof.not_taken[decoder.SZX], 7)
+            self.assertGreater(prof.elapsed_sec, 0.0)
+
+    def test_same_result(self):
+        plain = fixtures.make_computer()
+        plain.clock.run()
+
+        self.prof.enable()
+        self.computer.clock.run()
+
+        self.assertEqual(self.computer.snapshot(), plain.snapshot())
+
+    def test_paced_clock(self):
+        self.prof.enable()
+        self.computer.clock.freq_hz = 1e6
+        self.computer.clock.run()
+
+        self.assertEqual(self.prof.ip_counts[0x24], 8)
+
+    def test_hot_spots(self):
+        self.prof.enable()
+        self.computer.clock.run()
+
+        self.assertEqual(self.prof.hot_spots(2), [(0x24, 8), (0x26, 8)])
+
+    def test_reset(self):
+        self.prof.enable()
+        self.computer.clock.run()
+        self.prof.reset()
+
+        self.assertEqual(self.prof.cycles(), 0)
+        self.assertEqual(self.prof.elapsed_sec, 0.0)
+
+    def test_report(self):
+        self.prof.enable()
+        self.computer.clock.run()
+        report = self.prof.report()
+
+        self.assertIn('35 instructions', report)
+        self.assertIn('SZX', report)
+        self.assertIn('taken 1, not taken 7', report)
+        self.assertIn('ADD,X 0x10', report)
+
+    def test_computer(self):
+        computer = fixtures.make_computer('fast', profile=True)
+        computer.clock.run()
+
+        self.assertEqual(computer.profiler.cycles(), 35)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test recording and replaying binary traces."""
+
+import io
+import unittest
+import bench
+import fixtures
+import machine
+import memory
+import prog_5_print
+import replay
+
+
+def record(computer, max_steps=None, **kwargs):
+    """Run a computer while recording it and return the trace."""
+
+    stream = io.BytesIO()
+    recorder = replay.Recorder(computer.decoder_obj, stream, **kwargs)
+    recorder.enable()
+    computer.clock.run(max_steps=max_steps)
+    recorder.close()
+
+    return stream.getvalue()
+
+
+def replay_on(computer, trace):
+    """Run a computer against a trace, from the trace's start."""
+
+    replayer = replay.Replayer(computer.decoder_obj, io.BytesIO(trace))
+    replayer.restore(computer)
+    replayer.enable()
+    computer.clock.run()
+    replayer.close()
+
+    return replayer
+
+
+class TestVarint(unittest.TestCase):
+    def test_round_trip(self):
+        for num in (0, 1, 0x7f, 0x80, 0x3fff, 0x4000, 1 << 40):
+            out = bytearray()
+            replay.put_varint(out, num)
+
+            self.assertEqual(replay.get_varint(out, 0), (num, len(out)))
+
+    def test_zigzag(self):
+        self.assertEqual([replay.zigzag(num) for num in (0, -1, 1, -2, 2)],
+                         [0, 1, 2, 3, 4])
+        for num in range(-300, 300):
+            self.assertEqual(replay.unzigzag(replay.zigzag(num)), num)
+
+
+class TestReplay(unittest.TestCase):
+    def test_cycles(self):
+        trace = record(fixtures.make_computer('fast'), compress=False)
+        cycles = list(replay.cycles(io.BytesIO(trace)))
+
+        self.assertEqual(len(cycles), 35)
+        self.assertEqual(cycles[0]['op'], 0x21)
+        self.assertEqual(cycles[0]['addr'], 0x1a)
+        self.assertEqual(cycles[3]['op'], 0x40)
+        self.assertEqual(cycles[3]['addr'], 0x17)
+        self.assertEqual(cycles[3]['accum'], 0x20)
+        self.assertEqual(cycles[-1]['run'], 0)
+        self.assertEqual(cycles[-2]['accum'], 0xfc)
+
+    def test_same_on_each_engine(self):
+        for compress in (True, False):
+            trace = record(fixtures.make_computer('reference'),
+                           compress=compress, chunk_size=16)
+
+            for engine in machine.ENGINES:
+                replayer = replay_on(fixtures.make_computer(engine),
+                                     trace)
+                self.assertEqual(replayer.cycles, 35)
+
+    def test_compact(self):
+        workload = bench.Workload.from_source('loops', bench.LOOPS_SOURCE)
+        computer = workload.make_computer('fast')
+        trace = record(computer, max_steps=20000)
+
+        self.assertLess(len(trace), computer.snapshot_size() + 20000)
+
+    def test_mismatch(self):
+        trace = record(fixtures.make_computer('fast'))
+        computer = fixtures.make_computer('translate')
+
+        replayer = replay.Replayer(computer.decoder_obj, io.BytesIO(trace))
+        replayer.restore(computer)
+        computer.mem.write(memory.Address(0x14), memory.Value(0x16))
+        replayer.enable()
+
+        with self.assertRaises(replay.ReplayMismatch) as context:
+            computer.clock.run()
+
+        self.assertEqual(context.exception.cycle, 15)
+        self.assertEqual(context.exception.field, 'accum')
+
+    def test_start_differs(self):
+        trace = record(fixtures.make_computer('fast'))
+        computer = fixtures.make_computer('fast')
+        computer.reg.ip = memory.Address(0x22)
+
+        replayer = replay.Replayer(computer.decoder_obj, io.BytesIO(trace))
+        self.assertRaises(replay.ReplayMismatch, replayer.enable)
+
+    def test_run_lengths_differ(self):
+        trace = record(fixtures.make_computer('fast'))
+        computer = fixtures.make_computer('fast')
+        replayer = replay.Replayer(computer.decoder_obj, io.BytesIO(trace))
+        replayer.enable()
+        computer.clock.run(max_steps=10)
+
+        with self.assertRaises(replay.ReplayMismatch) as context:
+            replayer.close()
+        self.assertEqual(context.exception.field, 'end')
+
+    def test_restore_is_not_output(self):
+        computer = fixtures.make_computer('fast', prog_5_print.DATA,
+                                          prog_5_print.PROGRAM,
+                                          output=io.StringIO())
+        trace = record(computer)
+        computer.console.flush()
+
+        replay_on(computer, trace)
+        computer.console.flush()
+
+        self.assertEqual(computer.console.writes, 2)
+        self.assertEqual(computer.console.stream.getvalue(),
+                         prog_5_print.TEXT * 2)
+
+    def test_not_a_trace(self):
+        computer = fixtures.make_computer('fast')
+
+        self.assertRaises(replay.TraceFormatError, replay.Replayer,
+                          computer.decoder_obj, io.BytesIO(b'SMTR'))
+        self.assertRaises(replay.TraceFormatError, replay.Replayer,
+                          computer.decoder_obj, io.BytesIO(b'x' * 20))
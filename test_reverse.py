@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test running a computer backwards."""
+
+import random
+import unittest
+import fixtures
+import machine
+import memory
+import reverse
+
+
+def snapshots(engine):
+    """Return the snapshot of prog_3_addnums after each cycle."""
+
+    computer = fixtures.make_computer(engine)
+    computer.reg.run_flag = True
+    blobs = [computer.snapshot()]
+    while computer.reg.run_flag:
+        computer.decoder_obj.fetch_execute()
+        blobs.append(computer.snapshot())
+
+    return blobs
+
+
+def journaled(engine, interval=8):
+    """Return a computer ready to run prog_3_addnums and its journal."""
+
+    computer = fixtures.make_computer(engine)
+    computer.reg.run_flag = True
+    journal = reverse.Journal(computer, interval)
+    journal.enable()
+
+    return computer, journal
+
+
+class TestJournal(unittest.TestCase):
+    def test_step_back(self):
+        for engine in machine.ENGINES:
+            blobs = snapshots(engine)
+            computer, journal = journaled(engine)
+            computer.decoder_obj.run()
+
+            self.assertEqual(journal.cycle, 35)
+            self.assertEqual(computer.snapshot(), blobs[-1])
+
+            for cycle in range(34, -1, -1):
+                self.assertEqual(journal.step_back(), cycle)
+                self.assertEqual(computer.snapshot(), blobs[cycle])
+
+    def test_rewind(self):
+        blobs = snapshots('fast')
+        computer, journal = journaled('fast', interval=4)
+        rand = random.Random(23)
+
+        for _ in range(20):
+            computer.decoder_obj.run(rand.randrange(1, 36))
+            cycle = rand.randrange(journal.cycle + 1)
+
+            self.assertEqual(journal.rewind(cycle), cycle)
+            self.assertEqual(computer.snapshot(), blobs[cycle])
+            self.assertTrue(len(journal.snapshots) <= cycle // 4 + 1)
+
+    def test_run_again(self):
+        computer, journal = journaled('translate')
+        computer.decoder_obj.run()
+        journal.rewind(3)
+        computer.decoder_obj.run()
+
+        self.assertEqual(journal.cycle, 35)
+        self.assertEqual(computer.mem.read(memory.Address(0x18)),
+                         memory.Value(0xfc))
+
+    def test_journal_size(self):
+        computer, journal = journaled('fast', interval=1000)
+        computer.decoder_obj.run()
+
+        # Only the STA of the result writes to memory.
+        self.assertEqual(list(journal.write_addrs), [0x18])
+        self.assertEqual(journal.journal_bytes(),
+                         computer.snapshot_size() +
+                         len(journal.write_cycles) * 15 +
+                         len(journal.reg_cycles) * 11)
+
+    def test_bad_cycle(self):
+        computer, journal = journaled('fast')
+        computer.decoder_obj.run(10)
+
+        self.assertRaises(reverse.RewindError, journal.rewind, 11)
+        self.assertRaises(reverse.RewindError, journal.rewind, -1)
+
+    def test_disable(self):
+        computer, journal = journaled('fast')
+        journal.disable()
+
+        self.assertNotIn('run', vars(computer.decoder_obj))
+        self.assertFalse(computer.mem.hooks)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the multi-machine scheduler."""
+
+import unittest
+import debugger
+import decoder
+import fixtures
+import machine
+import memory
+import scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.sched = scheduler.Scheduler(slice_size=5)
+
+    def test_bad_policy(self):
+        self.assertRaises(scheduler.PolicyError, scheduler.Scheduler,
+                          policy='lottery')
+
+    def test_round_robin(self):
+        tasks = [self.sched.add(fixtures.job_computer(fixtures.JOB, engine))
+                 for engine in machine.ENGINES]
+
+        self.assertEqual([self.sched.step() for _ in range(4)],
+                         tasks + tasks[:1])
+
+        self.sched.run()
+
+        for task in tasks:
+            self.assertEqual(task.state, scheduler.HALTED)
+            self.assertEqual(task.cycles, 35)
+            self.assertEqual(task.slices, 7)
+            self.assertEqual(task.max_wait, 2)
+            self.assertEqual(task.computer.mem.read(memory.Address(0x18)),
+                             memory.Value(0xfc))
+        self.assertEqual(self.sched.ready_count(), 0)
+        self.assertEqual(self.sched.step(), None)
+
+    def test_long_program_does_not_starve(self):
+        loop = self.sched.add(fixtures.job_computer(fixtures.LOOP_JOB),
+                              name='loop')
+        short = self.sched.add(fixtures.job_computer(fixtures.JOB),
+                               name='short')
+
+        self.assertEqual(self.sched.run(max_slices=100), 100)
+
+        self.assertEqual(short.state, scheduler.HALTED)
+        self.assertEqual(loop.state, scheduler.READY)
+        self.assertEqual(loop.slices, 93)
+
+    def test_priority(self):
+        sched = scheduler.Scheduler(slice_size=10, policy=scheduler.PRIORITY)
+        high = sched.add(fixtures.job_computer(fixtures.LOOP_JOB), priority=3)
+        low = sched.add(fixtures.job_computer(fixtures.LOOP_JOB), priority=1)
+
+        sched.run(max_slices=40)
+
+        self.assertEqual(high.slices, 30)
+        self.assertEqual(low.slices, 10)
+        self.assertAlmostEqual(sched.fairness(), 1.0)
+
+    def test_fairness(self):
+        equal = [self.sched.add(fixtures.job_computer(fixtures.LOOP_JOB))
+                 for _ in range(4)]
+        self.sched.run(max_slices=40)
+
+        self.assertAlmostEqual(self.sched.fairness(), 1.0)
+        self.assertEqual([task.max_wait for task in equal], [3, 3, 3, 3])
+
+        equal[0].cycles = 1000
+        self.assertTrue(self.sched.fairness() < 0.5)
+
+    def test_failed(self):
+        task = self.sched.add(fixtures.job_computer(fixtures.CARRY_JOB))
+        self.sched.run()
+
+        self.assertEqual(task.state, scheduler.FAILED)
+        self.assertIsInstance(task.error, decoder.IndexCarryError)
+
+    def test_failed_cycles(self):
+        for engine in machine.ENGINES:
+            task = self.sched.add(fixtures.job_computer(fixtures.CARRY_JOB,
+                                                        engine))
+            self.sched.run()
+
+            # The LDX ran before the ADD,X failed.
+            self.assertEqual(task.cycles, 1)
+
+    def test_break(self):
+        computer = fixtures.job_computer(fixtures.JOB)
+        computer.debugger.add_breakpoint(0x24)
+        task = self.sched.add(computer)
+
+        self.assertRaises(debugger.Break, self.sched.step)
+        self.assertEqual(task.state, scheduler.READY)
+        self.assertEqual(task.cycles, 2)
+        self.assertEqual(self.sched.ready_count(), 1)
+
+        computer.debugger.clear()
+        self.sched.run()
+        self.assertEqual(task.state, scheduler.HALTED)
+        self.assertEqual(task.cycles, 35)
+
+    def test_block_wake(self):
+        blocked = self.sched.add(fixtures.job_computer(fixtures.JOB))
+        other = self.sched.add(fixtures.job_computer(fixtures.JOB))
+        self.sched.block(blocked)
+        self.sched.run()
+
+        self.assertEqual(blocked.state, scheduler.BLOCKED)
+        self.assertEqual(blocked.slices, 0)
+        self.assertEqual(other.state, scheduler.HALTED)
+
+        self.sched.wake(blocked)
+        self.sched.run()
+
+        self.assertEqual(blocked.state, scheduler.HALTED)
+
+    def test_block_wake_before_turn(self):
+        first = self.sched.add(fixtures.job_computer(fixtures.LOOP_JOB))
+        second = self.sched.add(fixtures.job_computer(fixtures.LOOP_JOB))
+        self.sched.block(second)
+        self.sched.wake(second)
+        self.sched.run(max_slices=10)
+
+        self.assertEqual(first.slices, 5)
+        self.assertEqual(second.slices, 5)
+
+    def test_many(self):
+        tasks = [self.sched.add(fixtures.job_computer(fixtures.JOB))
+                 for _ in range(200)]
+        self.sched.run()
+
+        self.assertTrue(all(task.state == scheduler.HALTED for task in tasks))
+        self.assertEqual(self.sched.slices, 200 * 7)
+
+    def test_stats(self):
+        self.sched.add(fixtures.job_computer(fixtures.JOB), name='addnums')
+        self.sched.run()
+        stats = self.sched.stats()
+
+        self.assertEqual(stats['tasks'][0]['cycles'], 35)
+        self.assertEqual(stats['slices'], 7)
+        self.assertEqual(stats['tasks'][0]['share'], 1.0)
+        self.assertIn('addnums', self.sched.report())
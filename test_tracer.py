@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the trace sinks."""
+
+import io
+import unittest
+import cpu
+import memory
+import tracer
+
+
+class TestTextTrace(unittest.TestCase):
+    def setUp(self):
+        self.reg = cpu.Registers()
+        self.alu = cpu.ArithmeticLogicUnit()
+        self.stream = io.StringIO()
+        self.trace = tracer.TextTrace(self.stream, batch_lines=2)
+
+    def test_create(self):
+        self.assertTrue(self.trace is not None)
+
+    def test_record_batches(self):
+        self.reg.ip = memory.Address(0x20)
+        self.reg.accum = memory.Value(0x0a)
+        self.trace.record(self.reg, self.alu)
+
+        self.assertEqual(self.stream.getvalue(), '')
+
+        self.trace.record(self.reg, self.alu)
+
+        line = 'blink... IP: 0x20 A: 0x0a IDX: 0x00\n'
+        self.assertEqual(self.stream.getvalue(), line * 2)
+
+    def test_flush(self):
+        self.trace.record(self.reg, self.alu)
+        self.trace.flush()
+
+        self.assertEqual(self.stream.getvalue(),
+                         'blink... IP: 0x00 A: 0x00 IDX: 0x00\n')
+
+
+class TestRingTrace(unittest.TestCase):
+    def setUp(self):
+        self.reg = cpu.Registers()
+        self.alu = cpu.ArithmeticLogicUnit()
+        self.trace = tracer.RingTrace(size=3)
+
+    def test_create(self):
+        self.assertEqual(len(self.trace), 0)
+
+    def test_records(self):
+        self.reg.accum = memory.Value(-0x05)
+        self.alu.zero_flag = True
+        self.trace.record(self.reg, self.alu)
+
+        flags = tracer.ACCUM_NEG | tracer.ZERO
+        self.assertEqual(self.trace.records(), [(0x00, 0x05, 0x00, flags)])
+
+    def test_wraps(self):
+        for num in range(5):
+            self.reg.ip = memory.Address(num)
+            self.trace.record(self.reg, self.alu)
+
+        self.assertEqual(len(self.trace), 3)
+        self.assertEqual([rec[0] for rec in self.trace.records()], [2, 3, 4])
+
+    def test_format(self):
+        self.trace.record(self.reg, self.alu)
+
+        self.assertEqual(self.trace.format(),
+                         'blink... IP: 0x00 A: 0x00 IDX: 0x00')
+
+
+class TestMakeTrace(unittest.TestCase):
+    def test_kinds(self):
+        self.assertTrue(tracer.make_trace('none') is None)
+        self.assertTrue(isinstance(tracer.make_trace('text'),
+                                   tracer.TextTrace))
+        self.assertTrue(isinstance(tracer.make_trace('ring'),
+                                   tracer.RingTrace))
+
+    def test_unknown(self):
+        self.assertRaises(tracer.TraceKindError, tracer.make_trace, 'bogus')
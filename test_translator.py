@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Test the basic block translator against the reference decoder."""
+
+import random
+import unittest
+import decoder
+import fast
+import fixtures
+import memory
+import translator
+
+# Copy the string at 0x40 to 0x50, as in prog_4_cpstr.py.
+CP_STR = (0x26, 0x40, 0x27, 0x50, 0x41, 0x40, 0x42, 0x50,
+          0x29, 0x00, 0x28, 0x00, 0x23, 0x24, 0x01, 0x00)
+
+
+class TestTranslator(unittest.TestCase):
+    def setUp(self):
+        cells = [0] * memory.SIZE
+        cells[0x40:0x44] = [0x03, 0x41, 0x42, 0x43]
+        cells[0x20:0x20 + len(CP_STR)] = CP_STR
+        self.cells = cells
+
+        self.engine = fixtures.build(translator.Translator, self.cells)
+
+    def test_create(self):
+        self.assertEqual(self.engine.blocks, {})
+
+    def test_run(self):
+        count = self.engine.run()
+
+        self.assertEqual(bytes(self.engine.mem.cells[0x50:0x54]),
+                         bytes([0x03, 0x41, 0x42, 0x43]))
+        self.assertFalse(self.engine.reg.run_flag)
+        self.assertEqual(count, 2 + 3 * 5 - 1 + 1)
+
+    def test_loop_is_one_block(self):
+        self.engine.run()
+
+        self.assertEqual(sorted(self.engine.blocks), [0x20, 0x24, 0x2e])
+        self.assertEqual(self.engine.blocks[0x24].length, 5)
+        self.assertEqual(self.engine.translations, 3)
+
+    def test_run_limit(self):
+        self.assertEqual(self.engine.run(limit=9), 9)
+        self.assertTrue(self.engine.reg.run_flag)
+        self.assertEqual(self.engine.reg.ip, memory.Address(0x28))
+
+    def test_write_invalidates(self):
+        self.engine.run()
+        self.engine.mem.write(memory.Address(0x27), memory.Value(0x60))
+
+        self.assertEqual(sorted(self.engine.blocks), [0x2e])
+
+    def test_same_value_keeps_block(self):
+        self.engine.run()
+        self.engine.mem.write(memory.Address(0x27), memory.Value(0x50))
+
+        self.assertTrue(0x24 in self.engine.blocks)
+
+    def test_self_modifying(self):
+        # LDA 0x10, STA 0x25, LDA 0x11, HLT.  The store rewrites the
+        # address of the second load.
+        self.cells[0x20:0x28] = [0x21, 0x10, 0x22, 0x25, 0x21, 0x11,
+                                 0x01, 0x00]
+        self.cells[0x10] = 0x12
+        self.cells[0x11] = 0x05
+        self.cells[0x12] = 0x07
+
+        ref = fixtures.build(decoder.Decoder, self.cells)
+        engine = fixtures.build(translator.Translator, self.cells)
+
+        self.assertEqual(fixtures.run_bulk(engine, 100),
+                         fixtures.run_steps(ref, 100))
+        self.assertEqual(engine.reg.accum, memory.Value(0x07))
+
+    def test_random_programs(self):
+        rand = random.Random(2)
+        for _ in range(300):
+            cells = fixtures.random_cells(rand)
+            start_ip = rand.randrange(0, memory.SIZE, 2)
+            neg_zeros = [rand.randrange(memory.SIZE) for _ in range(8)]
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip,
+                                 neg_zeros)
+            engine = fixtures.build(translator.Translator, cells,
+                                    start_ip, neg_zeros)
+
+            self.assertEqual(fixtures.run_bulk(engine, 200),
+                             fixtures.run_steps(ref, 200))
+
+    def test_cycles_before_error(self):
+        rand = random.Random(5)
+        failed = 0
+        for _ in range(300):
+            cells = fixtures.random_cells(rand)
+            start_ip = rand.randrange(0, memory.SIZE, 2)
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip)
+            steps = 0
+            try:
+                while ref.reg.run_flag and steps < 200:
+                    ref.fetch_execute()
+                    steps += 1
+            except Exception:
+                failed += 1
+            else:
+                continue
+
+            for engine_class in (decoder.Decoder, fast.FastEngine,
+                                 translator.Translator):
+                engine = fixtures.build(engine_class, cells, start_ip)
+                with self.assertRaises(Exception) as context:
+                    engine.run(200)
+                self.assertEqual(context.exception.cycles, steps)
+
+        self.assertTrue(failed > 50)
+
+    def test_random_programs_16_bits(self):
+        rand = random.Random(4)
+        for _ in range(50):
+            cells = fixtures.random_cells(rand, 512, 0xffff)
+            start_ip = rand.randrange(0, 512, 2)
+
+            ref = fixtures.build(decoder.Decoder, cells, start_ip, bits=16)
+            engine = fixtures.build(translator.Translator, cells, start_ip,
+                                    bits=16)
+
+            self.assertEqual(fixtures.run_bulk(engine, 200),
+                             fixtures.run_steps(ref, 200))
+
+    def test_paged(self):
+        ref = fixtures.build(decoder.Decoder, self.cells)
+        engine = fixtures.build(translator.Translator, self.cells,
+                                paged=True)
+
+        self.assertEqual(fixtures.run_bulk(engine, 100),
+                         fixtures.run_steps(ref, 100))
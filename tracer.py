@@ -0,0 +1,179 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Trace sinks for the clock.
+
+A trace sink is handed the registers and the ALU once per clock cycle,
+before the instruction executes.  The clock doesn't trace at all when
+it has no sink, so an untraced run pays nothing per cycle.
+
+There are two sinks.
+
+    TextTrace
+        Formats a 'blink...' line per cycle and writes the lines to a
+        stream in batches.
+    RingTrace
+        Packs each cycle into a fixed size binary ring buffer and only
+        formats the records when asked.
+"""
+
+import struct
+import sys
+import error
+
+BATCH_LINES = 256
+RING_RECORDS = 4096
+
+MSG = 'blink... IP: 0x{0:02x} A: 0x{1:02x} IDX: 0x{2:02x}'
+
+# The flag bits of a packed record.
+ACCUM_NEG = 0x01
+IDX_NEG = 0x02
+ZEROX = 0x04
+OVERFLOW = 0x08
+ZERO = 0x10
+RUN = 0x20
+
+RECORD = struct.Struct('<HHHB')
+
+
+class TraceKindError(error.Error):
+    """There is no trace sink of that kind."""
+
+
+def pack_flags(reg, alu):
+    """Return the flags byte for the registers and ALU."""
+
+    flags = 0
+    if reg.accum.negative_flag:
+        flags |= ACCUM_NEG
+    if reg.idx.negative_flag:
+        flags |= IDX_NEG
+    if reg.zerox_flag:
+        flags |= ZEROX
+    if alu.overflow_flag:
+        flags |= OVERFLOW
+    if alu.zero_flag:
+        flags |= ZERO
+    if reg.run_flag:
+        flags |= RUN
+
+    return flags
+
+
+class TextTrace(object):
+    """A text trace written to a stream in batches of lines."""
+
+    def __init__(self, stream=None, batch_lines=BATCH_LINES):
+        """Save the stream.
+
+        Args:
+            stream: file.  Where the lines go.  Defaults to sys.stdout at
+                the time of each flush.
+            batch_lines: int.  How many lines to buffer before writing.
+        """
+
+        self.stream = stream
+        self.batch_lines = batch_lines
+        self.lines = []
+
+    def record(self, reg, alu):
+        """Record one cycle."""
+
+        self.lines.append(MSG.format(reg.ip.num, reg.accum.num, reg.idx.num))
+
+        if len(self.lines) >= self.batch_lines:
+            self.flush()
+
+    def flush(self):
+        """Write out the buffered lines."""
+
+        if not self.lines:
+            return
+
+        stream = self.stream
+        if stream is None:
+            stream = sys.stdout
+
+        self.lines.append('')
+        stream.write('\n'.join(self.lines))
+        stream.flush()
+        self.lines = []
+
+
+class RingTrace(object):
+    """A binary ring buffer of the most recent cycles.
+
+    Each record is the IP, accumulator and index magnitudes plus a
+    flags byte, packed with RECORD.
+    """
+
+    def __init__(self, size=RING_RECORDS):
+        """Allocate the buffer.
+
+        Args:
+            size: int.  How many records the ring holds.
+        """
+
+        self.size = size
+        self.buf = bytearray(RECORD.size * size)
+        self.count = 0
+
+    def record(self, reg, alu):
+        """Record one cycle."""
+
+        offset = (self.count % self.size) * RECORD.size
+        RECORD.pack_into(self.buf, offset, reg.ip.num, reg.accum.num,
+                         reg.idx.num, pack_flags(reg, alu))
+        self.count += 1
+
+    def flush(self):
+        """Nothing to write, the records stay in the ring."""
+
+    def __len__(self):
+        """The number of records held."""
+
+        return min(self.count, self.size)
+
+    def records(self):
+        """Return the held records, oldest first.
+
+        Returns:
+            A list of (ip, accum, idx, flags) tuples of ints.
+        """
+
+        held = len(self)
+        first = self.count - held
+        view = memoryview(self.buf)
+
+        records = []
+        for num in range(first, first + held):
+            offset = (num % self.size) * RECORD.size
+            records.append(RECORD.unpack_from(view, offset))
+
+        return records
+
+    def format(self):
+        """Return the held records as 'blink...' text lines."""
+
+        return '\n'.join(MSG.format(ip, accum, idx)
+                         for ip, accum, idx, _ in self.records())
+
+
+def make_trace(kind):
+    """Return a new trace sink by name.
+
+    Args:
+        kind: str.  One of 'none', 'text' or 'ring'.
+    Returns:
+        The sink, or None for 'none'.
+    """
+
+    if kind == 'none':
+        return None
+    elif kind == 'text':
+        return TextTrace()
+    elif kind == 'ring':
+        return RingTrace()
+
+    raise TraceKindError(kind)
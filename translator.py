@@ -0,0 +1,486 @@
+# coding: utf-8
+# © 2018 by Ken Guyton.  All rights reserved.
+
+"""Translate guest code into Python functions.
+
+The Translator is an execution engine that splits the guest code into
+basic blocks, the straight runs of instructions that end with a JMP,
+SZA, SZX or HLT.  Each block is turned into the source of a Python
+function, compiled once and cached by its start address.  A loop like
+
+    LOOP LDA,X SRC
+         STA,X DST
+         DCX
+         SZX
+         JMP LOOP
+
+is then one compiled block.  A skip followed by a jump, the usual loop
+test, is kept in the same block, and a block that jumps back to its
+own start loops inside its function for as long as the run's limit
+allows.
+
+Every write into memory that holds translated code throws the blocks
+there away, so self-modifying code runs correctly.  A block that
+stores into its own code stops right after the store.
+
+Anything the translator doesn't handle, an unknown op code or an IP
+about to run off the end of memory, is run one instruction at a time
+by the FastEngine so the errors are the same as the reference engine.
+"""
+
+import functools
+import sys
+import cpu
+import decoder
+import fast
+import memory
+
+MAX_BLOCK = 32
+
+OP_CODES = frozenset((decoder.HLT, decoder.ADD, decoder.LDA, decoder.STA,
+                      decoder.JMP, decoder.SZA, decoder.SUB, decoder.LDX,
+                      decoder.STX, decoder.SZX, decoder.DCX, decoder.ADDX,
+                      decoder.LDAX, decoder.STAX))
+
+BRANCHES = (decoder.JMP, decoder.HLT, decoder.SZA, decoder.SZX)
+SKIPS = (decoder.SZA, decoder.SZX)
+INDEXED = (decoder.ADDX, decoder.LDAX, decoder.STAX)
+
+USES_ACC = (decoder.LDA, decoder.ADD, decoder.SUB, decoder.STA,
+            decoder.ADDX, decoder.LDAX, decoder.STAX)
+USES_IDX = (decoder.LDX, decoder.STX, decoder.DCX) + INDEXED
+USES_FLAGS = (decoder.ADD, decoder.SUB, decoder.ADDX, decoder.SZA)
+USES_ZEROX = (decoder.DCX, decoder.SZX)
+
+
+class Block(object):
+    """A translated basic block."""
+
+    def __init__(self, start, end, length, function, source):
+        """Save the parts of the block.
+
+        Args:
+            start: int.  The address of the first instruction.
+            end: int.  The address after the last instruction.
+            length: int.  The number of instructions.
+            function: The compiled function.  It takes the state data,
+                the ALU flags data, the cells, the signs, the store
+                function and a budget of instructions, at least length,
+                and returns the number of instructions run.
+            source: str.  The Python source of the function.
+        """
+
+        self.start = start
+        self.end = end
+        self.length = length
+        self.function = function
+        self.source = source
+
+
+class Translator(fast.FastEngine):
+    """Run guest code as cached, compiled basic blocks."""
+
+    def __init__(self, reg, mem, alu):
+        """Save the registers, memory and ALU and watch memory writes."""
+
+        super().__init__(reg, mem, alu)
+
+        self.blocks = {}
+        self.owners = [None] * mem.size
+        self.translations = 0
+
+        mem.add_write_hook(self.invalidate, self.forget)
+
+    def run(self, limit=None):
+        """Run fetch execute cycles until the computer halts.
+
+        Args:
+            limit: int.  The most cycles to run, or None for no limit.
+        Returns:
+            The number of cycles run.
+        Raises:
+            An error that stops the run is given a cycles attribute, the
+            cycles run before it.
+        """
+
+        data = self.reg.state.data
+        flags = self.alu.state.data
+        cells = self.mem.cells
+        signs = self.mem.signs
+        store = self.mem.store
+        blocks = self.blocks
+
+        if limit is None:
+            limit = sys.maxsize
+
+        count = 0
+        try:
+            while data[cpu.RUN] and count < limit:
+                left = limit - count
+
+                block = blocks.get(data[cpu.IP])
+                if block is None:
+                    block = self.translate(data[cpu.IP])
+
+                if block is None or left < block.length:
+                    count += self.execute(1)
+                else:
+                    count += block.function(data, flags, cells, signs, store,
+                                            left)
+        except Exception as err:
+            err.cycles = count + getattr(err, 'cycles', 0)
+            raise
+
+        return count
+
+    def invalidate(self, num, old_num, old_neg):
+        """Throw away the blocks holding code at address number num."""
+
+        owners = self.owners[num]
+        if not owners:
+            return
+
+        if (self.mem.cells[num] == old_num and
+                self.mem.is_negative(num) == bool(old_neg)):
+            return
+
+        for start in list(owners):
+            self.drop(start)
+
+    def forget(self):
+        """Throw away every block, as after a load."""
+
+        self.blocks.clear()
+        self.owners = [None] * self.mem.size
+
+    def drop(self, start):
+        """Throw away the block at start."""
+
+        block = self.blocks.pop(start)
+        for num in range(block.start, block.end):
+            self.owners[num].discard(start)
+
+    def decode(self, start):
+        """Return the instructions of the block at start.
+
+        Returns:
+            A list of (ip, op, addr, addr_neg) tuples.
+        """
+
+        cells = self.mem.cells
+        last_fetch = min(self.mem.word.max_num - 2, self.mem.size - 2)
+
+        instrs = []
+        stop_at = self.mem.size
+        ip = start
+
+        while len(instrs) < MAX_BLOCK and ip <= last_fetch:
+            if ip + 1 >= stop_at:
+                # An earlier store in the block writes this instruction.
+                break
+
+            op = cells[ip]
+            if op not in OP_CODES:
+                break
+            if op in SKIPS and ip + 2 > last_fetch:
+                break
+
+            addr = cells[ip + 1]
+            instrs.append((ip, op, addr, self.mem.is_negative(ip + 1)))
+            ip += 2
+
+            if op in (decoder.STA, decoder.STX) and addr >= ip:
+                stop_at = min(stop_at, addr)
+
+            if op in SKIPS:
+                if (ip <= last_fetch and ip + 1 < stop_at and
+                        cells[ip] == decoder.JMP):
+                    instrs.append((ip, decoder.JMP, cells[ip + 1],
+                                   self.mem.is_negative(ip + 1)))
+                break
+
+            if op in BRANCHES:
+                break
+
+        return instrs
+
+    def translate(self, start):
+        """Translate, compile and cache the block at start.
+
+        Returns:
+            The Block, or None if there's nothing the translator can run
+            at start.
+        """
+
+        instrs = self.decode(start)
+        if not instrs:
+            return None
+
+        end = instrs[-1][0] + 2
+        word_size = self.mem.word
+        source = block_source(start, end, instrs, word_size)
+
+        namespace = {'index_carry_error': functools.partial(
+                         fast.index_carry_error, word_size=word_size),
+                     'ValueRangeError': memory.ValueRangeError}
+        exec(compile(source, '<block 0x{0:02x}>'.format(start), 'exec'),
+             namespace)
+
+        block = Block(start, end, len(instrs), namespace['block'], source)
+        self.blocks[start] = block
+        self.translations += 1
+
+        for num in range(start, end):
+            if self.owners[num] is None:
+                self.owners[num] = set()
+            self.owners[num].add(start)
+
+        return block
+
+
+def sign_test(num):
+    """Return the source testing the negative flag at address num."""
+
+    return 'signs[{0}] & {1}'.format(num >> 3, 1 << (num & 7))
+
+
+def alu_lines(indent, mag, neg_test, subtract=False, word_size=None):
+    """Return source lines adding or subtracting into the accumulator."""
+
+    if word_size is None:
+        word_size = memory.word()
+
+    plus, minus = ('-', '+') if subtract else ('+', '-')
+    lines = [
+        'if {0}:'.format(neg_test),
+        '    total = acc {0} {1}'.format(minus, mag),
+        'else:',
+        '    total = acc {0} {1}'.format(plus, mag),
+        'if total > {0}:'.format(word_size.max_num),
+        '    overflow = 1',
+        '    total %= {0}'.format(word_size.num_values),
+        'else:',
+        '    overflow = 0',
+        '    if total < -{0}:'.format(word_size.max_num),
+        '        zero = 0',
+        '        raise ValueRangeError(-total)',
+        'acc = total',
+        'zero = 1 if acc == 0 else 0',
+        'acc_neg_zero = 0',
+    ]
+
+    return [indent + line for line in lines]
+
+
+def store_acc_lines(indent, addr):
+    """Return source lines storing the accumulator at addr."""
+
+    lines = [
+        'if acc < 0 or acc_neg_zero:',
+        '    store({0}, -acc, 1)'.format(addr),
+        'else:',
+        '    store({0}, acc, 0)'.format(addr),
+    ]
+
+    return [indent + line for line in lines]
+
+
+def load_acc_lines(indent, addr, neg_test):
+    """Return source lines loading the accumulator from addr."""
+
+    lines = [
+        'acc = cells[{0}]'.format(addr),
+        'if {0}:'.format(neg_test),
+        '    acc = -acc',
+        '    acc_neg_zero = 1 if acc == 0 else 0',
+        'else:',
+        '    acc_neg_zero = 0',
+    ]
+
+    return [indent + line for line in lines]
+
+
+def block_source(start, end, instrs, word_size=None):
+    """Return the Python source of the function for a block.
+
+    The registers the block uses are loaded into locals on entry and
+    written back in a finally clause, so the state is right even when
+    an instruction raises.
+
+    A block that ends by jumping back to its own start loops inside the
+    function for as long as its budget of instructions allows, unless
+    it stores into its own code.
+
+    The limits of the word_size, a memory.Word, 8 bits if None, are
+    written into the source as constants.
+    """
+
+    if word_size is None:
+        word_size = memory.word()
+
+    ops = set(instr[1] for instr in instrs)
+    uses_acc = bool(ops.intersection(USES_ACC))
+    uses_idx = bool(ops.intersection(USES_IDX))
+    uses_flags = bool(ops.intersection(USES_FLAGS))
+    uses_zerox = bool(ops.intersection(USES_ZEROX))
+    uses_run = decoder.HLT in ops
+
+    length = len(instrs)
+    last_ip, last_op, last_addr, last_neg = instrs[-1]
+    loops = last_op == decoder.JMP and last_addr == start
+    for ip, op, addr, addr_neg in instrs:
+        if op in (decoder.STA, decoder.STX) and start <= addr < end:
+            loops = False
+
+    src = ['def block(data, flags, cells, signs, store, budget):']
+    if uses_acc:
+        src += [
+            '    acc = data[{0}]'.format(cpu.ACCUM),
+            '    acc_neg_zero = 0',
+            '    if data[{0}]:'.format(cpu.ACCUM_NEG),
+            '        acc = -acc',
+            '        acc_neg_zero = 1 if acc == 0 else 0',
+        ]
+    if uses_idx:
+        src.append('    idx = data[{0}]'.format(cpu.IDX))
+        src.append('    idx_neg = data[{0}]'.format(cpu.IDX_NEG))
+    if uses_flags:
+        src.append('    overflow = flags[{0}]'.format(cpu.OVERFLOW))
+        src.append('    zero = flags[{0}]'.format(cpu.ZERO))
+    if uses_zerox:
+        src.append('    zerox = data[{0}]'.format(cpu.ZEROX))
+    if uses_run:
+        src.append('    run = data[{0}]'.format(cpu.RUN))
+    src.append('    ip = {0}'.format(start))
+    src.append('    ip_neg = 0')
+    src.append('    n = 0')
+    src.append('    try:')
+
+    if loops:
+        src.append('        while True:')
+        ind = '            '
+    else:
+        ind = '        '
+
+    def exit_lines(exit_ip, count):
+        return [ind + 'ip = {0}'.format(exit_ip),
+                ind + 'return n + {0}'.format(count)]
+
+    for num, (ip, op, addr, addr_neg) in enumerate(instrs):
+        next_ip = ip + 2
+        count = num + 1
+        src.append(ind + '# 0x{0:02x}: 0x{1:02x} 0x{2:02x}'.format(ip, op,
+                                                                    addr))
+
+        if op == decoder.LDA:
+            src += load_acc_lines(ind, addr, sign_test(addr))
+
+        elif op == decoder.ADD or op == decoder.SUB:
+            src.append(ind + 'ip = {0}'.format(next_ip))
+            src += alu_lines(ind, 'cells[{0}]'.format(addr), sign_test(addr),
+                             subtract=(op == decoder.SUB), word_size=word_size)
+
+        elif op == decoder.STA:
+            src += store_acc_lines(ind, addr)
+
+        elif op == decoder.LDX:
+            src.append(ind + 'idx = cells[{0}]'.format(addr))
+            src.append(ind + 'idx_neg = signs[{0}] >> {1} & 1'.format(
+                addr >> 3, addr & 7))
+
+        elif op == decoder.STX:
+            src.append(ind + 'store({0}, idx, idx_neg)'.format(addr))
+
+        elif op == decoder.DCX:
+            src += [
+                ind + 'if idx:',
+                ind + '    idx -= 1',
+                ind + '    idx_neg = 0',
+                ind + '    zerox = 1 if idx == 0 else 0',
+                ind + 'else:',
+                ind + '    idx = 1',
+                ind + '    idx_neg = 1',
+                ind + '    zerox = 0',
+            ]
+
+        elif op in INDEXED:
+            base = -addr if addr_neg else addr
+            src += [
+                ind + 'ip = {0}'.format(next_ip),
+                ind + 'ea = {0} - idx if idx_neg else {0} + idx'.format(base),
+                ind + 'if ea > {0} or ea < -{0}:'.format(
+                    word_size.max_num),
+                ind + '    raise index_carry_error(ea, idx, idx_neg)',
+                ind + 'if ea < 0:',
+                ind + '    ea = -ea',
+            ]
+            neg_test = 'signs[ea >> 3] >> (ea & 7) & 1'
+
+            if op == decoder.LDAX:
+                src += load_acc_lines(ind, 'ea', neg_test)
+            elif op == decoder.ADDX:
+                src += alu_lines(ind, 'cells[ea]', neg_test,
+                                 word_size=word_size)
+            else:
+                src += store_acc_lines(ind, 'ea')
+
+                # Stop if the store wrote code this block would run next.
+                low = start if loops else next_ip
+                if low < end:
+                    src.append(ind + 'if {0} <= ea < {1}:'.format(low, end))
+                    src += ['    ' + line
+                            for line in exit_lines(next_ip, count)]
+
+        elif op == decoder.HLT:
+            src.append(ind + 'run = 0')
+            src += exit_lines(next_ip, count)
+
+        elif op == decoder.JMP:
+            if addr_neg:
+                src.append(ind + 'ip_neg = 1')
+
+            if loops:
+                src += [
+                    ind + 'n += {0}'.format(count),
+                    ind + 'if n + {0} > budget:'.format(length),
+                    ind + '    ip = {0}'.format(addr),
+                    ind + '    return n',
+                ]
+            else:
+                src += exit_lines(addr, count)
+
+        elif op in SKIPS:
+            flag = 'zero' if op == decoder.SZA else 'zerox'
+            src.append(ind + 'if {0}:'.format(flag))
+            src += ['    ' + line for line in exit_lines(next_ip + 2, count)]
+            if count == length:
+                src += exit_lines(next_ip, count)
+
+    if last_op not in BRANCHES:
+        src += exit_lines(last_ip + 2, length)
+
+    # Every instruction that can raise sets ip past itself first.
+    src.append('    except Exception as err:')
+    src.append('        err.cycles = n + max(0, (ip - {0}) // 2 - 1)'.format(
+        start))
+    src.append('        raise')
+    src.append('    finally:')
+    src.append('        data[{0}] = ip'.format(cpu.IP))
+    src.append('        data[{0}] = ip_neg'.format(cpu.IP_NEG))
+    if uses_acc:
+        src.append('        data[{0}] = -acc if acc < 0 else acc'.format(
+            cpu.ACCUM))
+        src.append('        data[{0}] = 1 if acc < 0 or acc_neg_zero '
+                   'else 0'.format(cpu.ACCUM_NEG))
+    if uses_idx:
+        src.append('        data[{0}] = idx'.format(cpu.IDX))
+        src.append('        data[{0}] = idx_neg'.format(cpu.IDX_NEG))
+    if uses_flags:
+        src.append('        flags[{0}] = overflow'.format(cpu.OVERFLOW))
+        src.append('        flags[{0}] = zero'.format(cpu.ZERO))
+    if uses_zerox:
+        src.append('        data[{0}] = zerox'.format(cpu.ZEROX))
+    if uses_run:
+        src.append('        data[{0}] = run'.format(cpu.RUN))
+
+    return '\n'.join(src) + '\n'